@@ -1,30 +1,170 @@
 import re
 import mmap
+from array import array
 from collections import defaultdict
+import base64
+import bisect
+import collections
+import contextlib
+import functools
+import hashlib
 import heapq
+import io
+import itertools
+import json
+import marshal
+import math
 import os
+import queue
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import threading
 import time
-from tqdm import tqdm
+import zlib
+
+# محلل re الداخلي لفحص بنية تعابير الاستبعاد؛ ليس واجهة عامة، فإن غاب عُدّت كل التعابير
+# معرضة للخطر (انظر RegexSet)
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    try:
+        import sre_parse
+    except ImportError:
+        sre_parse = None
+
+# NumPy اختياري ويُستورد عند أول حاجة إليه (انظر _load_numpy): بدونه تُقيَّم المعايير
+# والتحليل سطراً سطراً
+np = None
+_numpy_checked = False
+
+
+def _load_numpy():
+    """استيراد NumPy وبناء جدول الفئات مرة واحدة عند أول عملية تحتاجهما"""
+    global np, CLASS_TABLE, PAIR_TABLE, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+        CLASS_TABLE = _build_class_table()
+        PAIR_TABLE = _build_pair_table()
+    return np
+
+
+def tqdm(*args, **kwargs):
+    """شريط tqdm؛ يُستورد عند أول شريط تقدم فقط لأن استيراده يبطئ بدء المهام القصيرة"""
+    from tqdm import tqdm as progress_bar
+    return progress_bar(*args, **kwargs)
+
+ANALYSIS_SIDECAR_SUFFIX = '.stats.json'
+ANALYSIS_SIDECAR_VERSION = 4
+LINE_INDEX_SUFFIX = '.idx'
+CHECKPOINT_SUFFIX = '.ckpt'
+CHECKPOINT_VERSION = 2
+CHECKPOINT_INTERVAL = 60  # ثوانٍ بين نقاط الاستئناف عند تصفية ملف كبير
+DEFAULT_COMMON_STORE = 'top-passwords.pwset'
+DEFAULT_WEAK_PATTERNS = 'weak-patterns.txt'
+SPLIT_SCAN_BLOCK = 1024 * 1024
+STREAM_BUFFER_SIZE = 4 * 1024 * 1024
+COMPRESSION_QUEUE_BLOCKS = 8
+PROGRESS_INTERVAL = 0.25
+# فئات ترميز الأسطر في إحصاءات التصفية؛ أسطر non_utf8 تُقيَّم بعد فكها بـ latin-1
+ENCODING_CLASSES = ('ascii', 'utf8', 'non_utf8')
+PIPELINE_BLOCK_SIZE = 1024 * 1024
+PIPELINE_QUEUE_BLOCKS = 4
+FILTER_PREDICATES = ('min_length', 'max_length', 'require_upper', 'require_lower', 'require_digit',
+                     'require_special', 'min_strength', 'exclude_common', 'exclude_weak_patterns', 'custom_regex', 'regex_file')
+# بتات فئات البايت في نواة الدفعات (NumPy)
+CLASS_UPPER, CLASS_LOWER, CLASS_DIGIT, CLASS_SPECIAL = 1, 2, 4, 8
+CLASS_COMPOSITION = 15
+CLASS_SPACE, CLASS_NON_ASCII = 16, 32
+KERNEL_MIN_BLOCK = 64 * 1024  # الكتل الأصغر (الأجزاء الصغيرة) لا تستحق استيراد NumPy
+KERNEL_FILTERS = ('min_length', 'max_length', 'require_upper', 'require_lower', 'require_digit', 'require_special',
+                  'min_strength')
+KERNEL_CLASS_BITS = {'require_upper': CLASS_UPPER, 'require_lower': CLASS_LOWER,
+                     'require_digit': CLASS_DIGIT, 'require_special': CLASS_SPECIAL}
+# تقدير القوة: حجم مجموعة الأحرف لكل فئة، وبتات الحرف الذي يكمل نمطاً متوقعاً
+STRENGTH_CHARSET = {CLASS_UPPER: 26, CLASS_LOWER: 26, CLASS_DIGIT: 10, CLASS_SPECIAL: 33, CLASS_NON_ASCII: 100}
+STRENGTH_PATTERN_BITS = 1.0
+STRENGTH_AFFIX = '0123456789!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'  # ما يُحذف من طرفي الكلمة للوصول إلى جذرها
+STRENGTH_MIN_WORD = 3
+STRENGTH_BUCKET = 10  # عرض سلال مدرج القوة بالبت
+KEYBOARD_ROWS = ('1234567890-=', 'qwertyuiop[]', "asdfghjkl;'", 'zxcvbnm,./')
+KEYBOARD_SHIFTED_ROWS = ('!@#$%^&*()_+', 'QWERTYUIOP{}', 'ASDFGHJKL:"', 'ZXCVBNM<>?')
+SORT_MEMORY_FACTOR = 5  # تقدير تضخم حجم الأسطر عند تحميلها كقائمة bytes
+SORT_MAX_FANIN = 256
+SET_OPERATIONS = ('diff', 'intersect', 'union')
+SET_MAX_PARTITIONS = 512
+SET_PARTITION_BUFFER = 256 * 1024
+SHARD_MODES = ('hash', 'round_robin')
+FILTER_CACHE_VERSION = 2
+FILTER_CACHE_QUOTA = 1024 * 1024 * 1024
+HLL_PRECISION = 14  # 2^14 سجلاً: خطأ معياري نحو 0.8% بذاكرة 16KB
+LENGTH_SKETCH_EXACT = 128  # الأطوال حتى هذا الحد تُعدّ بدقة، وما فوقه في سلال لوغاريتمية
+LENGTH_SKETCH_GAMMA = 1.02
+HEAVY_HITTERS_SLACK = 4  # عدد المرشحين المتتبعين لكل مدخل مطلوب في القائمة الأعلى تكراراً
+MASK_CAPACITY = 1 << 16  # أقل عدد أقنعة متتبعة؛ الأقنعة قصيرة فالذاكرة بضعة ميغابايتات
+COMPRESSION_MAGIC = {'gz': b'\x1f\x8b', 'xz': b'\xfd7zXZ\x00', 'bz2': b'BZh'}
+SPLIT_PARALLEL_MIN_SIZE = 64 * 1024 * 1024
+# ذاكرة الصيغ الثنائية المبنية مسبقاً (القائمة الشائعة وآلات الأنماط)؛ قيمة فارغة تعطلها
+STARTUP_CACHE_DIR = os.environ.get('PASSWORD_FILTER_CACHE', os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'password_filter'))
+STARTUP_CACHE_MAGIC = b'PWFBLD02'  # يتغير رقمه مع صيغة ملفات الذاكرة فتُهمل الملفات الأقدم
+REGEX_COMBINE_MAX = 64  # أقصى عدد أنماط في التعبير المدمج الواحد
+REGEX_MIN_LITERAL = 3   # أقصر نص حرفي إلزامي يُستخدم للفلترة المسبقة
 
 class AdvancedPasswordFilter:
-    def __init__(self):
-        # تحميل قوائم الكلمات الشائعة وأنماط كلمات المرور الضعيفة
-        self.common_passwords = self._load_common_passwords()
-        self.weak_patterns = self._load_weak_patterns()
+    def __init__(self, common_store=None, metrics_file=None, metrics_format='json', weak_patterns_file=None,
+                 cache_dir=None, cache_quota=FILTER_CACHE_QUOTA):
+        # قوائم الكلمات الشائعة وأنماط كلمات المرور الضعيفة تُحمَّل عند أول فحص يحتاجها،
+        # فلا تدفع عمليات مثل التقسيم والفرز كلفتها
+        self._common_store = common_store
+        self._weak_patterns_file = weak_patterns_file
+        # مجموعات تعابير الاستبعاد المترجمة حسب ملفها (تُبنى عند أول استخدام)
+        self._regex_sets = {}
+        # ملف المقاييس الدورية (JSON أو نص Prometheus) لمتابعة المهام الطويلة
+        self.metrics_file = metrics_file
+        self.metrics_format = metrics_format
+        # ذاكرة نتائج الكتل بين تشغيلات التصفية المتكررة على القائمة نفسها
+        self.filter_cache = FilterCache(cache_dir, cache_quota) if cache_dir else None
         
-    def _load_common_passwords(self, top_n=10000):
+    @functools.cached_property
+    def common_passwords(self):
+        return self._load_common_passwords(common_store=self._common_store)
+
+    @functools.cached_property
+    def weak_patterns(self):
+        return self._load_weak_patterns(self._weak_patterns_file)
+
+    def _load_common_passwords(self, top_n=10000, common_store=None):
         """تحميل القائمة الأكثر شيوعاً لكلمات المرور"""
-        common = set()
-        try:
+        # المخزن المبني مسبقاً يُفتح عبر mmap دون حد لعدد الكلمات
+        common_store = common_store or (DEFAULT_COMMON_STORE if os.path.exists(DEFAULT_COMMON_STORE) else None)
+        if common_store:
+            return CommonPasswordStore(common_store)
+
+        def read_common():
+            common = set()
             with open('top-passwords.txt', 'r', encoding='utf-8', errors='ignore') as f:
                 for line in itertools.islice(f, top_n):
                     common.add(line.strip().lower())
+            return common
+
+        try:
+            st = os.stat('top-passwords.txt')
         except FileNotFoundError:
             # قائمة افتراضية إذا لم يوجد ملف
-            common.update(['123456', 'password', '123456789', '12345', 'qwerty'])
-        return common
+            return {'123456', 'password', '123456789', '12345', 'qwerty'}
+        # المجموعة المقروءة تُحفظ بصيغة marshal فيُغني تحميلها عن تحليل الملف النصي
+        key = (os.path.abspath('top-passwords.txt'), st.st_size, st.st_mtime_ns, top_n)
+        return _cached_build('common', key, read_common)
     
-    def _load_weak_patterns(self):
+    def _load_weak_patterns(self, patterns_file=None):
         """تحميل أنماط كلمات المرور الضعيفة"""
         patterns = {
             'numeric_sequence': r'12345678?9?0?',
@@ -36,198 +176,3296 @@ class AdvancedPasswordFilter:
             'repeated_chars': r'(\w)\1{2,}',
             'short_passwords': r'^.{1,7}$'
         }
-        return patterns
-    
-    def _matches_weak_pattern(self, password):
-        """فحص إذا كانت كلمة المرور تطابق أنماطاً ضعيفة"""
-        # التحقق من الأنماط الرقمية
-        if re.search(self.weak_patterns['numeric_sequence'], password):
-            return True
-        if re.search(self.weak_patterns['reverse_numeric'], password):
-            return True
-            
-        # التحقق من أنماط لوحة المفاتيح
-        for pattern in self.weak_patterns['keyboard_patterns']:
-            if re.search(pattern, password.lower()):
+        # قاموس أنماط إضافي (مسارات لوحة المفاتيح، تسلسلات، كلمات خاصة بالمؤسسة)
+        patterns_file = patterns_file or (DEFAULT_WEAK_PATTERNS if os.path.exists(DEFAULT_WEAK_PATTERNS) else None)
+        if patterns_file:
+            patterns['dictionary_patterns'] = PatternMatcher.read_patterns(patterns_file)
+        return patterns
+
+    @functools.cached_property
+    def weak_matcher(self):
+        """
+        آلة Aho-Corasick واحدة لكل الأنماط الحرفية
+
+        النمطان الرقميان لا يحتاجان لاحقتهما الاختيارية في البحث، فيكفي وجود '1234567'
+        أو '9876543'. أما الأحرف المتكررة والطول القصير فتبقى تعابير نمطية مترجمة.
+        """
+        literals = {'1234567': 'numeric_sequence', '9876543': 'reverse_numeric'}
+        for pattern in self.weak_patterns['keyboard_patterns'] + self.weak_patterns.get('dictionary_patterns', []):
+            literals.setdefault(pattern.lower(), pattern)
+        return PatternMatcher.cached(literals)
+
+    @functools.cached_property
+    def _weak_regexes(self):
+        return [(name, re.compile(self.weak_patterns[name])) for name in ('repeated_chars', 'short_passwords')]
+
+    def weak_pattern_match(self, password):
+        """اسم أول نمط ضعيف تطابقه كلمة المرور (أو None)"""
+        # فحص كل الأنماط الحرفية في مرور خطي واحد
+        match = self.weak_matcher.search(password.lower())
+        if match is not None:
+            return match
+        for name, regex in self._weak_regexes:
+            if regex.search(password):
+                return name
+        return None
+
+    def _matches_weak_pattern(self, password):
+        """فحص إذا كانت كلمة المرور تطابق أنماطاً ضعيفة"""
+        return self.weak_pattern_match(password) is not None
+
+    @functools.cached_property
+    def _strength_words(self):
+        """
+        قاموسا الكلمات (الشائعة وأنماط القاموس)، واتحادهما للفحص الدفعي إن كانت القائمة
+        الشائعة مجموعة في الذاكرة (لا مخزناً على القرص)، وبتات تخمين كلمة منهما
+        """
+        common = self.common_passwords
+        extra = frozenset(pattern.lower() for pattern in self.weak_patterns.get('dictionary_patterns', []))
+        words = None if isinstance(common, CommonPasswordStore) else frozenset(common) | extra
+        return common, extra, words, math.log2(max(len(common) + len(extra), 2))
+
+    def password_strength(self, password):
+        """
+        تقدير قوة كلمة المرور بالبت
+
+        كل حرف يساوي log2 لحجم مجموعة الأحرف المستخدمة في الكلمة، إلا الحرف الذي يكرر
+        سابقه أو يكمل تسلسلاً (abc، 321) أو مسار لوحة مفاتيح (qwe، 1qaz) فيساوي
+        STRENGTH_PATTERN_BITS. إن كانت الكلمة أو جذرها (بعد حذف الأرقام والرموز من
+        طرفيها) في القائمة الشائعة أو قاموس الأنماط فلا تتجاوز قوتها بتات التخمين من
+        القاموس مضافاً إليها بتات الطرفين. _strength_kernel تحسب القيمة نفسها لكتلة كاملة.
+        """
+        charset = STRENGTH_BITS[_class_mask(password)]
+        # prefix[k] عدد الأحرف المتوقعة قبل الحرف k؛ الحرف الأول لا يُعد متوقعاً
+        prefix = [0, 0][:len(password) + 1]
+        for previous, char in zip(password, password[1:]):
+            prefix.append(prefix[-1] + (previous == char or previous + char in PREDICTABLE_PAIRS))
+        strength = _strength_from_counts(len(password), prefix[-1], charset)
+        span = self._dictionary_span(password)
+        if span is None:
+            return strength
+        lead, end = span
+        affix = prefix[lead] + prefix[len(password)] - prefix[end]
+        dictionary = self._strength_words[3] + _strength_from_counts(len(password) - (end - lead), affix, charset)
+        return min(strength, dictionary)
+
+    def _dictionary_span(self, password):
+        """موضع (البداية، النهاية) لكلمة القاموس في password، أو None إن لم تكن هي ولا جذرها فيه"""
+        common, extra, _, _ = self._strength_words
+        lowered = password.lower()
+        if lowered in common or lowered in extra:
+            return 0, len(password)
+        base = password.strip(STRENGTH_AFFIX)
+        if len(base) < STRENGTH_MIN_WORD or len(base) == len(password):
+            return None
+        lowered = base.lower()
+        if lowered not in common and lowered not in extra:
+            return None
+        lead = len(password) - len(password.lstrip(STRENGTH_AFFIX))
+        return lead, lead + len(base)
+
+    def _dictionary_strengths(self, passwords, starts, charsets, predictable):
+        """
+        نسخة password_strength الدفعية لخصم القاموس في أسطر كتلة
+
+        starts و charsets إزاحة كل كلمة في الكتلة وبتات حرفها الحر، و predictable
+        العدّ التراكمي من _strength_kernel. تُرجع أرقام كلمات القاموس بين passwords
+        وقوة كل منها مع طرفيها. المطابقة تبدأ بتقاطع مجموعات، فلا يمر على
+        _dictionary_span إلا ما يطابق فعلاً.
+        """
+        common, extra, words, dictionary_bits = self._strength_words
+        lowered = [password.lower() for password in passwords]
+        bases = [word.strip(STRENGTH_AFFIX) for word in lowered]
+        candidates = set(lowered).union(bases)
+        if words is not None:
+            matched = words.intersection(candidates)
+        else:
+            matched = {word for word in candidates if word in common or word in extra}
+        hits, leads, ends, lengths = [], [], [], []
+        if matched:
+            for j, (word, base) in enumerate(zip(lowered, bases)):
+                if word in matched or base in matched:
+                    span = self._dictionary_span(passwords[j])
+                    if span is not None:
+                        hits.append(j)
+                        leads.append(span[0])
+                        ends.append(span[1])
+                        lengths.append(len(passwords[j]))
+        hits = np.array(hits, dtype=np.intp)
+        leads, ends, lengths = (np.array(values, dtype=np.int64) for values in (leads, ends, lengths))
+        offsets = starts[hits]
+        affix = (predictable[offsets + leads] - predictable[offsets]
+                 + predictable[offsets + lengths] - predictable[offsets + ends])
+        return hits, dictionary_bits + _strength_from_counts(lengths - (ends - leads), affix, charsets[hits])
+
+    def regex_set(self, regex_file, allow_risky=False, reload=False):
+        """
+        مجموعة تعابير الاستبعاد المترجمة من regex_file (تُترجم مرة واحدة لكل ملف)
+
+        تُستدعى لكل كلمة مرور فلا يُفحص الملف فيها؛ مع reload (مرة في بداية كل تشغيل)
+        تُقارن بصمة محتواه بما تُرجم، ويُعاد بناء المجموعة إن تغير بين تشغيلين.
+        """
+        key = (regex_file, allow_risky)
+        if reload or key not in self._regex_sets:
+            with open(regex_file, 'rb') as f:
+                digest = hashlib.sha256(f.read()).digest()
+            cached = self._regex_sets.get(key)
+            if cached is None or cached[0] != digest:
+                self._regex_sets[key] = (digest, RegexSet.from_file(regex_file, allow_risky=allow_risky))
+        return self._regex_sets[key][1]
+
+    def _reload_regex_file(self, filters):
+        """إعادة بناء مجموعة التعابير إن تغير ملفها منذ آخر تشغيل"""
+        if 'regex_file' in filters:
+            self.regex_set(filters['regex_file'], filters.get('allow_risky_regex', False), reload=True)
+
+    def _rejecting_filter(self, password, filters):
+        """تطبيق معايير التصفية على كلمة مرور واحدة وإرجاع اسم أول معيار يرفضها (أو None)"""
+        return self._rejector(filters)(password)
+
+    def _rejector(self, filters, source=None):
+        """
+        دالة (كلمة مرور -> اسم أول معيار يرفضها أو None) للمعايير الموجودة في filters
+
+        الفحوص تُبنى مرة لكل مجموعة معايير من FILTER_CHECKS بترتيب FILTER_PREDICATES، فلا
+        يُفحص في كل سطر إلا المعايير المطلوبة فعلاً. source مصدر الخصائص المكلفة (الشيوع،
+        الأنماط الضعيفة، القوة): الأداة نفسها، أو _PasswordFeatures لتتشاركها عدة سياسات.
+        """
+        checks = [(name, FILTER_CHECKS[name](source or self, filters))
+                  for name in FILTER_PREDICATES if name in filters]
+
+        def reject(password):
+            for name, check in checks:
+                if check(password):
+                    return name
+            return None
+        return reject
+
+    def is_common(self, password):
+        """هل كلمة المرور في القائمة الشائعة"""
+        return password.lower() in self.common_passwords
+
+    def iter_filter(self, lines, filters, stats=None):
+        """
+        تصفية أي مصدر للأسطر (نصوص أو بايتات) وإرجاع كلمات المرور المقبولة تباعاً
+
+        يُحدَّث القاموس stats (إن مُرِّر) بالعدادات total_passwords و filtered_passwords
+        و rejected_by (عدد المرفوض لكل معيار) و decode_fallbacks (أسطر ليست UTF-8)
+        و encodings (عدد أسطر البايتات لكل فئة في ENCODING_CLASSES).
+        keep_unique يقارن أسطر البايتات ببايتاتها الأصلية (بعد strip) كما في filter_large_file،
+        فسطران يُفكان إلى النص نفسه بترميزين مختلفين يُعدّان مختلفين ويُرجع كلاهما.
+        """
+        if stats is None:
+            stats = {}
+        stats.setdefault('total_passwords', 0)
+        stats.setdefault('filtered_passwords', 0)
+        stats.setdefault('decode_fallbacks', 0)
+        encodings = stats.setdefault('encodings', dict.fromkeys(ENCODING_CLASSES, 0))
+        rejected_by = stats.setdefault('rejected_by', defaultdict(int))
+        unique_passwords = set() if filters.get('keep_unique', False) else None
+        self._reload_regex_file(filters)
+        reject = self._rejector(filters)
+
+        for line in lines:
+            if isinstance(line, str):
+                password = key = line.strip()
+            else:
+                password, encoding = _decode_line(line)
+                encodings[encoding] += 1
+                if encoding == 'non_utf8':
+                    stats['decode_fallbacks'] += 1
+                key = password.encode('latin-1' if encoding == 'non_utf8' else 'utf-8')
+            stats['total_passwords'] += 1
+
+            rejected = reject(password)
+            if rejected is not None:
+                rejected_by[rejected] += 1
+                continue
+            if unique_passwords is not None:
+                if key in unique_passwords:
+                    rejected_by['keep_unique'] += 1
+                    continue
+                unique_passwords.add(key)
+            stats['filtered_passwords'] += 1
+            yield password
+
+    def _monitor(self, desc, counters, lines_key, total=None, position=None):
+        """إنشاء مراقب تقدم بإعدادات ملف المقاييس الخاصة بهذه الأداة"""
+        return ProgressMonitor(desc, counters, lines_key, total=total, position=position,
+                               metrics_file=self.metrics_file, metrics_format=self.metrics_format)
+
+    @staticmethod
+    def _finish_filter_stats(stats, start_time):
+        """إكمال إحصاءات التصفية بالنسب والوقت والمعدل"""
+        total_count = stats['total_passwords']
+        filtered_count = stats['filtered_passwords']
+        elapsed_time = time.time() - start_time
+        stats.update({
+            'filtered_percentage': (filtered_count / total_count) * 100 if total_count > 0 else 0,
+            'time_elapsed': elapsed_time,
+            'passwords_per_second': total_count / elapsed_time if elapsed_time > 0 else 0
+        })
+        return stats
+
+    def filter_large_file(self, input_file, output_file, filters, compression=None, workers=None,
+                          checkpoint_interval=CHECKPOINT_INTERVAL, resume=False,
+                          shards=None, shard_by='hash', shard_bytes=None):
+        """
+        تصفية ملف كبير من كلمات المرور مع دعم الذاكرة الفعالة
+        
+        المعايير المتاحة:
+        - min_length: الحد الأدنى لطول كلمة المرور
+        - max_length: الحد الأقصى لطول كلمة المرور
+        - require_upper: تتطلب حرف كبير على الأقل
+        - require_lower: تتطلب حرف صغير على الأقل
+        - require_digit: تتطلب رقم على الأقل
+        - require_special: تتطلب رمز خاص على الأقل
+        - exclude_common: استبعاد كلمات المرور الشائعة
+        - exclude_weak_patterns: استبعاد الأنماط الضعيفة
+        - custom_regex: تعبير نمطي مخصص للاستبعاد
+        - regex_file: ملف تعابير استبعاد، تعبير في كل سطر (انظر RegexSet)؛ ومعه
+          allow_risky_regex لقبول الأنماط المعرضة للتراجع الكارثي
+        - keep_unique: الاحتفاظ بالكلمات الفريدة فقط
+
+        الملفات المضغوطة (.gz/.xz/.bz2) تُكتشف تلقائياً وتُفك في خيط خلفي، ويُضغط
+        الإخراج حسب compression أو امتداد ملف الإخراج.
+        تعمل التصفية كخط أنابيب (انظر _filter_pipeline)؛ workers > 1 يوزع تقييم المعايير
+        على عدة عمليات.
+
+        كل checkpoint_interval ثانية يُفرَّغ ملف الإخراج إلى القرص (fsync) وتُكتب نقطة
+        استئناف (output_file + '.ckpt') بإزاحتي الإدخال والإخراج والإحصاءات حتى الآن.
+        مع resume=True يُقص الإخراج إلى آخر نقطة وتُكمل التصفية منها، فيطابق الناتج
+        تشغيلاً لم ينقطع. مجموعة keep_unique لا تُنسخ في نقطة الاستئناف لأنها تساوي
+        أسطر الإخراج حتى إزاحته، فتُبنى منها عند الاستئناف.
+        نقاط الاستئناف متاحة للإدخال والإخراج غير المضغوطين فقط.
+
+        مع shards أو shard_bytes يصبح output_file بادئة لملفات أجزاء تُكتب مباشرة من
+        مرور التصفية (انظر ShardedOutput)، دون مرور ثانٍ بـ split_large_file.
+
+        كل كلمة مقبولة تُكتب ببايتاتها الأصلية كما في الإدخال (بعد strip)، فالأسطر غير
+        UTF-8 لا يُعاد ترميزها. stats['encodings'] يعدّ الأسطر لكل فئة ترميز
+        (ascii و utf8 و non_utf8) و decode_fallbacks يساوي عدد non_utf8.
+        """
+        sharded = bool(shards or shard_bytes)
+        if resume and sharded:
+            raise ValueError("الاستئناف غير مدعوم مع الإخراج المجزأ")
+        if detect_compression(input_file):
+            if resume:
+                raise ValueError("الاستئناف غير مدعوم للملفات المضغوطة")
+            with open_wordlist_input(input_file) as stream:
+                return self.filter_stream(stream, output_file, filters, compression=compression, workers=workers,
+                                          shards=shards, shard_by=shard_by, shard_bytes=shard_bytes)
+
+        start_time = time.time()
+        stats = {}
+        
+        # حجم الملف (لشريط التقدم)
+        file_size = os.path.getsize(input_file)
+
+        checkpoint_file = output_file + CHECKPOINT_SUFFIX
+        if sharded:
+            checkpoint_interval = None
+        elif output_compression(output_file, compression) is not None:
+            if resume:
+                raise ValueError("الاستئناف غير مدعوم لملفات الإخراج المضغوطة")
+            checkpoint_interval = None
+        identity = {
+            'input': os.path.abspath(input_file),
+            'input_size': file_size,
+            'input_mtime_ns': os.stat(input_file).st_mtime_ns,
+            'filters': filters
+        }
+        checkpoint = self._load_checkpoint(checkpoint_file, identity, output_file) if resume else None
+        input_offset, output_offset = 0, None
+        unique_passwords = None
+        if checkpoint is not None:
+            input_offset, output_offset = checkpoint['input_offset'], checkpoint['output_offset']
+            stats = checkpoint['stats']
+            stats['rejected_by'] = defaultdict(int, stats['rejected_by'])
+            if filters.get('keep_unique', False):
+                unique_passwords = _read_output_lines(output_file, output_offset)
+        
+        # استخدام mmap لمعالجة الملف الكبير بكفاءة؛ يُغلق مع الخروج ولو فشل أحد العمال
+        with open(input_file, 'rb') as infile, \
+                (mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) if file_size else io.BytesIO()) as source:
+            source.seek(input_offset)
+            
+            if sharded:
+                output = ShardedOutput(output_file, shards or 1, shard_by, shard_bytes, compression)
+            else:
+                output = open_wordlist_output(output_file, compression, resume_offset=output_offset)
+            with output as outfile:
+                save_checkpoint = None
+                if checkpoint_interval:
+                    save_checkpoint = self._checkpointer(checkpoint_file, identity, outfile, stats,
+                                                         checkpoint_interval)
+                self._filter_pipeline(source, outfile, filters, stats, "معالجة الملف", workers,
+                                      total=file_size, start_offset=input_offset,
+                                      unique_passwords=unique_passwords, checkpoint=save_checkpoint)
+
+        # اكتمل الإخراج فلم تعد نقطة الاستئناف لازمة
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        if sharded:
+            stats['output_files'] = output.files
+        
+        return self._finish_filter_stats(stats, start_time)
+
+    @staticmethod
+    def _checkpointer(checkpoint_file, identity, outfile, stats, interval):
+        """دالة تُستدعى بعد كل كتلة مكتوبة وتحفظ نقطة استئناف كل interval ثانية"""
+        last = [time.monotonic()]
+
+        def save(input_offset):
+            now = time.monotonic()
+            if now - last[0] < interval:
+                return
+            last[0] = now
+            # الإخراج على القرص أولاً، ثم نقطة الاستئناف التي تشير إليه
+            outfile.flush()
+            os.fsync(outfile.fileno())
+            checkpoint = {
+                'version': CHECKPOINT_VERSION,
+                'identity': identity,
+                'input_offset': input_offset,
+                'output_offset': os.fstat(outfile.fileno()).st_size,
+                'stats': stats
+            }
+            tmp_file = checkpoint_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, checkpoint_file)
+
+        return save
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_file, identity, output_file):
+        """تحميل نقطة الاستئناف إن وُجدت والتحقق من أنها تخص الإدخال والمعايير نفسها"""
+        try:
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # الكتابة عبر ملف مؤقت ثم os.replace، فالملف الممزق ليس من هذه الأداة أو تلف على القرص
+            raise ValueError(f"نقطة الاستئناف {checkpoint_file} تالفة") from None
+        if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('identity') != identity:
+            raise ValueError(f"نقطة الاستئناف {checkpoint_file} لا تطابق ملف الإدخال أو معايير التصفية")
+        if not os.path.exists(output_file) or os.path.getsize(output_file) < checkpoint['output_offset']:
+            raise ValueError(f"ملف الإخراج {output_file} أقصر من نقطة الاستئناف")
+        return checkpoint
+
+    def filter_stream(self, stream, output_file, filters, compression=None, workers=None,
+                      shards=None, shard_by='hash', shard_bytes=None):
+        """
+        تصفية تدفق ثنائي (مثل stdin أو مخرجات أداة فك ضغط) دون الحاجة إلى ملف على القرص
+
+        تُقرأ البيانات بكتل كبيرة وتُطبَّق المعايير نفسها المستخدمة في filter_large_file.
+        """
+        start_time = time.time()
+        stats = {}
+        reader = io.BufferedReader(stream, buffer_size=STREAM_BUFFER_SIZE) if isinstance(stream, io.RawIOBase) else stream
+
+        if shards or shard_bytes:
+            output = ShardedOutput(output_file, shards or 1, shard_by, shard_bytes, compression)
+        else:
+            output = open_wordlist_output(output_file, compression)
+        with output as outfile:
+            self._filter_pipeline(reader, outfile, filters, stats, "معالجة التدفق", workers)
+        if isinstance(output, ShardedOutput):
+            stats['output_files'] = output.files
+
+        return self._finish_filter_stats(stats, start_time)
+
+    def _filter_pipeline(self, source, outfile, filters, stats, desc, workers=None, total=None,
+                         start_offset=0, unique_passwords=None, checkpoint=None):
+        """
+        خط أنابيب من ثلاث مراحل: قارئ ← عمال التقييم ← كاتب مرتب
+
+        خيط القارئ يقطع المصدر (mmap أو تدفق) إلى كتل من أسطر كاملة في طابور محدود،
+        وتُقيَّم الكتل في خيط عامل (أو workers عملية)، ويكتب هذا الخيط النتائج بترتيب
+        الإدخال ويطبق keep_unique. عدد الكتل في الذاكرة محدود بحجم الطابور والكتل الجارية.
+
+        عند الاستئناف تحمل stats و unique_passwords الحالة المستعادة و start_offset موضع
+        المصدر؛ و checkpoint (إن مُرِّرت) تُستدعى بإزاحة الإدخال بعد كتابة كل كتلة.
+        مع ذاكرة التخزين (cache_dir) تُؤخذ نتائج الكتل غير المتغيرة منها (انظر FilterCache).
+        """
+        for key in ('total_passwords', 'filtered_passwords', 'decode_fallbacks'):
+            stats.setdefault(key, 0)
+        # قبل إنشاء العمال حتى تنسخ العمليات المجموعة المحدثة
+        self._reload_regex_file(filters)
+        stats.setdefault('encodings', dict.fromkeys(ENCODING_CLASSES, 0))
+        stats.setdefault('rejected_by', defaultdict(int))
+        block_filters = {key: value for key, value in filters.items() if key != 'keep_unique'}
+        if unique_passwords is None and filters.get('keep_unique', False):
+            unique_passwords = set()
+        progress = {'offset': start_offset}
+        sharded = isinstance(outfile, ShardedOutput)
+        blocks = queue.Queue(maxsize=PIPELINE_QUEUE_BLOCKS)
+        stop = threading.Event()
+
+        def read_blocks():
+            try:
+                for block in _read_line_blocks(source):
+                    if stop.is_set():
+                        break
+                    blocks.put(block)
+                blocks.put(None)
+            except BaseException as e:
+                blocks.put(e)
+
+        cache = self.filter_cache
+        if cache is not None:
+            config = FilterCache.config_key(self, block_filters)
+            stats.setdefault('cache_hits', 0)
+            stats.setdefault('cache_misses', 0)
+        if workers and workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            evaluate = _filter_block_in_worker
+            if cache is not None:
+                evaluate = functools.partial(_filter_block_in_worker, cache=cache, config=config)
+        else:
+            evaluate = functools.partial(_filter_block, self)
+            if cache is not None:
+                evaluate = functools.partial(cache.filter_block, self, config=config)
+        max_in_flight = 2 * max(workers or 1, 1)
+        in_flight = collections.deque()
+
+        def write_result(future, block_size):
+            passwords, lines, rejected_by, encodings, *cached = future.result()
+            if cached:
+                stats['cache_hits' if cached[0] else 'cache_misses'] += 1
+            stats['total_passwords'] += lines
+            for encoding, count in encodings.items():
+                stats['encodings'][encoding] += count
+            stats['decode_fallbacks'] += encodings['non_utf8']
+            for name, count in rejected_by.items():
+                stats['rejected_by'][name] += count
+            if unique_passwords is not None:
+                kept = []
+                for password in passwords:
+                    if password in unique_passwords:
+                        stats['rejected_by']['keep_unique'] += 1
+                    else:
+                        unique_passwords.add(password)
+                        kept.append(password)
+                passwords = kept
+            if passwords:
+                if sharded:
+                    outfile.write_passwords(passwords)
+                else:
+                    outfile.write(b'\n'.join(passwords) + b'\n')
+            stats['filtered_passwords'] += len(passwords)
+            progress['offset'] += block_size
+            if checkpoint is not None:
+                checkpoint(progress['offset'])
+
+        position = (lambda: progress['offset']) if total is not None else None
+        reader = threading.Thread(target=read_blocks, daemon=True)
+        if workers and workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_filter_worker, initargs=(self,))
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=1)
+        completed = False
+        try:
+            reader.start()
+            with self._monitor(desc, stats, 'total_passwords', total=total, position=position):
+                while True:
+                    block = blocks.get()
+                    if isinstance(block, BaseException):
+                        raise block
+                    if block is None:
+                        break
+                    in_flight.append((executor.submit(evaluate, block, block_filters), len(block)))
+                    if len(in_flight) >= max_in_flight:
+                        write_result(*in_flight.popleft())
+                while in_flight:
+                    write_result(*in_flight.popleft())
+            completed = True
+        finally:
+            stop.set()
+            # بعد خطأ (كاستثناء في أحد العمال) تُلغى الكتل التي لم تبدأ بدل انتظار تقييمها
+            executor.shutdown(wait=True, cancel_futures=not completed)
+            # تحرير القارئ إن كان ينتظر مكاناً في الطابور
+            while reader.is_alive():
+                try:
+                    blocks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if reader.ident is not None:
+                reader.join()
+        if cache is not None:
+            cache.evict()
+    
+    def filter_multi_policy(self, input_file, policies, compression=None):
+        """
+        تقييم عدة سياسات تصفية في مرور واحد على الملف
+
+        policies: قاموس {اسم السياسة: {'output': ملف الإخراج، 'filters': معايير التصفية}}
+        يُقرأ كل سطر ويُفك ترميزه مرة واحدة، وتُحسب الفحوص المشتركة مرة واحدة لكل السياسات،
+        ثم يُكتب ببايتاته الأصلية إلى ملف إخراج كل سياسة تقبله. تُرجع إحصاءات مستقلة لكل سياسة.
+        """
+        start_time = time.time()
+        counters = {'total_passwords': 0, 'decode_fallbacks': 0, 'encodings': dict.fromkeys(ENCODING_CLASSES, 0)}
+        # خصائص السطر الحالي المشتركة بين فحوص كل السياسات
+        features = _PasswordFeatures(self)
+        states = []
+        policy_stats = {}
+        try:
+            for name, policy in policies.items():
+                stats = {'total_passwords': 0, 'filtered_passwords': 0, 'rejected_by': defaultdict(int)}
+                policy_stats[name] = stats
+                filters = policy.get('filters', {})
+                self._reload_regex_file(filters)
+                unique = set() if filters.get('keep_unique', False) else None
+                outfile = open_wordlist_output(policy['output'], compression)
+                states.append((self._rejector(filters, features), unique, outfile, stats))
+
+            with _open_input_lines(input_file) as (lines, position, total):
+                with self._monitor("تقييم السياسات", counters, 'total_passwords', total=total, position=position):
+                    for line in lines:
+                        password, encoding = _decode_line(line)
+                        counters['encodings'][encoding] += 1
+                        if encoding == 'non_utf8':
+                            counters['decode_fallbacks'] += 1
+                        counters['total_passwords'] += 1
+                        features.reset(password)
+                        original = None
+
+                        for reject, unique, outfile, stats in states:
+                            rejected = reject(password)
+                            if rejected is not None:
+                                stats['rejected_by'][rejected] += 1
+                                continue
+                            if original is None:
+                                original = password.encode('latin-1' if encoding == 'non_utf8' else 'utf-8') + b'\n'
+                            if unique is not None:
+                                if original in unique:
+                                    stats['rejected_by']['keep_unique'] += 1
+                                    continue
+                                unique.add(original)
+                            stats['filtered_passwords'] += 1
+                            outfile.write(original)
+        finally:
+            for _, _, outfile, _ in states:
+                outfile.close()
+
+        for stats in policy_stats.values():
+            stats['total_passwords'] = counters['total_passwords']
+            stats['decode_fallbacks'] = counters['decode_fallbacks']
+            stats['encodings'] = dict(counters['encodings'])
+            self._finish_filter_stats(stats, start_time)
+        return policy_stats
+
+    def _new_analysis_stats(self, sketches=True):
+        """
+        إنشاء بنية إحصاءات تحليل فارغة
+
+        مع sketches تُضاف مخططات قابلة للدمج بذاكرة ثابتة: distinct (HyperLogLog لعدد
+        الكلمات المختلفة) و length_quantiles (LengthQuantileSketch لكل فئة تركيبة).
+        """
+        stats = {
+            'length_dist': defaultdict(int),
+            'composition': defaultdict(int),
+            'common_count': 0,
+            'weak_pattern_count': 0,
+            'weak_pattern_hits': defaultdict(int),
+            # مدرج القوة التقديرية: بداية كل سلة بعرض STRENGTH_BUCKET بت -> العدد
+            'strength': defaultdict(int),
+            'total': 0
+        }
+        if sketches:
+            stats['distinct'] = HyperLogLog()
+            stats['length_quantiles'] = defaultdict(LengthQuantileSketch)
+        return stats
+
+    @staticmethod
+    def merge_analysis_stats(stats, other):
+        """دمج إحصاءات تحليل جزء آخر أو ملف آخر في stats (العدادات تُجمع والمخططات تُدمج)"""
+        for key, value in other.items():
+            if key in ('length_dist', 'composition', 'weak_pattern_hits', 'strength'):
+                for item, count in value.items():
+                    stats[key][item] += count
+            elif key == 'distinct':
+                stats[key].merge(value)
+            elif key == 'length_quantiles':
+                for composition, sketch in value.items():
+                    stats[key][composition].merge(sketch)
+            else:
+                stats[key] += value
+        return stats
+
+    def _analyze_password(self, stats, password, raw=None):
+        """
+        إضافة كلمة مرور واحدة إلى إحصاءات التحليل
+
+        raw بايتات السطر الأصلية بعد strip، وبها يُحسب عدد الفريدة كما في مسار النواة
+        (add_many على بايتات الأسطر) فلا تندمج أسطر تختلف في بايتات فُقدت عند الفك.
+        """
+        stats['total'] += 1
+
+        # تحليل الطول
+        length = len(password)
+        stats['length_dist'][length] += 1
+
+        # تحليل التركيبة
+        has_upper = re.search(r'[A-Z]', password)
+        has_lower = re.search(r'[a-z]', password)
+        has_digit = re.search(r'[0-9]', password)
+        has_special = re.search(r'[^A-Za-z0-9]', password)
+
+        composition = _composition_class(has_upper, has_lower, has_digit, has_special)
+        stats['composition'][composition] += 1
+        if 'distinct' in stats:
+            stats['distinct'].add(password.encode('utf-8') if raw is None else raw)
+            stats['length_quantiles'][composition].add(length)
+
+        # التحقق من كلمات المرور الشائعة
+        if password.lower() in self.common_passwords:
+            stats['common_count'] += 1
+
+        # التحقق من الأنماط الضعيفة
+        weak_match = self.weak_pattern_match(password)
+        if weak_match is not None:
+            stats['weak_pattern_count'] += 1
+            stats['weak_pattern_hits'][weak_match] += 1
+
+        stats['strength'][int(self.password_strength(password) // STRENGTH_BUCKET) * STRENGTH_BUCKET] += 1
+
+    def _analyze_block(self, stats, block):
+        """
+        تحليل كتلة من الأسطر الكاملة
+
+        مع NumPy يُحسب توزيع الأطوال والتركيبة والقوة لكل الكتلة دفعة واحدة عبر
+        _class_kernel و _strength_kernel، ويبقى فحص الشيوع والأنماط الضعيفة والقاموس لكل سطر. الأسطر التي لا تحسمها النواة
+        (غير ASCII أو بمسافات في أطرافها) تُحلَّل بالطريقة العادية.
+        """
+        if len(block) < KERNEL_MIN_BLOCK or _load_numpy() is None:
+            lines = block.split(b'\n')
+            if not lines[-1]:
+                lines.pop()
+            for line in lines:
+                self._analyze_password(stats, _decode_line(line)[0], line.strip())
+            return
+
+        block = block.replace(b'\r\n', b'\n')
+        starts, ends, lengths, masks, exact = _class_kernel(block)
+        exact_lengths = lengths[exact]
+        stats['total'] += int(exact.sum())
+        for length, count in enumerate(np.bincount(exact_lengths).tolist()):
+            if count:
+                stats['length_dist'][length] += count
+        for mask, count in enumerate(np.bincount(masks[exact], minlength=16).tolist()):
+            if count:
+                stats['composition'][COMPOSITION_BY_MASK[mask]] += count
+        distinct = stats.get('distinct')
+        if distinct is not None:
+            # أزواج (الفئة، الطول) الفريدة في الكتلة مع عددها
+            pairs, counts = np.unique(masks[exact].astype(np.int64) << 32 | exact_lengths, return_counts=True)
+            for pair, count in zip(pairs.tolist(), counts.tolist()):
+                stats['length_quantiles'][COMPOSITION_BY_MASK[pair >> 32]].add(pair & 0xFFFFFFFF, count)
+
+        common_passwords = self.common_passwords
+        strengths, predictable = _strength_kernel(block, starts, lengths, masks)
+        exact_lines = []
+        exact_passwords = []
+        for i, is_exact in enumerate(exact.tolist()):
+            line = block[starts[i]:ends[i]]
+            if not is_exact:
+                self._analyze_password(stats, _decode_line(line)[0], line.strip())
+                continue
+            exact_lines.append(line)
+            password = line.decode('ascii')
+            exact_passwords.append(password)
+            if password.lower() in common_passwords:
+                stats['common_count'] += 1
+            weak_match = self.weak_pattern_match(password)
+            if weak_match is not None:
+                stats['weak_pattern_count'] += 1
+                stats['weak_pattern_hits'][weak_match] += 1
+        hits, dictionary = self._dictionary_strengths(exact_passwords, starts[exact],
+                                                      np.array(STRENGTH_BITS)[masks[exact]], predictable)
+        hits = np.flatnonzero(exact)[hits]
+        strengths[hits] = np.minimum(strengths[hits], dictionary)
+        buckets = (strengths[exact] // STRENGTH_BUCKET).astype(np.int64)
+        for bucket, count in enumerate(np.bincount(buckets).tolist()):
+            if count:
+                stats['strength'][bucket * STRENGTH_BUCKET] += count
+        if distinct is not None:
+            distinct.add_many(exact_lines)
+
+    def _analysis_fingerprint(self):
+        """بصمة لإعدادات التحليل حتى لا يُعاد استخدام ملف جانبي بُني بقوائم مختلفة"""
+        digest = hashlib.sha256()
+        if isinstance(self.common_passwords, CommonPasswordStore):
+            digest.update(self.common_passwords.fingerprint().encode('utf-8'))
+        else:
+            for password in sorted(self.common_passwords):
+                digest.update(password.encode('utf-8', errors='replace') + b'\n')
+        digest.update(json.dumps(self.weak_patterns, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _hash_range(digest, mm, start, end, block_size=8 * 1024 * 1024):
+        """إضافة البايتات بين start و end إلى بصمة الجزء المفحوص من الملف"""
+        for pos in range(start, end, block_size):
+            digest.update(mm[pos:min(pos + block_size, end)])
+        return digest
+
+    def _load_analysis_sidecar(self, sidecar_file, mm, fingerprint):
+        """
+        تحميل الإحصاءات المحفوظة إذا كان الجزء المفحوص سابقاً لم يتغير
+
+        تُرجع (الإحصاءات أو None، الإزاحة، كائن sha256 للملف حتى الإزاحة) ليُكمل
+        الحفظ التالي البصمة بالجزء المضاف فقط بدل إعادة قراءة الملف من بدايته.
+        """
+        try:
+            with open(sidecar_file, 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError):
+            return None, 0, hashlib.sha256()
+
+        offset = sidecar.get('offset', 0)
+        if (sidecar.get('version') != ANALYSIS_SIDECAR_VERSION
+                or sidecar.get('fingerprint') != fingerprint
+                or offset > len(mm)):
+            return None, 0, hashlib.sha256()
+        digest = self._hash_range(hashlib.sha256(), mm, 0, offset)
+        if sidecar.get('prefix_sha256') != digest.hexdigest():
+            # الملف تغيّر (وليس مجرد إضافة في نهايته) أو تغيرت الإعدادات
+            return None, 0, hashlib.sha256()
+
+        stats = self._new_analysis_stats()
+        for key, value in sidecar['stats'].items():
+            if key in ('length_dist', 'strength'):
+                stats[key].update({int(k): v for k, v in value.items()})
+            elif key in ('composition', 'weak_pattern_hits'):
+                stats[key].update(value)
+            elif key == 'distinct':
+                stats[key] = HyperLogLog.from_dict(value)
+            elif key == 'length_quantiles':
+                stats[key].update({name: LengthQuantileSketch.from_dict(sketch) for name, sketch in value.items()})
+            else:
+                stats[key] = value
+        return stats, offset, digest
+
+    def _save_analysis_sidecar(self, sidecar_file, offset, digest, stats, fingerprint):
+        """حفظ الإحصاءات والإزاحة وبصمة الجزء المفحوص (كائن sha256 حتى offset) في ملف جانبي"""
+        sidecar = {
+            'version': ANALYSIS_SIDECAR_VERSION,
+            'fingerprint': fingerprint,
+            'offset': offset,
+            'prefix_sha256': digest.hexdigest(),
+            'stats': dict(stats, distinct=stats['distinct'].to_dict(),
+                          length_quantiles={name: sketch.to_dict()
+                                            for name, sketch in stats['length_quantiles'].items()})
+        }
+        tmp_file = sidecar_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(sidecar, f)
+        os.replace(tmp_file, sidecar_file)
+
+    def analyze_file(self, input_file, incremental=False, sample=None, confidence=0.95, seed=None, masks=None):
+        """
+        تحليل ملف كلمات المرور وإنتاج إحصاءات
+
+        عند تفعيل incremental يُكتب ملف جانبي (input_file + '.stats.json') يحفظ
+        الإحصاءات والإزاحة التي وصل إليها الفحص وبصمة الجزء المفحوص، فيُعالَج في
+        التشغيل التالي الجزء المضاف إلى نهاية الملف فقط.
+        الملفات المضغوطة تُحلَّل كتدفق كامل دون ملف جانبي.
+        مع sample=N تُقدَّر الإحصاءات من N سطراً عشوائياً فقط (انظر _analyze_sample).
+        مع masks=K يُحسب توزيع أقنعة البنية فقط (انظر analyze_masks).
+        """
+        if masks:
+            return self.analyze_masks(input_file, masks)
+        if sample:
+            return self._analyze_sample(input_file, sample, confidence, seed)
+        stats = self._new_analysis_stats()
+        if detect_compression(input_file):
+            with open_wordlist_input(input_file) as stream:
+                with self._monitor("تحليل الملف", stats, 'total'):
+                    for block in _read_line_blocks(stream):
+                        self._analyze_block(stats, block)
+            return stats
+
+        file_size = os.path.getsize(input_file)
+        if file_size == 0:
+            return stats
+
+        sidecar_file = input_file + ANALYSIS_SIDECAR_SUFFIX
+        fingerprint = self._analysis_fingerprint() if incremental else None
+
+        with open(input_file, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offset = 0
+                if incremental:
+                    saved_stats, offset, digest = self._load_analysis_sidecar(sidecar_file, mm, fingerprint)
+                    if saved_stats is not None:
+                        stats = saved_stats
+
+                # آخر سطر مكتمل؛ ما بعده قد يكتمل لاحقاً بالإضافة إلى الملف
+                complete_end = mm.rfind(b'\n') + 1
+                mm.seek(offset)
+
+                with self._monitor("تحليل الملف", stats, 'total', total=file_size, position=mm.tell):
+                    for block in _read_line_blocks(mm, limit=complete_end):
+                        self._analyze_block(stats, block)
+
+                    if incremental:
+                        # البصمة المحققة عند التحميل تُكمَل بالجزء المفحوص الآن فقط
+                        self._hash_range(digest, mm, offset, complete_end)
+                        self._save_analysis_sidecar(sidecar_file, complete_end, digest, stats, fingerprint)
+
+                    # السطر الأخير غير المكتمل يُحلَّل ولا يُحفظ في الملف الجانبي
+                    tail = mm.readline()
+                    if tail:
+                        self._analyze_password(stats, _decode_line(tail)[0], tail.strip())
+            finally:
+                mm.close()
+
+        return stats
+    
+    def analyze_masks(self, input_file, top_k=100):
+        """
+        توزيع أقنعة بنية كلمات المرور (مثل ullllldd) وتغطية الأكثر شيوعاً منها
+
+        كل كتلة تتحول إلى أقنعتها باستدعاء bytes.translate واحد عبر MASK_TABLE
+        (u كبير، l صغير، d رقم، s رمز أو مسافة، b بايت غير ASCII) ثم تُعدّ أقنعة الكتلة
+        بـ Counter وتُدمج في SpaceSaving محدود السعة، فلا توجد حلقة بايثون لكل حرف
+        أو لكل سطر. العدد المقدر لكل قناع يتجاوز الحقيقي بحد أقصى error_bound.
+        القناع محسوب على بايتات السطر كما هي (دون \r ودون strip).
+        """
+        counter = SpaceSaving(max(top_k * HEAVY_HITTERS_SLACK, MASK_CAPACITY))
+        counters = {'total': 0}
+
+        def count_block(block):
+            lines = block.translate(MASK_TABLE, b'\r').split(b'\n')
+            block_masks = collections.Counter(lines)
+            # السطر الأخير بعد آخر فاصل والأسطر الفارغة لا أقنعة لها
+            empty = block_masks.pop(b'', 0)
+            counters['total'] += len(lines) - empty
+            counter.update(block_masks)
+
+        if detect_compression(input_file):
+            with open_wordlist_input(input_file) as stream:
+                with self._monitor("حساب الأقنعة", counters, 'total'):
+                    for block in _read_line_blocks(stream):
+                        count_block(block)
+        elif os.path.getsize(input_file):
+            with open(input_file, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    with self._monitor("حساب الأقنعة", counters, 'total', total=len(mm), position=mm.tell):
+                        for block in _read_line_blocks(mm):
+                            count_block(block)
+                finally:
+                    mm.close()
+
+        total = counters['total']
+        top = []
+        covered = 0
+        for mask, count in counter.top(top_k):
+            covered += count
+            top.append({'mask': mask.decode('ascii'), 'count': count,
+                        'share': count / total, 'coverage': min(covered / total, 1.0)})
+        return {'total': total, 'top': top, 'error_bound': counter.error_bound}
+
+    def _analyze_sample(self, input_file, sample, confidence=0.95, seed=None):
+        """
+        تحليل تقريبي من عينة عشوائية من الأسطر مع فترات ثقة
+
+        تُختار إزاحات بايت عشوائية في mmap ويُؤخذ السطر الذي تقع فيه كل إزاحة، فلا
+        يُقرأ إلا جزء صغير من الملف. احتمال اختيار السطر يتناسب مع طوله، لذا يُوزن كل
+        سطر بمقلوب طوله. إن وُجد فهرس أسطر (.idx) تُسحب أرقام أسطر بانتظام دون أوزان
+        ويكون عدد الأسطر دقيقاً.
+        الأعداد في الناتج تقديرات للملف كاملاً، و stats['intervals'] يحمل فترات ثقة
+        Wilson للنسب (بحجم العينة الفعلي للأوزان) وفترة تقريبية لعدد الأسطر.
+        """
+        import statistics
+
+        if detect_compression(input_file):
+            raise ValueError("التحليل بالعينة يتطلب ملفاً غير مضغوط (وصول عشوائي)")
+        file_size = os.path.getsize(input_file)
+        # المخططات تحتاج كل الأسطر فلا تُقدَّر من عينة
+        stats = self._new_analysis_stats(sketches=False)
+        if file_size == 0:
+            return stats
+
+        rng = random.Random(seed)
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        index = LineIndex.load(input_file)
+        weighted = defaultdict(float)
+        weights = []
+
+        with open(input_file, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if index is not None:
+                    with index:
+                        spans = [index.line_range(line_no) for line_no in index.sample(sample, rng)]
+                        line_count = index.count
+                else:
+                    spans = []
+                    # إزاحات مرتبة حتى تُقرأ الصفحات بترتيب الملف
+                    for offset in sorted(rng.randrange(file_size) for _ in range(sample)):
+                        start = mm.rfind(b'\n', 0, offset) + 1
+                        end = mm.find(b'\n', offset)
+                        spans.append((start, file_size if end < 0 else end + 1))
+
+                for start, end in spans:
+                    line = mm[start:end]
+                    weight = 1.0 if index is not None else 1.0 / (end - start)
+                    weights.append(weight)
+                    password, _ = _decode_line(line)
+                    line_stats = self._new_analysis_stats(sketches=False)
+                    self._analyze_password(line_stats, password)
+                    for key in ('length_dist', 'composition', 'weak_pattern_hits', 'strength'):
+                        for value in line_stats[key]:
+                            weighted[key, value] += weight
+                    for key in ('common_count', 'weak_pattern_count'):
+                        weighted[key, None] += weight * line_stats[key]
+            finally:
+                mm.close()
+
+        n = len(weights)
+        total_weight = sum(weights)
+        effective_n = total_weight ** 2 / sum(w * w for w in weights)
+        if index is None:
+            # E[1/طول السطر] = عدد الأسطر / حجم الملف
+            mean = total_weight / n
+            spread = statistics.stdev(weights) / math.sqrt(n) if n > 1 else 0.0
+            line_count = round(file_size * mean)
+            total_interval = (max(round(file_size * (mean - z * spread)), 1), round(file_size * (mean + z * spread)))
+        else:
+            total_interval = (line_count, line_count)
+
+        intervals = {'total': total_interval, 'length_dist': {}, 'composition': {}, 'weak_pattern_hits': {},
+                     'strength': {}}
+        stats['total'] = line_count
+        for (key, value), share in weighted.items():
+            proportion = share / total_weight
+            estimate = round(proportion * line_count)
+            bounds = _wilson_interval(proportion, effective_n, z)
+            if value is None:
+                stats[key] = estimate
+                intervals[key] = bounds
+            else:
+                stats[key][value] = estimate
+                intervals[key][value] = bounds
+        for key in ('common_count', 'weak_pattern_count'):
+            intervals.setdefault(key, _wilson_interval(0.0, effective_n, z))
+        stats.update({'sampled': n, 'confidence': confidence, 'intervals': intervals})
+        return stats
+
+    def split_large_file(self, input_file, output_prefix, chunk_size=1000000, chunk_bytes=None, workers=None,
+                         compression=None):
+        """
+        تقسيم ملف كبير إلى أجزاء أصغر
+
+        تُحدَّد نقاط القطع على حدود الأسطر مباشرة من mmap ثم تُنسخ نطاقات البايتات
+        كاملة عبر os.copy_file_range أو os.sendfile دون المرور بكائنات بايثون.
+        - chunk_size: عدد الأسطر في كل جزء (تُعدّ الأسطر على التوازي)
+        - chunk_bytes: الحجم التقريبي لكل جزء بالبايت (يتقدم على chunk_size)
+        - compression: ضغط كل جزء كملف مستقل قابل لفك الضغط وحده (gz/xz/bz2)
+        """
+        if compression or detect_compression(input_file):
+            return self._split_stream(input_file, output_prefix, chunk_size, chunk_bytes, compression)
+
+        file_size = os.path.getsize(input_file)
+        if file_size == 0:
+            return 0
+
+        index = None if chunk_bytes else LineIndex.load(input_file)
+        if chunk_bytes:
+            cuts = _find_byte_cuts(input_file, chunk_bytes)
+        elif index is not None:
+            # الفهرس يعطي حدود الأسطر مباشرة دون مسح الملف
+            with index:
+                cuts = index.line_cuts(chunk_size)
+        else:
+            cuts = _find_line_cuts_parallel(input_file, file_size, chunk_size, workers)
+
+        bounds = [0] + cuts + [file_size]
+        file_count = 0
+        with open(input_file, 'rb') as infile:
+            with tqdm(total=file_size, unit='B', unit_scale=True, desc="تقسيم الملف") as pbar:
+                for start, end in zip(bounds, bounds[1:]):
+                    if end <= start:
+                        continue
+                    file_count += 1
+                    with open(f"{output_prefix}_{file_count}.txt", 'wb') as outfile:
+                        _copy_range(infile.fileno(), outfile.fileno(), start, end - start)
+                    pbar.update(end - start)
+
+        return file_count
+
+    def sort_large_file(self, input_file, output_file, order='lex', unique=False, memory_mb=512,
+                        workers=None, tmp_dir=None, compression=None):
+        """
+        فرز ملف كبير بالدمج الخارجي ضمن ميزانية ذاكرة محددة
+
+        - order: lex (ترتيب البايتات)، length (الطول ثم الترتيب)، frequency (الأكثر تكراراً أولاً)
+        - unique: حذف التكرار أثناء الدمج
+        - memory_mb: ميزانية الذاكرة الإجمالية للمقاطع المفروزة في الوقت نفسه
+        تُفرز المقاطع على التوازي في عدة عمليات وتُكتب إلى ملفات مؤقتة ثم تُدمج بـ heapq.merge.
+        """
+        start_time = time.time()
+        workers = workers or os.cpu_count() or 1
+        run_bytes = max(SPLIT_SCAN_BLOCK, memory_mb * 1024 * 1024 // (workers * SORT_MEMORY_FACTOR))
+        work_dir = tempfile.mkdtemp(prefix='pwsort_', dir=tmp_dir)
+        stats = {'total_lines': 0, 'output_lines': 0, 'runs': 0}
+
+        try:
+            if order == 'frequency':
+                # المرحلة الأولى: عدّ التكرارات بفرز معجمي مع تجميع المتساوي
+                counted = os.path.join(work_dir, 'counted.txt')
+                runs = self._sort_runs(input_file, 'count', work_dir, run_bytes, workers, stats)
+                with open(counted, 'wb', buffering=STREAM_BUFFER_SIZE) as out:
+                    for line in _merge_runs(runs, 'count', work_dir):
+                        out.write(line + b'\n')
+                # حذف مقاطع المرحلة الأولى قبل بدء الثانية لتوفير المساحة المؤقتة
+                for name in os.listdir(work_dir):
+                    if os.path.join(work_dir, name) != counted:
+                        os.remove(os.path.join(work_dir, name))
+                # المرحلة الثانية: فرز الأزواج (العدد، الكلمة) تنازلياً حسب العدد
+                stage_stats = {'total_lines': 0, 'output_lines': 0, 'runs': 0}
+                runs = self._sort_runs(counted, 'frequency', work_dir, run_bytes, workers, stage_stats)
+                stats['runs'] += stage_stats['runs']
+                merged = (line.partition(b'\t')[2] for line in _merge_runs(runs, 'frequency', work_dir))
+            else:
+                runs = self._sort_runs(input_file, order, work_dir, run_bytes, workers, stats)
+                merged = _merge_runs(runs, order, work_dir)
+                if unique:
+                    merged = (line for line, _ in itertools.groupby(merged))
+
+            with open_wordlist_output(output_file, compression) as out:
+                with self._monitor("دمج المقاطع", stats, 'output_lines'):
+                    for line in merged:
+                        out.write(line + b'\n')
+                        stats['output_lines'] += 1
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        stats['time_elapsed'] = time.time() - start_time
+        return stats
+
+    def _sort_runs(self, input_file, order, work_dir, run_bytes, workers, stats):
+        """إنشاء المقاطع المفرزة وإرجاع مسارات ملفاتها"""
+        runs = []
+        if detect_compression(input_file):
+            # التدفق المضغوط لا يُقسَّم بالبايت، فتُفرز مقاطعه تباعاً في هذه العملية
+            with open_wordlist_input(input_file) as stream:
+                with self._monitor("فرز المقاطع", stats, 'total_lines'):
+                    while True:
+                        chunk = stream.readlines(run_bytes)
+                        if not chunk:
+                            break
+                        run_file = os.path.join(work_dir, f'run_{order}_{len(runs)}.txt')
+                        stats['total_lines'] += _write_sorted_run(chunk, order, run_file)
+                        runs.append(run_file)
+        else:
+            file_size = os.path.getsize(input_file)
+            if file_size == 0:
+                return runs
+            bounds = [0] + _find_byte_cuts(input_file, run_bytes) + [file_size]
+            ranges = [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+            run_files = [os.path.join(work_dir, f'run_{order}_{i}.txt') for i in range(len(ranges))]
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                with self._monitor("فرز المقاطع", stats, 'total_lines'):
+                    for count in pool.map(_sort_range, itertools.repeat(input_file), *zip(*ranges),
+                                          itertools.repeat(order), run_files):
+                        stats['total_lines'] += count
+            runs.extend(run_files)
+        stats['runs'] += len(runs)
+        return runs
+
+    def top_frequencies(self, input_file, top_n=100, memory_mb=256, depth=4):
+        """
+        تقدير كلمات المرور الأكثر تكراراً بذاكرة ثابتة
+
+        يمر الملف عبر Count-Min Sketch مع كومة محدودة للمرشحين الأكثر تكراراً، فيبقى
+        استهلاك الذاكرة ثابتاً مهما كان حجم الملف. كل تقدير أكبر من العدد الحقيقي أو
+        يساويه، ويتجاوزه بحد أقصى error_bound باحتمال confidence.
+        """
+        sketch = CountMinSketch.from_memory(memory_mb, depth)
+        hitters = HeavyHitters(sketch, capacity=top_n * HEAVY_HITTERS_SLACK)
+        counters = {'total': 0}
+
+        with open_wordlist_input(input_file) as stream:
+            with self._monitor("عدّ التكرارات", counters, 'total'):
+                for line in stream:
+                    counters['total'] += 1
+                    hitters.add(line.rstrip(b'\r\n'))
+
+        error_bound = sketch.error_rate * counters['total']
+        top = []
+        for key, estimate in hitters.top(top_n):
+            try:
+                password = key.decode('utf-8')
+            except UnicodeDecodeError:
+                password = key.decode('latin-1')
+            top.append({'password': password, 'estimate': estimate,
+                        'lower_bound': max(estimate - int(error_bound), 0)})
+        return {
+            'total': counters['total'],
+            'top': top,
+            'error_bound': error_bound,
+            'confidence': sketch.confidence
+        }
+
+    def set_operation(self, operation, file_a, file_b, output_file, memory_mb=512, workers=None,
+                      sorted_inputs=False, tmp_dir=None, compression=None):
+        """
+        عمليات المجموعات بين قائمتين كبيرتين بذاكرة محدودة
+
+        - operation: diff (ما في A وليس في B)، intersect (المشترك)، union (الاتحاد)
+        الناتج بلا تكرار. إذا كانت القائمتان مفروزتين (ترتيب البايتات كما في --sort lex)
+        يُستخدم دمج خطي يحافظ على الترتيب، وإلا تُجزَّأ القائمتان بالتجزئة إلى أقسام على
+        القرص وتُعالَج أزواج الأقسام على التوازي (ترتيب الناتج حسب القسم).
+        """
+        if operation not in SET_OPERATIONS:
+            raise ValueError(f"عملية غير مدعومة: {operation}")
+        start_time = time.time()
+        stats = {'lines_a': 0, 'lines_b': 0, 'output_lines': 0}
+
+        if sorted_inputs:
+            with open_wordlist_input(file_a) as a, open_wordlist_input(file_b) as b, \
+                    open_wordlist_output(output_file, compression) as out:
+                with self._monitor("دمج القائمتين", stats, 'output_lines'):
+                    for line in _merge_set_operation(operation, _counted_lines(a, stats, 'lines_a'),
+                                                     _counted_lines(b, stats, 'lines_b')):
+                        out.write(line + b'\n')
+                        stats['output_lines'] += 1
+            stats['time_elapsed'] = time.time() - start_time
+            return stats
+
+        workers = workers or os.cpu_count() or 1
+        input_bytes = os.path.getsize(file_a) + os.path.getsize(file_b)
+        budget = max(1, memory_mb * 1024 * 1024 // (workers * SORT_MEMORY_FACTOR))
+        partitions = max(workers, min(SET_MAX_PARTITIONS, -(-input_bytes // budget)))
+        work_dir = tempfile.mkdtemp(prefix='pwset_', dir=tmp_dir)
+        try:
+            for name, path, key in (('a', file_a, 'lines_a'), ('b', file_b, 'lines_b')):
+                with self._monitor(f"تجزئة القائمة {name.upper()}", stats, key):
+                    _hash_partition(path, os.path.join(work_dir, name), partitions, stats, key)
+
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_set_operation_partition, itertools.repeat(operation),
+                                      itertools.repeat(work_dir), range(partitions)))
+
+            compression = output_compression(output_file, compression)
+            with open_wordlist_output(output_file, compression) as out:
+                for part_file, count in parts:
+                    stats['output_lines'] += count
+                    with open(part_file, 'rb') as part:
+                        if compression:
+                            shutil.copyfileobj(part, out, STREAM_BUFFER_SIZE)
+                        else:
+                            # الأقسام غير المضغوطة تُلصق داخل النواة دون المرور ببايثون
+                            out.flush()
+                            _copy_range(part.fileno(), out.fileno(), 0, os.path.getsize(part_file))
+                    os.remove(part_file)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        stats['partitions'] = partitions
+        stats['time_elapsed'] = time.time() - start_time
+        return stats
+
+    def _split_stream(self, input_file, output_prefix, chunk_size, chunk_bytes, compression):
+        """تقسيم سطري عبر تدفق، لملفات مضغوطة أو لإخراج مضغوط"""
+        suffix = '.txt' + (f'.{compression}' if compression else '')
+        file_count = 0
+        outfile = None
+        lines = 0
+        written = 0
+        counters = {'lines': 0}
+        with open_wordlist_input(input_file) as infile, self._monitor("تقسيم الملف", counters, 'lines'):
+            for line in infile:
+                counters['lines'] += 1
+                if outfile is None or (written >= chunk_bytes if chunk_bytes else lines >= chunk_size):
+                    if outfile is not None:
+                        outfile.close()
+                    file_count += 1
+                    outfile = open_wordlist_output(f"{output_prefix}_{file_count}{suffix}", compression)
+                    lines = written = 0
+                outfile.write(line)
+                lines += 1
+                written += len(line)
+        if outfile is not None:
+            outfile.close()
+        return file_count
+
+
+def _filter_block(tool, block, filters, with_lines=False):
+    """
+    تقييم المعايير على كتلة من الأسطر الكاملة
+
+    تُفك الكتلة عبر _decode_block (مسار سريع للكتل ASCII، ولا فك لسطر على حدة إلا إذا
+    لم يكن UTF-8). تُرجع (البايتات الأصلية للمقبولة، عدد الأسطر، المرفوض لكل معيار،
+    عدد الأسطر لكل فئة ترميز)، ومع with_lines أيضاً أرقام الأسطر المقبولة داخل الكتلة.
+    """
+    if (len(block) >= KERNEL_MIN_BLOCK and any(key in filters for key in KERNEL_FILTERS)
+            and _load_numpy() is not None):
+        result = _filter_block_vectorized(tool, block, filters, with_lines)
+        if result is not None:
+            return result
+
+    passwords, non_utf8, encodings = _decode_block(block)
+    rejected_by = defaultdict(int)
+    kept = range(len(passwords))
+    if any(key in filters for key in FILTER_PREDICATES):
+        reject = tool._rejector(filters)
+        kept = []
+        for i, password in enumerate(passwords):
+            rejected = reject(password)
+            if rejected is None:
+                kept.append(i)
+            else:
+                rejected_by[rejected] += 1
+    accepted = _original_bytes(passwords, kept, non_utf8)
+    if with_lines:
+        return accepted, len(passwords), rejected_by, encodings, kept
+    return accepted, len(passwords), rejected_by, encodings
+
+
+# بايتات غير صالحة كـ UTF-8 بعد الفك بـ surrogateescape
+_UTF8_ESCAPES = re.compile('[\udc80-\udcff]')
+
+
+def _decode_block(block):
+    """
+    فك كتلة من الأسطر الكاملة إلى كلمات مرور (بعد strip) مع تصنيف ترميز أسطرها
+
+    الكتلة ASCII بالكامل (فحص isascii واحد) تُفك دفعة واحدة دون فحص لكل سطر. غيرها
+    تُفك مرة واحدة بـ UTF-8 مع surrogateescape فلا تُرمى استثناءات، ولا يُفحص إلا
+    السطر غير ASCII: إن ظهرت فيه بايتات غير صالحة يُفك ذلك السطر وحده بـ latin-1.
+    تُرجع (كلمات المرور، أرقام الأسطر غير UTF-8، عدد الأسطر لكل فئة ترميز).
+    """
+    if block.isascii():
+        lines = block.decode('ascii').split('\n')
+        if not lines[-1]:
+            lines.pop()
+        return [line.strip() for line in lines], [], {'ascii': len(lines), 'utf8': 0, 'non_utf8': 0}
+
+    lines = block.decode('utf-8', 'surrogateescape').split('\n')
+    if not lines[-1]:
+        lines.pop()
+    passwords = [line.strip() for line in lines]
+    wide = [i for i, line in enumerate(lines) if not line.isascii()]
+    non_utf8 = [i for i in wide if _UTF8_ESCAPES.search(lines[i])]
+    for i in non_utf8:
+        passwords[i] = lines[i].encode('utf-8', 'surrogateescape').decode('latin-1').strip()
+    return passwords, non_utf8, {'ascii': len(lines) - len(wide), 'utf8': len(wide) - len(non_utf8),
+                                 'non_utf8': len(non_utf8)}
+
+
+def _decode_line(line):
+    """فك سطر واحد: (كلمة المرور بعد strip، فئة ترميزه)"""
+    if line.isascii():
+        return line.decode('ascii').strip(), 'ascii'
+    try:
+        return line.decode('utf-8').strip(), 'utf8'
+    except UnicodeDecodeError:
+        return line.decode('latin-1').strip(), 'non_utf8'
+
+
+def _original_bytes(passwords, indices, non_utf8):
+    """
+    بايتات passwords[indices] كما كانت في الإدخال
+
+    الفك بـ UTF-8 أو latin-1 قابل للعكس، فإعادة الترميز بالترميز نفسه الذي فُك به
+    السطر تعيد بايتاته الأصلية.
+    """
+    if not non_utf8:
+        return [passwords[i].encode('utf-8') for i in indices]
+    non_utf8 = set(non_utf8)
+    return [passwords[i].encode('latin-1' if i in non_utf8 else 'utf-8') for i in indices]
+
+
+def _wilson_interval(proportion, n, z):
+    """فترة ثقة Wilson لنسبة مقدرة من n عينة"""
+    if n <= 0:
+        return 0.0, 1.0
+    denominator = 1 + z * z / n
+    center = (proportion + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(proportion * (1 - proportion) / n + z * z / (4 * n * n)) / denominator
+    return max(center - half, 0.0), min(center + half, 1.0)
+
+
+def _composition_class(has_upper, has_lower, has_digit, has_special):
+    """اسم فئة تركيبة كلمة المرور حسب فئات الأحرف الموجودة فيها"""
+    if has_upper and has_lower and has_digit and has_special:
+        return 'mixed_all'
+    elif has_upper and has_lower and has_digit:
+        return 'mixed_alpha_num'
+    elif has_upper and has_lower:
+        return 'mixed_alpha'
+    elif has_lower and has_digit:
+        return 'lower_num'
+    elif has_lower:
+        return 'lower_only'
+    elif has_upper:
+        return 'upper_only'
+    elif has_digit:
+        return 'numbers_only'
+    else:
+        return 'special_only'
+
+
+# فئة التركيبة لكل قيمة من بتات الفئات الأربع
+COMPOSITION_BY_MASK = [
+    _composition_class(mask & CLASS_UPPER, mask & CLASS_LOWER, mask & CLASS_DIGIT, mask & CLASS_SPECIAL)
+    for mask in range(16)
+]
+
+
+def _build_mask_table():
+    """جدول bytes.translate يحول كل بايت إلى حرف فئته في القناع"""
+    table = bytearray(b's' * 128 + b'b' * 128)
+    table[ord('A'):ord('Z') + 1] = b'u' * 26
+    table[ord('a'):ord('z') + 1] = b'l' * 26
+    table[ord('0'):ord('9') + 1] = b'd' * 10
+    table[ord('\n')] = ord('\n')
+    return bytes(table)
+
+
+MASK_TABLE = _build_mask_table()
+
+
+def _build_class_table():
+    """جدول من 256 خانة يعطي بتات فئة كل بايت"""
+    table = [CLASS_SPECIAL] * 256
+    for byte in range(ord('A'), ord('Z') + 1):
+        table[byte] = CLASS_UPPER
+    for byte in range(ord('a'), ord('z') + 1):
+        table[byte] = CLASS_LOWER
+    for byte in range(ord('0'), ord('9') + 1):
+        table[byte] = CLASS_DIGIT
+    for byte in b' \t\x0b\x0c\r\x1c\x1d\x1e\x1f':
+        # مسافات تحذفها strip() من الأطراف وتُعد رمزاً خاصاً في الوسط
+        table[byte] = CLASS_SPECIAL | CLASS_SPACE
+    for byte in range(0x80, 0x100):
+        table[byte] = CLASS_SPECIAL | CLASS_NON_ASCII
+    table[ord('\n')] = 0
+    return np.array(table, dtype=np.uint8)
+
+
+def _class_kernel(block):
+    """
+    حساب الطول وبتات الفئات لكل أسطر الكتلة دفعة واحدة
+
+    block: أسطر كاملة بعد تحويل \r\n إلى \n. تُرجع مصفوفات البداية والنهاية والطول والبتات،
+    ومصفوفة exact التي تحدد الأسطر (ASCII بلا مسافات في أطرافها) التي يطابق فيها الطول
+    والبتات نتيجة strip() والتعابير النمطية تماماً؛ بقية الأسطر تُقيَّم بالطريقة العادية.
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(buf == 10)
+    if not block.endswith(b'\n'):
+        ends = np.append(ends, len(buf))
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+
+    classes = CLASS_TABLE[buf]
+    # السطر الفارغ يبدأ عند فاصل السطر وفئته صفر، فيعطي reduceat صفراً كما ينبغي
+    masks = np.bitwise_or.reduceat(classes, starts) if len(buf) else np.zeros(len(starts), np.uint8)
+    non_empty = lengths > 0
+    edges = classes[starts.clip(max=len(buf) - 1)] | classes[(ends - 1).clip(min=0)]
+    exact = ((masks & CLASS_NON_ASCII) == 0) & ~(non_empty & ((edges & CLASS_SPACE) != 0))
+    return starts, ends, lengths, masks & CLASS_COMPOSITION, exact
+
+
+def _class_mask(password):
+    """بتات فئات الأحرف في كلمة مرور واحدة (بما فيها CLASS_NON_ASCII)"""
+    mask = 0
+    if re.search(r'[A-Z]', password):
+        mask |= CLASS_UPPER
+    if re.search(r'[a-z]', password):
+        mask |= CLASS_LOWER
+    if re.search(r'[0-9]', password):
+        mask |= CLASS_DIGIT
+    if re.search(r'[^A-Za-z0-9]', password):
+        mask |= CLASS_SPECIAL
+    if not password.isascii():
+        mask |= CLASS_NON_ASCII
+    return mask
+
+
+def _build_strength_bits():
+    """بتات الحرف الحر لكل قيمة من بتات الفئات: log2 لمجموع أحجام الفئات الموجودة"""
+    bits = []
+    for mask in range(2 * CLASS_NON_ASCII):
+        size = sum(count for bit, count in STRENGTH_CHARSET.items() if mask & bit)
+        bits.append(math.log2(size) if size else 0.0)
+    return bits
+
+
+STRENGTH_BITS = _build_strength_bits()
+
+
+def _build_predictable_pairs():
+    """أزواج الأحرف المتجاورة التي يكمل فيها الثاني تسلسلاً أو مسار لوحة مفاتيح"""
+    pairs = set()
+    for run in ('abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', '0123456789'):
+        for a, b in zip(run, run[1:]):
+            pairs.update((a + b, b + a))
+    for rows in (KEYBOARD_ROWS, KEYBOARD_SHIFTED_ROWS):
+        for row_no, row in enumerate(rows):
+            below = rows[row_no + 1] if row_no + 1 < len(rows) else ''
+            for col, key in enumerate(row):
+                # الصفوف مزاحة: المفتاح (r، c) يجاور (r+1، c-1) و (r+1، c)
+                for other in row[col + 1:col + 2] + below[max(col - 1, 0):col + 1]:
+                    pairs.update((key + other, other + key))
+    return frozenset(pairs)
+
+
+PREDICTABLE_PAIRS = _build_predictable_pairs()
+
+
+def _build_pair_table():
+    """جدول 65536 خانة: 1 للزوج (السابق << 8 | الحالي) الذي يجعل الحرف الحالي متوقعاً"""
+    table = np.zeros(65536, dtype=np.uint8)
+    table[np.arange(256) * 257] = 1
+    for pair in PREDICTABLE_PAIRS:
+        table[ord(pair[0]) << 8 | ord(pair[1])] = 1
+    # فاصل السطر لا يكمل نمطاً ولا يبدأه، فلا تمتد الأنماط بين الأسطر
+    table[ord('\n') << 8:(ord('\n') + 1) << 8] = 0
+    table[ord('\n')::256] = 0
+    return table
+
+
+def _strength_from_counts(length, predictable, charset):
+    """القوة بالبت لأحرف عددها length منها predictable حرفاً متوقعاً (أعداد أو مصفوفات)"""
+    return (length - predictable) * charset + predictable * STRENGTH_PATTERN_BITS
+
+
+def _strength_kernel(block, starts, lengths, masks):
+    """
+    قوة كل أسطر الكتلة بالبت قبل خصم كلمات القاموس، كما تحسبها password_strength
+
+    الحرف المتوقع يُحدَّد لكل البايتات دفعة واحدة عبر PAIR_TABLE على أزواج البايتات
+    المتجاورة، ويُعدّ لكل سطر بفرق مجموع تراكمي. تُرجع القوة والمجموع التراكمي الذي
+    يحتاجه _dictionary_strengths لبتات طرفي كلمة القاموس. للأسطر التي تحددها exact فقط.
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    flags = np.zeros(len(buf) + 1, dtype=np.int64)
+    if len(buf) > 1:
+        flags[2:] = PAIR_TABLE[buf[:-1].astype(np.intp) << 8 | buf[1:]]
+    predictable = np.cumsum(flags)
+    counts = predictable[starts + lengths] - predictable[starts]
+    return _strength_from_counts(lengths, counts, np.array(STRENGTH_BITS)[masks]), predictable
+
+
+def _filter_block_vectorized(tool, block, filters, with_lines=False):
+    """
+    نسخة _filter_block التي تطبق معايير الطول وفئات الأحرف على الكتلة كاملة
+
+    ما ينجو من النواة (أو ما لا تحسمه) فقط يمر على فحوص الشيوع والأنماط والتعابير.
+    تُرجع None إن لم تحسم النواة نصف الأسطر على الأقل (كتل غير ASCII في غالبها)، فالمسار
+    العادي عندها أسرع.
+    مع min_strength تُحسب القوة دون القاموس للكتلة كاملة، ولا يُبحث في القاموس إلا
+    عن الأسطر التي تتجاوز الحد بدونه.
+    """
+    block = block.replace(b'\r\n', b'\n')
+    starts, ends, lengths, masks, exact = _class_kernel(block)
+    if 2 * np.count_nonzero(exact) < len(starts):
+        return None
+    min_strength = filters.get('min_strength')
+
+    # سبب الرفض الأول لكل سطر بترتيب _rejecting_filter (0 = مقبول حتى الآن)
+    reason = np.zeros(len(starts), dtype=np.int8)
+    for code, key in enumerate(KERNEL_FILTERS, 1):
+        if key not in filters:
+            continue
+        if key == 'min_length':
+            failed = lengths < filters[key]
+        elif key == 'max_length':
+            failed = lengths > filters[key]
+        elif key == 'min_strength':
+            strengths, predictable = _strength_kernel(block, starts, lengths, masks)
+            failed = strengths < min_strength
+        else:
+            failed = (masks & KERNEL_CLASS_BITS[key]) == 0
+        reason[(reason == 0) & exact & failed] = code
+    if min_strength is not None:
+        # خصم القاموس يخص الأسطر التي تجاوزت الحد دونه فقط
+        candidates = np.flatnonzero((reason == 0) & exact)
+        passwords = [block[start:end].decode('ascii')
+                     for start, end in zip(starts[candidates].tolist(), ends[candidates].tolist())]
+        hits, dictionary = tool._dictionary_strengths(passwords, starts[candidates],
+                                                      np.array(STRENGTH_BITS)[masks[candidates]], predictable)
+        reason[candidates[hits[dictionary < min_strength]]] = KERNEL_FILTERS.index('min_strength') + 1
+
+    rejected_by = defaultdict(int)
+    for code, count in enumerate(np.bincount(reason, minlength=len(KERNEL_FILTERS) + 1)[1:], 1):
+        if count:
+            rejected_by[KERNEL_FILTERS[code - 1]] += int(count)
+
+    # النواة لا ترفض إلا أسطر exact، فكل الأسطر الأخرى ناجية وتُفك معاً بـ _decode_block
+    inexact = np.flatnonzero(~exact)
+    decoded, non_utf8, encodings = _decode_block(b''.join(
+        block[start:end + 1] for start, end in zip(starts[inexact].tolist(), ends[inexact].tolist())))
+    encodings['ascii'] += len(starts) - len(inexact)
+    non_utf8 = set(non_utf8)
+
+    rest_filters = {key: value for key, value in filters.items() if key not in KERNEL_FILTERS}
+    needs_rest = any(key in rest_filters for key in FILTER_PREDICATES)
+    reject, reject_rest = tool._rejector(filters), tool._rejector(rest_filters)
+    passwords = []
+    kept = []
+    k = -1
+    exact_lines, line_starts, line_ends = exact.tolist(), starts.tolist(), ends.tolist()
+    for i in np.flatnonzero(reason == 0).tolist():
+        if exact_lines[i]:
+            # سطر ASCII بلا مسافات في طرفيه: بايتاته هي كلمة المرور نفسها
+            line = block[line_starts[i]:line_ends[i]]
+            rejected = reject_rest(line.decode('ascii')) if needs_rest else None
+        else:
+            k += 1
+            rejected = reject(decoded[k])
+            line = decoded[k].encode('latin-1' if k in non_utf8 else 'utf-8')
+        if rejected is None:
+            passwords.append(line)
+            kept.append(i)
+        else:
+            rejected_by[rejected] += 1
+    if with_lines:
+        return passwords, len(starts), rejected_by, encodings, kept
+    return passwords, len(starts), rejected_by, encodings
+
+
+def _read_line_blocks(source, limit=None):
+    """قراءة المصدر (mmap أو تدفق) ككتل من أسطر كاملة حتى الإزاحة limit إن حُددت"""
+    position = source.tell() if limit is not None else 0
+    while limit is None or position < limit:
+        size = PIPELINE_BLOCK_SIZE if limit is None else min(PIPELINE_BLOCK_SIZE, limit - position)
+        block = source.read(size)
+        if not block:
+            break
+        if not block.endswith(b'\n'):
+            # إكمال الكتلة حتى نهاية السطر
+            block += source.readline()
+        position += len(block)
+        yield block
+
+
+def _read_output_lines(output_file, offset):
+    """مجموعة أسطر ملف إخراج (بايتات كما كُتبت) حتى الإزاحة offset"""
+    passwords = set()
+    with open(output_file, 'rb') as f:
+        remaining = offset
+        tail = b''
+        while remaining > 0:
+            chunk = f.read(min(STREAM_BUFFER_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            lines = (tail + chunk).split(b'\n')
+            tail = lines.pop()
+            passwords.update(lines)
+    return passwords
+
+
+_worker_tool = None
+
+
+def _init_filter_worker(tool):
+    """تهيئة أداة التصفية مرة واحدة في كل عملية عاملة"""
+    global _worker_tool
+    _worker_tool = tool
+
+
+def _filter_block_in_worker(block, filters, cache=None, config=None):
+    if cache is not None:
+        return cache.filter_block(_worker_tool, block, filters, config)
+    return _filter_block(_worker_tool, block, filters)
+
+
+# بتات كل بايت من خريطة الأسطر المقبولة (البت الأدنى أولاً)
+BITMAP_BITS = [tuple((byte >> bit) & 1 for bit in range(8)) for byte in range(256)]
+
+
+class FilterCache:
+    """
+    ذاكرة تخزين على القرص لنتائج التصفية على مستوى الكتلة
+
+    المفتاح بصمة blake2b لمحتوى الكتلة مع بصمة الإعدادات (المعايير، القوائم الشائعة،
+    الأنماط الضعيفة، محتوى ملف التعابير)، والقيمة عدد الأسطر والمرفوض لكل معيار وعدد
+    الأسطر لكل فئة ترميز وخريطة بتات مضغوطة للأسطر المقبولة. عند الإصابة تُبنى المقبولة من
+    الكتلة والخريطة دون تقييم المعايير، فلا يُعاد حساب إلا الكتل التي تغيرت.
+    حدود الكتل ثابتة الإزاحة، فالتعديل في مكانه والإضافة إلى نهاية الملف لا يبطلان إلا
+    الكتل المعنية، أما الإدراج أو الحذف فيبطل ما بعده. يُحذف الأقدم استخداماً (LRU حسب
+    وقت التعديل الذي يُحدَّث عند كل إصابة) متى تجاوز الحجم quota.
+    """
+
+    MAGIC = b'PWFCHE02'
+    HEADER = struct.Struct('<8sIIIII')  # magic، عدد الأسطر، أسطر ascii و utf8 و non_utf8، طول JSON المرفوض
+
+    def __init__(self, cache_dir, quota=FILTER_CACHE_QUOTA):
+        self.cache_dir = cache_dir
+        self.quota = quota
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def config_key(tool, filters):
+        """بصمة كل ما يؤثر في نتيجة تقييم كتلة"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{FILTER_CACHE_VERSION}\n'.encode('utf-8'))
+        digest.update(json.dumps(filters, sort_keys=True).encode('utf-8'))
+        digest.update(tool._analysis_fingerprint().encode('utf-8'))
+        if 'regex_file' in filters:
+            with open(filters['regex_file'], 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        return digest.hexdigest()
+
+    def _path(self, block, config):
+        digest = hashlib.blake2b(block, digest_size=16, key=bytes.fromhex(config))
+        return os.path.join(self.cache_dir, digest.hexdigest())
+
+    def filter_block(self, tool, block, filters, config):
+        """نتيجة _filter_block من الذاكرة إن وُجدت، وإلا تقييم الكتلة وحفظ نتيجتها"""
+        path = self._path(block, config)
+        try:
+            with open(path, 'rb') as f:
+                entry = f.read()
+        except FileNotFoundError:
+            entry = None
+        if entry is not None:
+            os.utime(path)
+            magic, lines, *counts, rejected_size = self.HEADER.unpack_from(entry)
+            if magic == self.MAGIC:
+                start = self.HEADER.size
+                rejected_by = defaultdict(int, json.loads(entry[start:start + rejected_size]))
+                bitmap = zlib.decompress(entry[start + rejected_size:])
+                encodings = dict(zip(ENCODING_CLASSES, counts))
+                return _rebuild_block(block, bitmap, lines), lines, rejected_by, encodings, True
+
+        passwords, lines, rejected_by, encodings, kept = _filter_block(tool, block, filters, with_lines=True)
+        bitmap = bytearray((lines + 7) // 8)
+        for i in kept:
+            bitmap[i >> 3] |= 1 << (i & 7)
+        rejected = json.dumps(rejected_by).encode('utf-8')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, lines, *(encodings[name] for name in ENCODING_CLASSES), len(rejected))
+                    + rejected
+                    + zlib.compress(bytes(bitmap), 1))
+        os.replace(tmp_path, path)
+        return passwords, lines, rejected_by, encodings, False
+
+    def evict(self):
+        """حذف الأقدم استخداماً حتى يعود حجم الذاكرة تحت الحصة"""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                    total += st.st_size
+        if total <= self.quota:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.quota:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+
+def _rebuild_block(block, bitmap, line_count):
+    """البايتات الأصلية لكلمات المرور المقبولة في الكتلة حسب خريطة البتات المخزنة"""
+    lines = block.split(b'\n')
+    del lines[line_count:]
+    bits = itertools.chain.from_iterable(BITMAP_BITS[byte] for byte in bitmap)
+    selected = list(itertools.compress(lines, bits))
+    # الفك ثم strip يطابق ما قُيِّم فعلاً، والإعادة بالترميز نفسه تعطي البايتات الأصلية
+    passwords, non_utf8, _ = _decode_block(b'\n'.join(selected) + b'\n' if selected else b'')
+    return _original_bytes(passwords, range(len(passwords)), non_utf8)
+
+
+_HAS_UPPER = re.compile(r'[A-Z]').search
+_HAS_LOWER = re.compile(r'[a-z]').search
+_HAS_DIGIT = re.compile(r'[0-9]').search
+_HAS_SPECIAL = re.compile(r'[^A-Za-z0-9]').search
+
+
+class _PasswordFeatures:
+    """
+    خصائص السطر الحالي المكلفة تُحسب عند أول طلب وتُحفظ لتشاركها عدة سياسات
+
+    لها واجهة الأداة التي تستخدمها FILTER_CHECKS (is_common و _matches_weak_pattern و
+    password_strength و regex_set)، فتُبنى فحوص كل سياسة مرة واحدة بها بدل الأداة
+    و reset تنقلها إلى السطر التالي.
+    """
+
+    __slots__ = ('_tool', '_common', '_weak', '_strength')
+
+    def __init__(self, tool):
+        self._tool = tool
+        self.reset(None)
+
+    def reset(self, password):
+        self._common = self._weak = self._strength = None
+
+    def is_common(self, password):
+        if self._common is None:
+            self._common = self._tool.is_common(password)
+        return self._common
+
+    def _matches_weak_pattern(self, password):
+        if self._weak is None:
+            self._weak = self._tool._matches_weak_pattern(password)
+        return self._weak
+
+    def password_strength(self, password):
+        if self._strength is None:
+            self._strength = self._tool.password_strength(password)
+        return self._strength
+
+    def regex_set(self, regex_file, allow_risky=False):
+        return self._tool.regex_set(regex_file, allow_risky)
+
+
+def _min_strength_check(source, filters):
+    strength, limit = source.password_strength, filters['min_strength']
+    return lambda password: strength(password) < limit
+
+
+def _regex_file_check(source, filters):
+    search = source.regex_set(filters['regex_file'], filters.get('allow_risky_regex', False)).search
+    return lambda password: bool(search(password))
+
+
+# معايير الرفض: لكل معيار دالة (مصدر الخصائص، المعايير) تبني فحصاً (كلمة مرور -> True إن رُفضت)؛
+# مصدر واحد لمسار السطر الواحد (_rejecting_filter) ولتقييم عدة سياسات (filter_multi_policy)
+FILTER_CHECKS = {
+    'min_length': lambda source, filters: lambda password, limit=filters['min_length']: len(password) < limit,
+    'max_length': lambda source, filters: lambda password, limit=filters['max_length']: len(password) > limit,
+    'require_upper': lambda source, filters: lambda password: _HAS_UPPER(password) is None,
+    'require_lower': lambda source, filters: lambda password: _HAS_LOWER(password) is None,
+    'require_digit': lambda source, filters: lambda password: _HAS_DIGIT(password) is None,
+    'require_special': lambda source, filters: lambda password: _HAS_SPECIAL(password) is None,
+    'min_strength': _min_strength_check,
+    'exclude_common': lambda source, filters: source.is_common,
+    'exclude_weak_patterns': lambda source, filters: source._matches_weak_pattern,
+    'custom_regex': lambda source, filters: lambda password, search=re.compile(filters['custom_regex']).search:
+        search(password) is not None,
+    'regex_file': _regex_file_check,
+}
+
+
+@contextlib.contextmanager
+def _open_input_lines(input_file):
+    """
+    أسطر ملف الإدخال كبايتات: عبر mmap للملفات العادية أو تدفق لفك الضغط
+
+    تُرجع (الأسطر، دالة الموقع بالبايت أو None، الحجم الكلي أو None).
+    """
+    if detect_compression(input_file):
+        with open_wordlist_input(input_file) as stream:
+            yield stream, None, None
+        return
+    file_size = os.path.getsize(input_file)
+    if file_size == 0:
+        yield (), None, 0
+        return
+    with open(input_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield iter(mm.readline, b''), mm.tell, file_size
+        finally:
+            mm.close()
+
+
+def _sort_key(order):
+    """دالة مفتاح الفرز لكل نوع ترتيب (None يعني ترتيب البايتات)"""
+    if order == 'length':
+        return _length_key
+    if order == 'frequency':
+        return _frequency_key
+    if order == 'count':
+        return _count_entry_key
+    return None
+
+
+def _length_key(line):
+    return len(line), line
+
+
+def _frequency_key(line):
+    count, _, password = line.partition(b'\t')
+    return -int(count), password
+
+
+def _count_entry_key(line):
+    return line.partition(b'\t')[2]
+
+
+def _write_sorted_run(lines, order, run_file):
+    """فرز مجموعة أسطر وكتابتها كمقطع؛ في وضع count تُجمَّع الأسطر المتساوية مع عددها"""
+    lines = [line.rstrip(b'\r\n') for line in lines]
+    if order == 'count':
+        lines.sort()
+        entries = [b'%d\t%s' % (sum(1 for _ in group), line) for line, group in itertools.groupby(lines)]
+    else:
+        lines.sort(key=_sort_key(order))
+        entries = lines
+    with open(run_file, 'wb', buffering=STREAM_BUFFER_SIZE) as out:
+        for entry in entries:
+            out.write(entry + b'\n')
+    return len(lines)
+
+
+def _sort_range(input_file, start, end, order, run_file):
+    """فرز نطاق بايتات من الملف (يعمل في عملية منفصلة)"""
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).split(b'\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    return _write_sorted_run(lines, order, run_file)
+
+
+def _read_run(run_file):
+    with open(run_file, 'rb', buffering=SPLIT_SCAN_BLOCK) as f:
+        for line in f:
+            yield line.rstrip(b'\n')
+
+
+def _merge_runs(runs, order, work_dir):
+    """دمج k مقطع مفروز مع دمج متعدد المراحل عند تجاوز SORT_MAX_FANIN"""
+    key = _sort_key(order)
+    level = 0
+    while len(runs) > SORT_MAX_FANIN:
+        level += 1
+        merged_runs = []
+        for i in range(0, len(runs), SORT_MAX_FANIN):
+            group = runs[i:i + SORT_MAX_FANIN]
+            merged_file = os.path.join(work_dir, f'merge_{level}_{i}.txt')
+            with open(merged_file, 'wb', buffering=STREAM_BUFFER_SIZE) as out:
+                for line in _merge_sorted(group, order, key):
+                    out.write(line + b'\n')
+            for run in group:
+                os.remove(run)
+            merged_runs.append(merged_file)
+        runs = merged_runs
+    return _merge_sorted(runs, order, key)
+
+
+def _merge_sorted(runs, order, key):
+    merged = heapq.merge(*(_read_run(run) for run in runs), key=key)
+    if order != 'count':
+        return merged
+    # جمع أعداد الكلمة نفسها القادمة من مقاطع مختلفة
+    return (b'%d\t%s' % (sum(int(entry.partition(b'\t')[0]) for entry in group), password)
+            for password, group in itertools.groupby(merged, key=_count_entry_key))
+
+
+def _counted_lines(stream, stats, key):
+    """أسطر التدفق دون فاصل السطر مع عدّها في stats[key]"""
+    for line in stream:
+        stats[key] += 1
+        yield line.rstrip(b'\r\n')
+
+
+def _hash_partition(input_file, prefix, partitions, stats, key):
+    """توزيع أسطر الملف على ملفات أقسام حسب crc32 بحيث يقع السطر نفسه دائماً في القسم نفسه"""
+    outputs = [open(f'{prefix}_{i}.txt', 'wb', buffering=SET_PARTITION_BUFFER) for i in range(partitions)]
+    try:
+        with open_wordlist_input(input_file) as stream:
+            for line in _counted_lines(stream, stats, key):
+                outputs[zlib.crc32(line) % partitions].write(line + b'\n')
+    finally:
+        for out in outputs:
+            out.close()
+
+
+def _set_operation_partition(operation, work_dir, partition):
+    """تنفيذ العملية على زوج أقسام (يعمل في عملية منفصلة)"""
+    def read_lines(name):
+        path = os.path.join(work_dir, f'{name}_{partition}.txt')
+        with open(path, 'rb', buffering=SPLIT_SCAN_BLOCK) as f:
+            for line in f:
+                yield line[:-1]
+        os.remove(path)
+
+    seen = set()
+    if operation == 'union':
+        result = (line for line in itertools.chain(read_lines('a'), read_lines('b'))
+                  if line not in seen and not seen.add(line))
+    else:
+        other = set(read_lines('b'))
+        keep = (lambda line: line not in other) if operation == 'diff' else (lambda line: line in other)
+        result = (line for line in read_lines('a') if keep(line) and line not in seen and not seen.add(line))
+
+    part_file = os.path.join(work_dir, f'out_{partition}.txt')
+    count = 0
+    with open(part_file, 'wb', buffering=STREAM_BUFFER_SIZE) as out:
+        for line in result:
+            out.write(line + b'\n')
+            count += 1
+    return part_file, count
+
+
+def _merge_set_operation(operation, lines_a, lines_b):
+    """دمج خطي لقائمتين مفروزتين مع حذف التكرار"""
+    lines_a = (line for line, _ in itertools.groupby(lines_a))
+    lines_b = (line for line, _ in itertools.groupby(lines_b))
+    a = next(lines_a, None)
+    b = next(lines_b, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a < b):
+            if operation != 'intersect':
+                yield a
+            a = next(lines_a, None)
+        elif a is None or b < a:
+            if operation == 'union':
+                yield b
+            b = next(lines_b, None)
+        else:
+            if operation != 'diff':
+                yield a
+            a = next(lines_a, None)
+            b = next(lines_b, None)
+
+
+def detect_compression(path):
+    """اكتشاف صيغة ضغط الملف من بايتاته الأولى (gz/xz/bz2 أو None)"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _compression_module(compression):
+    import bz2
+    import gzip
+    import lzma
+    modules = {'gz': gzip, 'xz': lzma, 'bz2': bz2}
+    if compression not in modules:
+        raise ValueError(f"صيغة ضغط غير مدعومة: {compression}")
+    return modules[compression]
+
+
+class _ThreadedDecompressReader(io.RawIOBase):
+    """فك ضغط في خيط خلفي يملأ طابوراً محدوداً بكتل مفكوكة"""
+
+    def __init__(self, path, compression):
+        self._source = _compression_module(compression).open(path, 'rb')
+        self._queue = queue.Queue(maxsize=COMPRESSION_QUEUE_BLOCKS)
+        self._pending = memoryview(b'')
+        self._error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for block in iter(lambda: self._source.read(STREAM_BUFFER_SIZE), b''):
+                if self._stop.is_set():
+                    break
+                self._queue.put(block)
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._queue.put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            if self._queue is None:
+                return 0
+            block = self._queue.get()
+            if block is None:
+                self._queue = None
+                if self._error is not None:
+                    raise self._error
+                return 0
+            self._pending = memoryview(block)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            # إيقاف الخيط وتصريف الطابور حتى لا يبقى معلقاً عند الإغلاق المبكر
+            self._stop.set()
+            while self._queue is not None and self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread.join()
+            self._source.close()
+        super().close()
+
+
+class _ThreadedCompressWriter(io.RawIOBase):
+    """ضغط وكتابة في خيط خلفي يستهلك كتلاً من طابور محدود"""
+
+    def __init__(self, path, compression):
+        self._target = _compression_module(compression).open(path, 'wb')
+        self._queue = queue.Queue(maxsize=COMPRESSION_QUEUE_BLOCKS)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for block in iter(self._queue.get, None):
+                self._target.write(block)
+        except BaseException as e:
+            self._error = e
+            # متابعة استهلاك الطابور حتى لا يتوقف الكاتب
+            for _ in iter(self._queue.get, None):
+                pass
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(bytes(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._queue.put(None)
+            self._thread.join()
+            self._target.close()
+            super().close()
+            if self._error is not None:
+                raise self._error
+
+
+def open_wordlist_input(path):
+    """فتح قائمة كلمات للقراءة الثنائية مع فك الضغط تلقائياً في خيط خلفي"""
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'rb', buffering=STREAM_BUFFER_SIZE)
+    return io.BufferedReader(_ThreadedDecompressReader(path, compression), buffer_size=STREAM_BUFFER_SIZE)
+
+
+def output_compression(path, compression=None):
+    """صيغة ضغط ملف الإخراج: المحددة صراحة أو المستنتجة من امتداده"""
+    if compression is None:
+        compression = next((c for c in COMPRESSION_MAGIC if path.endswith('.' + c)), None)
+    return compression
+
+
+def open_wordlist_output(path, compression=None, resume_offset=None):
+    """
+    فتح ملف إخراج مع ضغط اختياري في خيط خلفي
+
+    إن لم تُحدَّد compression تُستنتج من امتداد الملف (.gz/.xz/.bz2).
+    resume_offset يُبقي الملف الموجود مقصوصاً إلى هذه الإزاحة ويكمل الكتابة بعدها
+    (للملفات غير المضغوطة فقط).
+    الملف ثنائي دائماً، فكلمات المرور تُكتب ببايتاتها الأصلية دون إعادة ترميز.
+    """
+    compression = output_compression(path, compression)
+    if resume_offset is not None:
+        if compression is not None:
+            raise ValueError("لا يمكن استئناف الكتابة في ملف مضغوط")
+        raw = open(path, 'r+b', buffering=STREAM_BUFFER_SIZE)
+        raw.truncate(resume_offset)
+        raw.seek(resume_offset)
+    elif compression is None:
+        raw = open(path, 'wb', buffering=STREAM_BUFFER_SIZE)
+    else:
+        raw = io.BufferedWriter(_ThreadedCompressWriter(path, compression), buffer_size=STREAM_BUFFER_SIZE)
+    return raw
+
+
+class ShardedOutput:
+    """
+    كتابة كلمات المرور المقبولة مباشرة إلى عدة ملفات أجزاء
+
+    - shard_by='hash': يحدد crc32 للسطر جزءه، فتقع الكلمة نفسها دائماً في الجزء نفسه
+      ويمكن حذف التكرار في كل جزء على حدة.
+    - shard_by='round_robin': تُوزَّع الأسطر على الأجزاء بالتناوب سطراً سطراً، ويستمر
+      التناوب من دفعة إلى التالية فتتساوى أعداد الأسطر في الأجزاء (بفارق سطر على الأكثر).
+    - max_bytes: حد لحجم الملف الواحد؛ عند بلوغه يُفتح ملف جديد للجزء نفسه على حدود الأسطر.
+    أسماء الملفات {prefix}_{الجزء}.txt، ومع max_bytes {prefix}_{الجزء}_{الملف}.txt.
+    """
+
+    def __init__(self, prefix, shards=1, shard_by='hash', max_bytes=None, compression=None):
+        if shard_by not in SHARD_MODES:
+            raise ValueError(f"طريقة تجزئة غير مدعومة: {shard_by}")
+        self.prefix = prefix
+        self.shards = shards
+        self.shard_by = shard_by
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.suffix = '.txt' + (f'.{compression}' if compression else '')
+        self.files = []
+        self._parts = [0] * shards
+        self._written = [0] * shards
+        self._outputs = [self._open(shard) for shard in range(shards)]
+        self._next = 0
+
+    def _open(self, shard):
+        self._parts[shard] += 1
+        self._written[shard] = 0
+        name = f"{self.prefix}_{shard + 1}"
+        if self.max_bytes:
+            name += f"_{self._parts[shard]}"
+        path = name + self.suffix
+        self.files.append(path)
+        return open_wordlist_output(path, self.compression)
+
+    def write_passwords(self, lines):
+        """توزيع أسطر مقبولة (بايتات دون فاصل السطر) على الأجزاء"""
+        if self.shards == 1:
+            self._write_lines(0, lines)
+        elif self.shard_by == 'hash':
+            buckets = [[] for _ in range(self.shards)]
+            for line in lines:
+                buckets[zlib.crc32(line) % self.shards].append(line)
+            for shard, bucket in enumerate(buckets):
+                if bucket:
+                    self._write_lines(shard, bucket)
+        else:
+            # الجزء k يأخذ كل shards سطراً بدءاً من أول سطر يحين دوره فيه
+            for shard in range(self.shards):
+                bucket = lines[(shard - self._next) % self.shards::self.shards]
+                if bucket:
+                    self._write_lines(shard, bucket)
+            self._next = (self._next + len(lines)) % self.shards
+
+    def _write_lines(self, shard, lines):
+        if not self.max_bytes:
+            self._outputs[shard].write(b'\n'.join(lines) + b'\n')
+            return
+        # نهايات الأسطر التراكمية لاختيار أكبر عدد من الأسطر يتسع له الملف الحالي
+        ends = list(itertools.accumulate(len(line) + 1 for line in lines))
+        start, base = 0, 0
+        while start < len(lines):
+            end = bisect.bisect_right(ends, base + self.max_bytes - self._written[shard], lo=start)
+            if end == start:
+                if self._written[shard]:
+                    self._outputs[shard].close()
+                    self._outputs[shard] = self._open(shard)
+                    continue
+                end = start + 1  # سطر أطول من الحد يُكتب وحده
+            self._outputs[shard].write(b'\n'.join(lines[start:end]) + b'\n')
+            self._written[shard] += ends[end - 1] - base
+            start, base = end, ends[end - 1]
+
+    def close(self):
+        for output in self._outputs:
+            output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ProgressMonitor:
+    """
+    مراقب تقدم منخفض التكلفة
+
+    حلقة المعالجة تزيد عدادات عادية فقط، وخيط خلفي يأخذ عينة منها بضع مرات في
+    الثانية لتحديث شريط tqdm وكتابة ملف المقاييس (JSON أو نص Prometheus).
+    - counters: قاموس العدادات الذي تحدّثه الحلقة (مثل إحصاءات التصفية)
+    - lines_key: مفتاح عدد الأسطر المعالجة في counters
+    - position: دالة تعيد عدد البايتات المعالجة (مثل mm.tell)؛ بدونها يعرض الشريط الأسطر
+    """
+
+    def __init__(self, desc, counters, lines_key, total=None, position=None,
+                 metrics_file=None, metrics_format='json', interval=PROGRESS_INTERVAL):
+        self.desc = desc
+        self.counters = counters
+        self.lines_key = lines_key
+        self.total = total
+        self.position = position
+        self.metrics_file = metrics_file
+        self.metrics_format = metrics_format
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._pbar = None
+        self._start_time = None
+        self._initial_position = 0
+
+    def __enter__(self):
+        self._start_time = time.time()
+        if self.position is not None:
+            self._initial_position = self.position()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample(final=True)
+        if self._pbar is not None:
+            self._pbar.close()
+
+    def _open_bar(self):
+        # الشريط يُنشأ في أول عينة، فالمهام الأقصر من interval لا تستورد tqdm أصلاً
+        if self.position is not None:
+            return tqdm(total=self.total, initial=self._initial_position,
+                        unit='B', unit_scale=True, desc=self.desc)
+        return tqdm(desc=self.desc, unit=' سطر')
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def snapshot(self):
+        """لقطة من العدادات الحالية مع المعدلات منذ البداية"""
+        elapsed = time.time() - self._start_time
+        lines = self.counters.get(self.lines_key, 0)
+        processed = self.position() - self._initial_position if self.position is not None else None
+        snapshot = {
+            'operation': self.desc,
+            'elapsed_seconds': elapsed,
+            'lines_processed': lines,
+            'lines_per_second': lines / elapsed if elapsed > 0 else 0
+        }
+        if processed is not None:
+            snapshot['bytes_processed'] = processed
+            snapshot['bytes_per_second'] = processed / elapsed if elapsed > 0 else 0
+        for key in ('filtered_passwords', 'decode_fallbacks'):
+            if key in self.counters:
+                snapshot[key] = self.counters[key]
+        if 'encodings' in self.counters:
+            snapshot['encodings'] = dict(self.counters['encodings'])
+        if 'rejected_by' in self.counters:
+            snapshot['rejected_by'] = dict(self.counters['rejected_by'])
+        return snapshot
+
+    def _sample(self, final=False):
+        if self._pbar is None and not final:
+            self._pbar = self._open_bar()
+        try:
+            if self._pbar is None:
+                pass
+            elif self.position is not None:
+                self._pbar.update(self.position() - self._pbar.n)
+            else:
+                self._pbar.update(self.counters.get(self.lines_key, 0) - self._pbar.n)
+        except ValueError:
+            # أُغلق mmap قبل آخر عينة
+            return
+        if self.metrics_file:
+            self._write_metrics(self.snapshot())
+
+    def _write_metrics(self, snapshot):
+        tmp_file = self.metrics_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            if self.metrics_format == 'prometheus':
+                f.write(_prometheus_text(snapshot))
+            else:
+                json.dump(snapshot, f)
+        os.replace(tmp_file, self.metrics_file)
+
+
+def _prometheus_text(snapshot):
+    """تحويل لقطة المقاييس إلى صيغة نص Prometheus"""
+    operation = snapshot['operation'].replace('"', '')
+    lines = []
+    for key, value in snapshot.items():
+        if key == 'rejected_by':
+            lines.append('# TYPE password_filter_rejected_total counter')
+            for name, count in sorted(value.items()):
+                lines.append(f'password_filter_rejected_total{{operation="{operation}",filter="{name}"}} {count}')
+        elif key == 'encodings':
+            lines.append('# TYPE password_filter_encoding_lines_total counter')
+            for name, count in sorted(value.items()):
+                lines.append(f'password_filter_encoding_lines_total{{operation="{operation}",encoding="{name}"}} {count}')
+        elif isinstance(value, (int, float)):
+            if key.endswith(('_per_second', '_seconds')):
+                metric_type, name = 'gauge', f'password_filter_{key}'
+            else:
+                # عُرف Prometheus: أسماء العدادات تنتهي بـ _total
+                metric_type, name = 'counter', f'password_filter_{key}_total'
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name}{{operation="{operation}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _copy_range(src_fd, dst_fd, offset, count):
+    """نسخ نطاق بايتات بين ملفين داخل النواة مع الرجوع إلى النسخ العادي عند عدم الدعم"""
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    sendfile = getattr(os, 'sendfile', None)
+    while count > 0:
+        copied = 0
+        if copy_file_range is not None:
+            try:
+                copied = copy_file_range(src_fd, dst_fd, count, offset_src=offset)
+            except OSError:
+                copy_file_range = None
+                continue
+        elif sendfile is not None:
+            try:
+                copied = sendfile(dst_fd, src_fd, offset, count)
+            except OSError:
+                sendfile = None
+                continue
+        else:
+            os.lseek(src_fd, offset, os.SEEK_SET)
+            data = os.read(src_fd, min(count, SPLIT_SCAN_BLOCK))
+            copied = os.write(dst_fd, data) if data else 0
+        if copied == 0:
+            raise IOError(f"توقف النسخ عند الإزاحة {offset}")
+        offset += copied
+        count -= copied
+
+
+def _find_byte_cuts(input_file, chunk_bytes):
+    """نقاط القطع بعد أول سطر جديد يلي كل مضاعف من chunk_bytes"""
+    cuts = []
+    with open(input_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            target = chunk_bytes
+            while target < len(mm):
+                newline = mm.find(b'\n', target - 1)
+                if newline == -1 or newline + 1 >= len(mm):
+                    break
+                cuts.append(newline + 1)
+                target = newline + 1 + chunk_bytes
+        finally:
+            mm.close()
+    return cuts
+
+
+def _count_newlines(input_file, start, end):
+    """عدّ الأسطر الجديدة في نطاق من الملف"""
+    count = 0
+    with open(input_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for pos in range(start, end, SPLIT_SCAN_BLOCK):
+                count += mm[pos:min(pos + SPLIT_SCAN_BLOCK, end)].count(b'\n')
+        finally:
+            mm.close()
+    return count
+
+
+def _find_line_cuts(input_file, start, end, lines_before, chunk_size):
+    """إيجاد نقاط القطع داخل نطاق علماً بعدد الأسطر التي تسبقه"""
+    cuts = []
+    seen = lines_before
+    next_cut = (seen // chunk_size + 1) * chunk_size
+    with open(input_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for pos in range(start, end, SPLIT_SCAN_BLOCK):
+                block_end = min(pos + SPLIT_SCAN_BLOCK, end)
+                block_lines = mm[pos:block_end].count(b'\n')
+                if seen + block_lines < next_cut:
+                    seen += block_lines
+                    continue
+                # نقطة قطع واحدة على الأقل داخل هذه الكتلة
+                cursor = pos
+                while cursor < block_end:
+                    newline = mm.find(b'\n', cursor, block_end)
+                    if newline == -1:
+                        break
+                    seen += 1
+                    cursor = newline + 1
+                    if seen == next_cut:
+                        cuts.append(cursor)
+                        next_cut += chunk_size
+        finally:
+            mm.close()
+    return cuts
+
+
+def _find_line_cuts_parallel(input_file, file_size, chunk_size, workers=None):
+    """إيجاد نقاط القطع كل chunk_size سطراً بتقسيم الملف بين عدة عمليات"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or file_size < SPLIT_PARALLEL_MIN_SIZE:
+        cuts = _find_line_cuts(input_file, 0, file_size, 0, chunk_size)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        step = -(-file_size // workers)
+        segments = [(pos, min(pos + step, file_size)) for pos in range(0, file_size, step)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # المرحلة الأولى: عدد الأسطر في كل نطاق
+            counts = list(pool.map(_count_newlines, *zip(*[(input_file, a, b) for a, b in segments])))
+            lines_before = [sum(counts[:i]) for i in range(len(counts))]
+            # المرحلة الثانية: مواقع القطع داخل كل نطاق
+            parts = pool.map(_find_line_cuts,
+                             *zip(*[(input_file, a, b, before, chunk_size)
+                                    for (a, b), before in zip(segments, lines_before)]))
+            cuts = [cut for part in parts for cut in part]
+    # لا داعي لجزء فارغ بعد آخر سطر
+    return [cut for cut in cuts if cut < file_size]
+
+
+def _cached_build(name, key, build):
+    """
+    نتيجة build() من ذاكرة marshal في STARTUP_CACHE_DIR إن بُنيت للمفتاح نفسه، وإلا بناؤها
+    وحفظها. الذاكرة اختيارية: أي خطأ في قراءتها أو كتابتها يعني البناء من جديد فقط.
+
+    الملف: STARTUP_CACHE_MAGIC (فيه رقم إصدار الصيغة) ثم sha256 للمحتوى ثم بيانات marshal،
+    ولا يُفك المحتوى إلا بعد التحقق من الاثنين، فالملف القديم أو التالف يُعاد بناؤه.
+    """
+    if not STARTUP_CACHE_DIR:
+        return build()
+    digest = hashlib.sha256(repr((key, sys.version_info[:2], marshal.version)).encode('utf-8')).hexdigest()
+    path = os.path.join(STARTUP_CACHE_DIR, f'{name}-{digest[:24]}.marshal')
+    header = len(STARTUP_CACHE_MAGIC) + hashlib.sha256().digest_size
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:len(STARTUP_CACHE_MAGIC)] == STARTUP_CACHE_MAGIC and \
+                data[len(STARTUP_CACHE_MAGIC):header] == hashlib.sha256(data[header:]).digest():
+            return marshal.loads(data[header:])
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    value = build()
+    try:
+        payload = marshal.dumps(value)
+        os.makedirs(STARTUP_CACHE_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(STARTUP_CACHE_MAGIC + hashlib.sha256(payload).digest() + payload)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        pass
+    return value
+
+
+class PatternMatcher:
+    """
+    آلة Aho-Corasick للبحث عن آلاف الأنماط الحرفية في مرور خطي واحد على النص
+
+    patterns: قاموس {النمط: الاسم المُبلَّغ عنه} أو قائمة أنماط (الاسم هو النمط نفسه).
+    """
+
+    def __init__(self, patterns):
+        if not isinstance(patterns, dict):
+            patterns = {pattern: pattern for pattern in patterns}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for pattern, name in patterns.items():
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(name)
+
+        # روابط الفشل بالعرض أولاً، وكل حالة ترث مخرجات حالة فشلها
+        pending = collections.deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._first = [names[0] if names else None for names in self._output]
+
+    @classmethod
+    def cached(cls, patterns):
+        """الآلة نفسها، محمّلة من ذاكرة الصيغ الثنائية إن بُنيت للأنماط نفسها من قبل"""
+        if not isinstance(patterns, dict):
+            patterns = {pattern: pattern for pattern in patterns}
+        state = _cached_build('patterns', sorted(patterns.items()), lambda: cls(patterns)._state())
+        matcher = cls.__new__(cls)
+        matcher._goto, matcher._fail, matcher._output = state
+        matcher._first = [names[0] if names else None for names in matcher._output]
+        return matcher
+
+    def _state(self):
+        return self._goto, self._fail, self._output
+
+    @staticmethod
+    def read_patterns(patterns_file):
+        """قراءة قاموس أنماط: نمط في كل سطر، والأسطر الفارغة أو التي تبدأ بـ # تُتجاهل"""
+        with open(patterns_file, 'r', encoding='utf-8', errors='ignore') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    @classmethod
+    def from_file(cls, patterns_file):
+        return cls([pattern.lower() for pattern in cls.read_patterns(patterns_file)])
+
+    def __len__(self):
+        return sum(1 for names in self._output if names)
+
+    def search(self, text):
+        """اسم أول نمط ينتهي في النص (أو None)"""
+        goto, fail, first = self._goto, self._fail, self._first
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if first[state] is not None:
+                return first[state]
+        return None
+
+    def find_all(self, text):
+        """أسماء كل الأنماط الموجودة في النص بترتيب ظهور نهاياتها"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = []
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found.extend(output[state])
+        return found
+
+
+class RegexSet:
+    """
+    مجموعة كبيرة من تعابير الاستبعاد تُقيَّم كأنها تعبير واحد
+
+    - الأنماط التي تحتوي نصاً حرفياً إلزامياً (REGEX_MIN_LITERAL حرفاً أو أكثر) تُفهرس
+      بنصها في PatternMatcher، فلا يصل السطر إلى محرك التعابير إلا إذا وُجد فيه
+      أحد هذه النصوص، ثم تُجرَّب الأنماط المرشحة فقط.
+    - بقية الأنماط تُدمج في تعابير مترجمة (?:p1)|(?:p2)|... بحد REGEX_COMBINE_MAX نمطاً
+      لكل منها؛ والأنماط ذات المراجع الخلفية أو المجموعات المسماة تُترجم منفردة.
+    - قبل الترجمة يُفحص كل نمط بحثاً عن بنى التراجع الكارثي (مكممات متغيرة العدد أو
+      أجزاء قابلة للفراغ أو بدائل متداخلة داخل تكرار)، ويُرفض الملف بـ ValueError ما لم يُمرَّر allow_risky.
+    """
+
+    def __init__(self, patterns, allow_risky=False):
+        self.patterns = list(patterns)
+        self.risky = []
+        prefiltered = defaultdict(list)
+        combinable, standalone = [], []
+        for pattern in self.patterns:
+            try:
+                compiled = re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"تعبير غير صالح {pattern!r}: {e}") from None
+            try:
+                parsed = sre_parse.parse(pattern)
+                reason = _backtracking_risk(parsed)
+                literal = None if parsed.state.flags & re.IGNORECASE else _required_literal(parsed)
+                # لا تصمد عند الدمج: أرقام المجموعات تتغير والأعلام العامة تسري على الكل
+                alone = bool(parsed.state.groupdict or _has_backreference(parsed) or parsed.state.flags & ~re.UNICODE)
+            except Exception:
+                # المحلل الداخلي غائب أو تغيرت بنيته: النمط الذي لا يُفحص يُعد خطراً ويُترجم منفرداً
+                reason, literal, alone = "تعذر تحليل بنية النمط", None, True
+            if reason:
+                self.risky.append((pattern, reason))
+            if literal is not None and len(literal) >= REGEX_MIN_LITERAL:
+                prefiltered[literal].append(compiled)
+            elif alone:
+                standalone.append(compiled)
+            else:
+                combinable.append(pattern)
+        if self.risky and not allow_risky:
+            details = '\n'.join(f"  {pattern!r}: {reason}" for pattern, reason in self.risky)
+            raise ValueError(f"أنماط معرضة للتراجع الكارثي:\n{details}")
+
+        self._always = [re.compile('|'.join(f'(?:{p})' for p in combinable[i:i + REGEX_COMBINE_MAX]))
+                        for i in range(0, len(combinable), REGEX_COMBINE_MAX)] + standalone
+        self._by_literal = dict(prefiltered)
+        self._literals = PatternMatcher.cached(list(prefiltered)) if prefiltered else None
+
+    @classmethod
+    def from_file(cls, regex_file, allow_risky=False):
+        """قراءة تعبير في كل سطر؛ الأسطر الفارغة أو التي تبدأ بـ # تُتجاهل"""
+        return cls(PatternMatcher.read_patterns(regex_file), allow_risky=allow_risky)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def search(self, text):
+        """هل يطابق النص أي نمط في المجموعة"""
+        for regex in self._always:
+            if regex.search(text):
                 return True
-                
-        # التحقق من الأحرف المتكررة
-        if re.search(self.weak_patterns['repeated_chars'], password):
-            return True
-            
-        # التحقق من كلمات المرور القصيرة جداً
-        if re.search(self.weak_patterns['short_passwords'], password):
-            return True
-            
+        literals = self._literals
+        if literals is not None and literals.search(text) is not None:
+            for literal in set(literals.find_all(text)):
+                for regex in self._by_literal[literal]:
+                    if regex.search(text):
+                        return True
         return False
-    
-    def filter_large_file(self, input_file, output_file, filters):
+
+
+def _required_literal(parsed):
+    """أطول نص حرفي متصل يجب أن يظهر في كل تطابق للنمط (أو None)"""
+    best, current = '', []
+    for op, av in _flatten_sequence(parsed):
+        if op is sre_parse.LITERAL:
+            current.append(chr(av))
+            continue
+        if len(current) > len(best):
+            best = ''.join(current)
+        current = []
+    if len(current) > len(best):
+        best = ''.join(current)
+    return best or None
+
+
+def _flatten_sequence(parsed):
+    """عناصر التسلسل الأعلى مع فك المجموعات التي لا تغير الأعلام"""
+    for op, av in parsed:
+        if op is sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            yield from _flatten_sequence(av[3])
+        else:
+            yield op, av
+
+
+def _has_backreference(parsed):
+    for op, av in parsed:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return True
+        for sub in _subpatterns(op, av):
+            if _has_backreference(sub):
+                return True
+    return False
+
+
+def _subpatterns(op, av):
+    """الأنماط الفرعية المباشرة لعنصر من شجرة sre_parse"""
+    if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+        return [av[2]]
+    if op is sre_parse.SUBPATTERN:
+        return [av[3]]
+    if op is sre_parse.BRANCH:
+        return list(av[1])
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [av[1]]
+    if op is sre_parse.GROUPREF_EXISTS:
+        return [sub for sub in av[1:] if sub is not None]
+    if op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+        return [av]
+    return []
+
+
+def _is_repeat(op):
+    return op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None)
+
+
+def _is_unbounded_repeat(op, av):
+    return _is_repeat(op) and av[1] == sre_parse.MAXREPEAT
+
+
+def _is_nullable(parsed):
+    """هل يمكن أن يطابق النمط (أو جزؤه) نصاً فارغاً"""
+    for op, av in parsed:
+        if _is_repeat(op):
+            if av[0] > 0 and not _is_nullable(av[2]):
+                return False
+        elif op is sre_parse.SUBPATTERN:
+            if not _is_nullable(av[3]):
+                return False
+        elif op is sre_parse.BRANCH:
+            if not any(_is_nullable(alternative) for alternative in av[1]):
+                return False
+        elif op not in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT, sre_parse.GROUPREF,
+                        sre_parse.GROUPREF_EXISTS):
+            # الأحرف والفئات تستهلك حرفاً؛ المراجع والشروط تُعد قابلة للفراغ احتياطاً
+            return False
+    return True
+
+
+def _backtracking_risk(parsed, inside_repeat=False):
+    r"""
+    وصف البنية المعرضة للتراجع الكارثي في النمط (أو None)
+
+    فحص ثابت لشجرة النمط داخل تكرار خارجي أقصى عدده أكبر من 1: أي مكمم متغير العدد
+    مثل (a+)+ أو (\w+\s?)* أو (a?){25}، أو جزء يمكن أن يطابق الفراغ مثل (a|)*، أو بدائل
+    يمكن أن تبدأ بالحرف نفسه أو يمكن أن يكون أحدها فارغاً مثل (a|a)* أو (a|a?)+.
+    """
+    # الفحص محافظ عمداً: كل مكمم متغير داخل تكرار يُرفض ولو جعل فاصلٌ التطابقَ وحيداً
+    # كما في (ab+)+ أو (\d+-)+x، وهذه الإيجابيات الكاذبة مقصودة و allow_risky لتجاوزها.
+    # أما المكممات المتتالية غير المتداخلة مثل (ab)+c+ فلا تُرفض.
+    for op, av in parsed:
+        if inside_repeat and _is_unbounded_repeat(op, av):
+            return "مكمم غير محدود داخل تكرار"
+        if inside_repeat and _is_repeat(op) and av[0] < av[1]:
+            return "مكمم متغير العدد داخل تكرار"
+        if inside_repeat and op is sre_parse.BRANCH:
+            if any(_is_nullable(alternative) for alternative in av[1]):
+                return "بديل يمكن أن يكون فارغاً داخل تكرار"
+            if _branches_overlap(av[1]):
+                return "بدائل متداخلة داخل تكرار"
+        if inside_repeat and op is sre_parse.SUBPATTERN and _is_nullable(av[3]):
+            return "مجموعة يمكن أن تكون فارغة داخل تكرار"
+        repeating = _is_repeat(op) and av[1] > 1
+        for sub in _subpatterns(op, av):
+            reason = _backtracking_risk(sub, inside_repeat or repeating)
+            if reason:
+                return reason
+    return None
+
+
+def _branches_overlap(alternatives):
+    """
+    هل يمكن لبديلين أن يبدآ بالحرف نفسه (تقدير محافظ: عنصران أولان متطابقان،
+    أو فئتا أحرف، أو . مع أي بديل آخر)
+    """
+    firsts = [alternative[0] if len(alternative) else None for alternative in alternatives]
+    if len(set(map(repr, firsts))) < len(firsts):
+        return True
+    classes = [first for first in firsts if first is not None and first[0] in (sre_parse.ANY, sre_parse.IN)]
+    return len(classes) > 1 or any(first[0] is sre_parse.ANY for first in classes)
+
+
+class HyperLogLog:
+    """
+    تقدير عدد العناصر المختلفة بذاكرة ثابتة (2^precision بايت)
+
+    كل عنصر يُجزَّأ بـ blake2b (64 بت): أول precision بتاً تختار السجل، ويُحفظ فيه أكبر
+    موضع لأول بت 1 في البقية. الخطأ المعياري نحو 1.04 / sqrt(2^precision)، والدمج
+    (لأجزاء أو ملفات أخرى) هو أكبر قيمة لكل سجل.
+    """
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    def add(self, key):
+        h = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_many(self, keys):
+        """إضافة دفعة من العناصر؛ مع NumPy تُحدَّث السجلات دفعة واحدة"""
+        if _load_numpy() is None:
+            for key in keys:
+                self.add(key)
+            return
+        digests = b''.join([hashlib.blake2b(key, digest_size=8).digest() for key in keys])
+        if not digests:
+            return
+        hashes = np.frombuffer(digests, dtype='<u8')
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        # الباقي أقل من 2^53 فيُمثَّل بدقة، وأس frexp يساوي bit_length
+        _, exponent = np.frexp((hashes & np.uint64((1 << bits) - 1)).astype(np.float64))
+        rank = (bits - exponent + 1).astype(np.uint8)
+        np.maximum.at(np.frombuffer(self.registers, dtype=np.uint8), index, rank)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("لا يمكن دمج مخططات HyperLogLog بدقة مختلفة")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    @property
+    def error_rate(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # تصحيح المدى الصغير بالعدّ الخطي
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['precision'], base64.b64decode(data['registers']))
+
+
+class LengthQuantileSketch:
+    """
+    مخطط قابل للدمج لتوزيع الأطوال يعطي المئينات بذاكرة محدودة
+
+    الأطوال حتى LENGTH_SKETCH_EXACT تُعدّ بدقة (وهي الغالبية في قوائم كلمات المرور)،
+    وما فوقها في سلال لوغاريتمية بنسبة LENGTH_SKETCH_GAMMA، فيبقى عدد السلال محدوداً
+    والخطأ النسبي للمئين دون 2%. الدمج جمع عدادات السلال.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.total = 0
+
+    @staticmethod
+    def _bucket(length):
+        if length <= LENGTH_SKETCH_EXACT:
+            return length
+        return LENGTH_SKETCH_EXACT + math.ceil(math.log(length / LENGTH_SKETCH_EXACT, LENGTH_SKETCH_GAMMA))
+
+    @staticmethod
+    def _value(bucket):
+        if bucket <= LENGTH_SKETCH_EXACT:
+            return bucket
+        return round(LENGTH_SKETCH_EXACT * LENGTH_SKETCH_GAMMA ** (bucket - LENGTH_SKETCH_EXACT))
+
+    def add(self, length, count=1):
+        self.counts[self._bucket(length)] += count
+        self.total += count
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] += count
+        self.total += other.total
+
+    def quantile(self, q):
+        """الطول عند المئين q (بين 0 و 1)"""
+        if not self.total:
+            return None
+        rank = q * (self.total - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(max(self.counts))
+
+    def to_dict(self):
+        return {str(bucket): count for bucket, count in self.counts.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        for bucket, count in data.items():
+            sketch.counts[int(bucket)] += count
+            sketch.total += count
+        return sketch
+
+
+class CountMinSketch:
+    """
+    مخطط Count-Min لعدّ التكرارات تقريبياً بذاكرة ثابتة
+
+    depth صفاً من width عداداً (uint32). التقدير لا يقل عن العدد الحقيقي، ويتجاوزه
+    بأقل من (e / width) * N باحتمال 1 - e^-depth حيث N عدد العناصر المضافة.
+    """
+
+    def __init__(self, width, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('I', bytes(4 * width)) for _ in range(depth)]
+
+    @classmethod
+    def from_memory(cls, memory_mb, depth=4):
+        return cls(max(1024, memory_mb * 1024 * 1024 // (4 * depth)), depth)
+
+    @property
+    def error_rate(self):
+        return math.e / self.width
+
+    @property
+    def confidence(self):
+        return 1 - math.exp(-self.depth)
+
+    def _slots(self, key):
+        # تجزئة مزدوجة: h1 + i * h2 لكل صف من بصمة واحدة
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        width = self.width
+        return [(h1 + i * h2) % width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        """إضافة عنصر بتحديث محافظ وإرجاع تقديره الجديد"""
+        slots = self._slots(key)
+        rows = self.rows
+        estimate = min(rows[i][slot] for i, slot in enumerate(slots)) + count
+        for i, slot in enumerate(slots):
+            # التحديث المحافظ: لا يُرفع إلا ما هو دون التقدير الجديد
+            if rows[i][slot] < estimate:
+                rows[i][slot] = min(estimate, 0xFFFFFFFF)
+        return estimate
+
+    def estimate(self, key):
+        return min(self.rows[i][slot] for i, slot in enumerate(self._slots(key)))
+
+    def merge(self, other):
+        """دمج مخطط آخر بالأبعاد نفسها (مثلاً من جزء آخر من الملف)"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("لا يمكن دمج مخططات بأبعاد مختلفة")
+        for row, other_row in zip(self.rows, other.rows):
+            for i, value in enumerate(other_row):
+                if value:
+                    row[i] = min(row[i] + value, 0xFFFFFFFF)
+
+
+class HeavyHitters:
+    """كومة محدودة لأعلى المرشحين تكراراً حسب تقديرات CountMinSketch"""
+
+    def __init__(self, sketch, capacity):
+        self.sketch = sketch
+        self.capacity = capacity
+        self.candidates = {}
+        self._heap = []
+
+    def add(self, key):
+        estimate = self.sketch.add(key)
+        candidates = self.candidates
+        if key in candidates or len(candidates) < self.capacity:
+            candidates[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        elif estimate > self._min_estimate():
+            _, evicted = heapq.heappop(self._heap)
+            del candidates[evicted]
+            candidates[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.capacity:
+            # إزالة المدخلات القديمة المتراكمة في الكومة
+            self._heap = [(value, key) for key, value in candidates.items()]
+            heapq.heapify(self._heap)
+
+    def _min_estimate(self):
+        # تجاهل مدخلات الكومة القديمة حتى يظهر أصغر تقدير حالي
+        heap = self._heap
+        while heap[0][0] != self.candidates.get(heap[0][1]):
+            heapq.heappop(heap)
+        return heap[0][0]
+
+    def top(self, n):
+        return heapq.nlargest(n, self.candidates.items(), key=lambda item: (item[1], item[0]))
+
+
+class SpaceSaving:
+    """
+    عدّاد محدود السعة لأكثر العناصر تكراراً (خوارزمية Space-Saving بأوزان)
+
+    يحتفظ بـ capacity عنصراً على الأكثر؛ العنصر الجديد حين يمتلئ الجدول يحل محل الأقل
+    عداً ويرث عدده، فلا يقل أي تقدير عن العدد الحقيقي ولا يتجاوزه بأكثر من
+    error_bound (وهو دائماً دون N / capacity).
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self._heap = []
+        self.error_bound = 0
+
+    def update(self, counts):
+        """إضافة قاموس {العنصر: العدد}"""
+        current = self.counts
+        heap = self._heap
+        for key, count in counts.items():
+            if key in current:
+                current[key] += count
+            elif len(current) < self.capacity:
+                current[key] = count
+            else:
+                # إزالة المدخلات القديمة من الكومة حتى يظهر الأقل عداً حالياً
+                while heap[0][0] != current.get(heap[0][1]):
+                    heapq.heappop(heap)
+                smallest, evicted = heapq.heappop(heap)
+                del current[evicted]
+                current[key] = smallest + count
+                self.error_bound = max(self.error_bound, smallest)
+            heapq.heappush(heap, (current[key], key))
+        if len(heap) > 4 * self.capacity:
+            self._heap = [(value, key) for key, value in current.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: (item[1], item[0]))
+
+
+class LineIndex:
+    """
+    فهرس دائم لمواقع الأسطر في ملف كلمات مرور (input_file + '.idx')
+
+    يحتوي الملف على ترويسة ثم مصفوفة إزاحات uint64 لبداية كل سطر ثم مصفوفة
+    أطوال uint8 (طول كلمة المرور بالبايت دون فاصل السطر، وتُخزَّن 255 لما هو أطول).
+    يُفتح الفهرس عبر mmap فيصبح عدّ الأسطر والوصول العشوائي وحدود التوزيع فورية.
+    """
+
+    MAGIC = b'PWLIDX01'
+    HEADER = struct.Struct('<8sQQq')  # magic, عدد الأسطر، حجم الملف، وقت التعديل
+    MAX_LENGTH = 255
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        with open(index_file, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.file_size, self.mtime_ns = self.HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC:
+            self._mm.close()
+            raise ValueError(f"ملف فهرس غير صالح: {index_file}")
+        view = memoryview(self._mm)
+        offsets_start = self.HEADER.size
+        lengths_start = offsets_start + 8 * self.count
+        self._offsets = view[offsets_start:lengths_start].cast('Q')
+        self._lengths = view[lengths_start:lengths_start + self.count]
+        view.release()
+
+    @staticmethod
+    def path_for(input_file):
+        return input_file + LINE_INDEX_SUFFIX
+
+    @classmethod
+    def build(cls, input_file, index_file=None):
+        """بناء الفهرس بمسح واحد للملف وكتابته بجانبه"""
+        index_file = index_file or cls.path_for(input_file)
+        st = os.stat(input_file)
+        offsets = array('Q')
+        lengths = array('B')
+
+        if st.st_size:
+            with open(input_file, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    with tqdm(total=st.st_size, unit='B', unit_scale=True, desc="بناء الفهرس") as pbar:
+                        pos = 0
+                        reported = 0
+                        while pos < st.st_size:
+                            newline = mm.find(b'\n', pos)
+                            end = st.st_size if newline == -1 else newline
+                            content_end = end - 1 if end > pos and mm[end - 1] == 13 else end  # \r
+                            offsets.append(pos)
+                            lengths.append(min(content_end - pos, cls.MAX_LENGTH))
+                            pos = end + 1
+                            if pos - reported >= SPLIT_SCAN_BLOCK:
+                                pbar.update(pos - reported)
+                                reported = pos
+                        pbar.update(st.st_size - reported)
+                finally:
+                    mm.close()
+
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file, 'wb') as out:
+            out.write(cls.HEADER.pack(cls.MAGIC, len(offsets), st.st_size, st.st_mtime_ns))
+            offsets.tofile(out)
+            lengths.tofile(out)
+        os.replace(tmp_file, index_file)
+        return cls(index_file)
+
+    @classmethod
+    def load(cls, input_file, index_file=None):
+        """فتح الفهرس إن وُجد وكان مطابقاً للملف الحالي، وإلا إرجاع None"""
+        index_file = index_file or cls.path_for(input_file)
+        try:
+            index = cls(index_file)
+        except (OSError, ValueError, struct.error):
+            return None
+        st = os.stat(input_file)
+        if index.file_size != st.st_size or index.mtime_ns != st.st_mtime_ns:
+            index.close()
+            return None
+        return index
+
+    def close(self):
+        self._offsets.release()
+        self._lengths.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def offset(self, line_no):
+        """إزاحة بداية السطر"""
+        return self._offsets[line_no]
+
+    def line_range(self, line_no):
+        """حدود السطر بالبايت (البداية، النهاية شاملة فاصل السطر)"""
+        end = self._offsets[line_no + 1] if line_no + 1 < self.count else self.file_size
+        return self._offsets[line_no], end
+
+    def length(self, line_no):
+        """طول كلمة المرور بالبايت (MAX_LENGTH تعني MAX_LENGTH أو أكثر)"""
+        return self._lengths[line_no]
+
+    def read_line(self, mm, line_no):
+        """قراءة سطر محدد من mmap الملف الأصلي"""
+        start, end = self.line_range(line_no)
+        return mm[start:end].rstrip(b'\r\n')
+
+    def select_by_length(self, min_length=0, max_length=None, mm=None):
         """
-        تصفية ملف كبير من كلمات المرور مع دعم الذاكرة الفعالة
-        
-        المعايير المتاحة:
-        - min_length: الحد الأدنى لطول كلمة المرور
-        - max_length: الحد الأقصى لطول كلمة المرور
-        - require_upper: تتطلب حرف كبير على الأقل
-        - require_lower: تتطلب حرف صغير على الأقل
-        - require_digit: تتطلب رقم على الأقل
-        - require_special: تتطلب رمز خاص على الأقل
-        - exclude_common: استبعاد كلمات المرور الشائعة
-        - exclude_weak_patterns: استبعاد الأنماط الضعيفة
-        - custom_regex: تعبير نمطي مخصص للاستبعاد
-        - keep_unique: الاحتفاظ بالكلمات الفريدة فقط
+        أرقام الأسطر التي يقع طولها ضمن المدى (max_length=None بلا حد أعلى) دون قراءة محتواها
+
+        الطول المخزن MAX_LENGTH يعني "MAX_LENGTH أو أكثر". إن توقف قرار مثل هذا السطر على
+        طوله الفعلي (حد عند MAX_LENGTH أو فوقه) يُقرأ السطر من mm (mmap الملف الأصلي)، ودون
+        mm يُرمى ValueError بدل نتيجة خاطئة.
         """
-        start_time = time.time()
-        unique_passwords = set() if filters.get('keep_unique', False) else None
-        total_count = 0
-        filtered_count = 0
-        
-        # حساب عدد الأسطر للملف (لشريط التقدم)
-        file_size = os.path.getsize(input_file)
-        
-        with open(input_file, 'r+', encoding='utf-8', errors='ignore') as infile:
-            # استخدام mmap لمعالجة الملف الكبير بكفاءة
-            mm = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
-            
-            with open(output_file, 'w', encoding='utf-8') as outfile:
-                with tqdm(total=file_size, unit='B', unit_scale=True, desc="معالجة الملف") as pbar:
-                    for line in iter(mm.readline, b''):
-                        try:
-                            password = line.decode('utf-8').strip()
-                        except UnicodeDecodeError:
-                            password = line.decode('latin-1').strip()
-                            
-                        total_count += 1
-                        pbar.update(len(line))
-                        
-                        # تطبيق الفلاتر
-                        include = True
-                        
-                        if 'min_length' in filters and len(password) < filters['min_length']:
-                            include = False
-                        if 'max_length' in filters and len(password) > filters['max_length']:
-                            include = False
-                        if 'require_upper' in filters and not re.search(r'[A-Z]', password):
-                            include = False
-                        if 'require_lower' in filters and not re.search(r'[a-z]', password):
-                            include = False
-                        if 'require_digit' in filters and not re.search(r'[0-9]', password):
-                            include = False
-                        if 'require_special' in filters and not re.search(r'[^A-Za-z0-9]', password):
-                            include = False
-                        if 'exclude_common' in filters and password.lower() in self.common_passwords:
-                            include = False
-                        if 'exclude_weak_patterns' in filters and self._matches_weak_pattern(password):
-                            include = False
-                        if 'custom_regex' in filters and re.search(filters['custom_regex'], password):
-                            include = False
-                            
-                        if include:
-                            if unique_passwords is not None:
-                                if password not in unique_passwords:
-                                    unique_passwords.add(password)
-                                    outfile.write(password + '\n')
-                                    filtered_count += 1
-                            else:
-                                outfile.write(password + '\n')
-                                filtered_count += 1
-                                
-        elapsed_time = time.time() - start_time
-        stats = {
-            'total_passwords': total_count,
-            'filtered_passwords': filtered_count,
-            'filtered_percentage': (filtered_count / total_count) * 100 if total_count > 0 else 0,
-            'time_elapsed': elapsed_time,
-            'passwords_per_second': total_count / elapsed_time if elapsed_time > 0 else 0
-        }
-        
-        return stats
-    
-    def analyze_file(self, input_file):
-        """تحليل ملف كلمات المرور وإنتاج إحصاءات"""
-        stats = {
-            'length_dist': defaultdict(int),
-            'composition': defaultdict(int),
-            'common_count': 0,
-            'weak_pattern_count': 0,
-            'total': 0
-        }
-        
-        file_size = os.path.getsize(input_file)
-        
-        with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-            with tqdm(total=file_size, unit='B', unit_scale=True, desc="تحليل الملف") as pbar:
-                for line in f:
-                    password = line.strip()
-                    stats['total'] += 1
-                    pbar.update(len(line.encode('utf-8')))
-                    
-                    # تحليل الطول
-                    length = len(password)
-                    stats['length_dist'][length] += 1
-                    
-                    # تحليل التركيبة
-                    has_upper = re.search(r'[A-Z]', password)
-                    has_lower = re.search(r'[a-z]', password)
-                    has_digit = re.search(r'[0-9]', password)
-                    has_special = re.search(r'[^A-Za-z0-9]', password)
-                    
-                    if has_upper and has_lower and has_digit and has_special:
-                        stats['composition']['mixed_all'] += 1
-                    elif has_upper and has_lower and has_digit:
-                        stats['composition']['mixed_alpha_num'] += 1
-                    elif has_upper and has_lower:
-                        stats['composition']['mixed_alpha'] += 1
-                    elif has_lower and has_digit:
-                        stats['composition']['lower_num'] += 1
-                    elif has_lower:
-                        stats['composition']['lower_only'] += 1
-                    elif has_upper:
-                        stats['composition']['upper_only'] += 1
-                    elif has_digit:
-                        stats['composition']['numbers_only'] += 1
-                    else:
-                        stats['composition']['special_only'] += 1
-                    
-                    # التحقق من كلمات المرور الشائعة
-                    if password.lower() in self.common_passwords:
-                        stats['common_count'] += 1
-                        
-                    # التحقق من الأنماط الضعيفة
-                    if self._matches_weak_pattern(password):
-                        stats['weak_pattern_count'] += 1
-        
-        return stats
-    
-    def split_large_file(self, input_file, output_prefix, chunk_size=1000000):
-        """تقسيم ملف كبير إلى أجزاء أصغر"""
-        file_count = 0
-        line_count = 0
-        
-        with open(input_file, 'r', encoding='utf-8', errors='ignore') as infile:
-            outfile = None
-            
-            for line in tqdm(infile, desc="تقسيم الملف"):
-                if line_count % chunk_size == 0:
-                    if outfile is not None:
-                        outfile.close()
-                    file_count += 1
-                    outfile = open(f"{output_prefix}_{file_count}.txt", 'w', encoding='utf-8')
-                
-                outfile.write(line)
-                line_count += 1
-            
-            if outfile is not None:
-                outfile.close()
-        
-        return file_count
+        exact_saturated = max_length is None and min_length <= self.MAX_LENGTH
+        if mm is None and not exact_saturated and (max_length is None or max_length >= self.MAX_LENGTH):
+            raise ValueError(f"حدود الطول عند {self.MAX_LENGTH} أو فوقه تتطلب mmap الملف الأصلي")
+        upper = self.MAX_LENGTH if max_length is None else max_length
+        lengths = self._lengths
+
+        def select():
+            for i in range(self.count):
+                length = lengths[i]
+                if length == self.MAX_LENGTH and not exact_saturated:
+                    if upper < self.MAX_LENGTH:
+                        continue
+                    length = len(self.read_line(mm, i))
+                    if min_length <= length and (max_length is None or length <= max_length):
+                        yield i
+                elif min_length <= length <= upper:
+                    yield i
+        return select()
+
+    def sample(self, k, rng=None):
+        """أرقام أسطر عشوائية موزعة بانتظام على أسطر الملف"""
+        rng = rng or random.Random()
+        return sorted(rng.sample(range(self.count), min(k, self.count)))
+
+    def line_cuts(self, chunk_size):
+        """نقاط القطع بالبايت كل chunk_size سطراً"""
+        return [self._offsets[i] for i in range(chunk_size, self.count, chunk_size)]
+
+    def shard_bounds(self, shards):
+        """حدود بالبايت تقسم الأسطر إلى shards أجزاء متساوية العدد"""
+        step = -(-self.count // shards) if self.count else 1
+        starts = [self._offsets[i] for i in range(0, self.count, step)]
+        return list(zip(starts, starts[1:] + [self.file_size]))
+
+
+class CommonPasswordStore:
+    """
+    مخزن كلمات مرور شائعة مبني مسبقاً على القرص ويُفتح عبر mmap للقراءة فقط
+
+    جدول تجزئة بعناوين مفتوحة وخانات ثابتة الحجم (uint64): كل خانة تحمل بصمة
+    blake2b بطول 64 بت لكلمة المرور بأحرف صغيرة، والصفر يعني خانة فارغة.
+    الفحص O(1) والعمليات العاملة تتشارك صفحات الملف نفسها دون نسخ.
+    """
+
+    MAGIC = b'PWCSET01'
+    HEADER = struct.Struct('<8sQQ')  # magic، عدد الخانات، عدد الكلمات
+    LOAD_FACTOR = 0.5
+
+    def __init__(self, store_file):
+        self.store_file = store_file
+        with open(store_file, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.slots, self.count = self.HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            magic = None
+        # الحجم يجب أن يطابق عدد الخانات في الترويسة تماماً (ملف مقطوع أو من صيغة أخرى)
+        if (magic != self.MAGIC or self.slots == 0 or self.count > self.slots
+                or len(self._mm) != self.HEADER.size + 8 * self.slots):
+            self._mm.close()
+            raise ValueError(f"ملف مخزن غير صالح: {store_file}")
+        view = memoryview(self._mm)
+        self._table = view[self.HEADER.size:self.HEADER.size + 8 * self.slots].cast('Q')
+        view.release()
+
+    @staticmethod
+    def _hash(password):
+        value = int.from_bytes(
+            hashlib.blake2b(password.encode('utf-8', errors='surrogatepass'), digest_size=8).digest(), 'little')
+        return value or 1
+
+    @classmethod
+    def build(cls, text_file, store_file, top_n=None):
+        """بناء المخزن من قائمة نصية (كلمة في كل سطر)"""
+        # تمرير أول لعدّ الأسطر حتى يُحجز الجدول مرة واحدة دون مجموعة وسيطة في الذاكرة
+        with open(text_file, 'rb') as f:
+            lines = sum(block.count(b'\n') for block in iter(lambda: f.read(SPLIT_SCAN_BLOCK), b'')) + 1
+        if top_n is not None:
+            lines = min(lines, top_n)
+
+        slots = max(16, int(lines / cls.LOAD_FACTOR) + 1)
+        table = array('Q', bytes(8 * slots))
+        count = 0
+        with open(text_file, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in tqdm(itertools.islice(f, top_n), total=lines, desc="بناء مخزن الكلمات الشائعة", unit=' كلمة'):
+                password = line.strip().lower()
+                if not password:
+                    continue
+                value = cls._hash(password)
+                slot = value % slots
+                while table[slot] and table[slot] != value:
+                    slot = (slot + 1) % slots
+                if not table[slot]:
+                    table[slot] = value
+                    count += 1
+
+        tmp_file = store_file + '.tmp'
+        with open(tmp_file, 'wb') as out:
+            out.write(cls.HEADER.pack(cls.MAGIC, slots, count))
+            table.tofile(out)
+        os.replace(tmp_file, store_file)
+        return cls(store_file)
+
+    def __contains__(self, password):
+        value = self._hash(password)
+        table = self._table
+        slots = self.slots
+        slot = value % slots
+        # البناء يترك نصف الخانات فارغة، والحد يمنع الدوران بلا نهاية في جدول ممتلئ
+        for _ in range(slots):
+            entry = table[slot]
+            if entry == value:
+                return True
+            if entry == 0:
+                return False
+            slot = (slot + 1) % slots
+        return False
+
+    def __len__(self):
+        return self.count
+
+    def fingerprint(self):
+        st = os.stat(self.store_file)
+        return f"{os.path.abspath(self.store_file)}:{st.st_size}:{st.st_mtime_ns}:{self.count}"
+
+    def __getstate__(self):
+        # العمليات العاملة تعيد فتح الملف نفسه بدلاً من نسخ الجدول
+        return {'store_file': self.store_file}
+
+    def __setstate__(self, state):
+        self.__init__(state['store_file'])
+
+    def close(self):
+        self._table.release()
+        self._mm.close()
+
+
+CLASS_TABLE = None  # يُبنى مع استيراد NumPy في _load_numpy
+PAIR_TABLE = None
 
 
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description="أداة متقدمة لفلترة قوائم كلمات المرور الكبيرة")
-    parser.add_argument("input_file", help="ملف كلمات المرور المدخلة")
+    parser.add_argument("input_file", help="ملف كلمات المرور المدخلة ('-' للقراءة من stdin عند التصفية)")
     parser.add_argument("-o", "--output", help="ملف الإخراج للكلمات المصفاة", required=True)
     parser.add_argument("--min_length", type=int, help="الحد الأدنى لطول كلمة المرور")
     parser.add_argument("--max_length", type=int, help="الحد الأقصى لطول كلمة المرور")
@@ -235,39 +3473,190 @@ def main():
     parser.add_argument("--require_lower", action="store_true", help="تتطلب حرف صغير على الأقل")
     parser.add_argument("--require_digit", action="store_true", help="تتطلب رقم على الأقل")
     parser.add_argument("--require_special", action="store_true", help="تتطلب رمز خاص على الأقل")
+    parser.add_argument("--min_strength", type=float,
+                        help="أدنى قوة تقديرية بالبت (مجموعة الأحرف مع خصم القاموس والتسلسلات ومسارات لوحة المفاتيح)")
     parser.add_argument("--exclude_common", action="store_true", help="استبعاد كلمات المرور الشائعة")
     parser.add_argument("--exclude_weak_patterns", action="store_true", help="استبعاد الأنماط الضعيفة")
+    parser.add_argument("--weak_patterns_file",
+                        help="قاموس أنماط ضعيفة إضافية، نمط في كل سطر (الافتراضي: weak-patterns.txt إن وُجد)")
     parser.add_argument("--custom_regex", help="تعبير نمطي مخصص للاستبعاد")
+    parser.add_argument("--regex_file", help="ملف تعابير نمطية للاستبعاد، تعبير في كل سطر")
+    parser.add_argument("--allow_risky_regex", action="store_true",
+                        help="قبول تعابير --regex_file المعرضة للتراجع الكارثي بدل رفضها")
     parser.add_argument("--keep_unique", action="store_true", help="الاحتفاظ بالكلمات الفريدة فقط")
     parser.add_argument("--analyze_only", action="store_true", help="إجراء التحليل فقط دون التصفية")
+    parser.add_argument("--masks", type=int, metavar="K",
+                        help="مع --analyze_only: أكثر K أقنعة بنية (مثل ullllldd) مع نسب التغطية")
+    parser.add_argument("--sample", type=int,
+                        help="تحليل تقريبي من N سطراً عشوائياً مع فترات ثقة بدل فحص الملف كاملاً")
+    parser.add_argument("--confidence", type=float, default=0.95, help="مستوى الثقة لفترات --sample")
+    parser.add_argument("--incremental", action="store_true",
+                        help="حفظ نتائج التحليل في ملف جانبي ومعالجة الأسطر المضافة فقط في التشغيل التالي")
     parser.add_argument("--split", type=int, help="تقسيم الملف إلى أجزاء بحجم معين (عدد الأسطر)")
+    parser.add_argument("--split_bytes", type=int, help="تقسيم الملف إلى أجزاء بحجم تقريبي معين (بالبايت) على حدود الأسطر")
+    parser.add_argument("--build_index", action="store_true", help="بناء فهرس مواقع الأسطر بجانب الملف (.idx)")
+    parser.add_argument("--common_store", help="مخزن كلمات شائعة مبني مسبقاً (الافتراضي: top-passwords.pwset إن وُجد)")
+    parser.add_argument("--build_common_store", action="store_true",
+                        help="بناء مخزن كلمات شائعة من الملف المدخل وكتابته إلى ملف الإخراج")
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_MAGIC),
+                        help="ضغط ملفات الإخراج (الافتراضي: حسب امتداد ملف الإخراج)")
+    parser.add_argument("--metrics_file", help="كتابة مقاييس التقدم دورياً إلى هذا الملف")
+    parser.add_argument("--metrics_format", choices=["json", "prometheus"], default="json",
+                        help="صيغة ملف المقاييس")
+    parser.add_argument("--sort", choices=["lex", "length", "frequency"],
+                        help="فرز الملف بالدمج الخارجي (مع --keep_unique لحذف التكرار)")
+    parser.add_argument("--memory_mb", type=int, default=512, help="ميزانية الذاكرة للفرز بالميغابايت")
+    parser.add_argument("--tmp_dir", help="مجلد الملفات المؤقتة للفرز")
+    parser.add_argument("--top_frequent", type=int, help="تقدير أكثر N كلمات مرور تكراراً بذاكرة ثابتة")
+    parser.add_argument("--sketch_mb", type=int, default=256, help="ذاكرة مخطط عدّ التكرارات بالميغابايت")
+    parser.add_argument("--diff", metavar="OTHER_FILE", help="كتابة الكلمات الموجودة في الملف المدخل وليست في OTHER_FILE")
+    parser.add_argument("--intersect", metavar="OTHER_FILE", help="كتابة الكلمات المشتركة بين الملف المدخل و OTHER_FILE")
+    parser.add_argument("--union", metavar="OTHER_FILE", help="كتابة اتحاد الملف المدخل و OTHER_FILE دون تكرار")
+    parser.add_argument("--sorted_inputs", action="store_true",
+                        help="القائمتان مفروزتان مسبقاً (--sort lex) فيُستخدم دمج خطي")
+    parser.add_argument("--policies", help="ملف JSON بعدة سياسات تصفية تُقيَّم في مرور واحد: "
+                                             "{\"الاسم\": {\"output\": \"ملف\", \"filters\": {...}}}؛ "
+                                             "معايير سطر الأوامر تُضاف إلى كل سياسة ما لم تحددها السياسة نفسها")
+    parser.add_argument("--shards", type=int, help="كتابة ناتج التصفية مباشرة إلى N ملفات أجزاء (-o بادئة لها)")
+    parser.add_argument("--shard_by", choices=SHARD_MODES, default="hash",
+                        help="توزيع الأجزاء: hash (الكلمة نفسها في الجزء نفسه دائماً) أو round_robin (سطراً سطراً بالتناوب)")
+    parser.add_argument("--shard_bytes", type=int, help="حد حجم ملف الجزء بالبايت، يُفتح ملف جديد عند بلوغه")
+    parser.add_argument("--cache_dir", help="مجلد ذاكرة نتائج التصفية لكل كتلة لإعادة استخدامها في التشغيلات التالية")
+    parser.add_argument("--cache_mb", type=int, default=FILTER_CACHE_QUOTA // (1024 * 1024),
+                        help="حصة مجلد الذاكرة بالميغابايت (يُحذف الأقدم استخداماً عند تجاوزها)")
+    parser.add_argument("--checkpoint_interval", type=int, default=CHECKPOINT_INTERVAL,
+                        help="ثوانٍ بين نقاط الاستئناف أثناء التصفية (0 للتعطيل)")
+    parser.add_argument("--resume", action="store_true",
+                        help="استئناف تصفية منقطعة من آخر نقطة استئناف لملف الإخراج")
+    parser.add_argument("--workers", type=int,
+                        help="عدد العمليات المتوازية (الافتراضي: عدد الأنوية، وللتصفية خيط تقييم واحد)")
     
     args = parser.parse_args()
+    if args.input_file == '-' and (args.split or args.split_bytes or args.analyze_only or args.sort
+                                   or args.top_frequent or args.policies or args.diff or args.intersect or args.union
+                                   or args.build_index or args.build_common_store):
+        parser.error("القراءة من stdin مدعومة في وضع التصفية فقط")
+    if args.input_file == '-' and args.resume:
+        parser.error("الاستئناف يتطلب ملف إدخال لا stdin")
+    
+    if args.build_common_store:
+        print("جاري بناء مخزن كلمات المرور الشائعة...")
+        store = CommonPasswordStore.build(args.input_file, args.output)
+        print(f"تم تخزين {len(store)} كلمة في {args.output}")
+        store.close()
+        return
     
-    filter_tool = AdvancedPasswordFilter()
+    filter_tool = AdvancedPasswordFilter(common_store=args.common_store, metrics_file=args.metrics_file,
+                                         metrics_format=args.metrics_format,
+                                         weak_patterns_file=args.weak_patterns_file,
+                                         cache_dir=args.cache_dir, cache_quota=args.cache_mb * 1024 * 1024)
     
-    if args.split:
-        print(f"جاري تقسيم الملف إلى أجزاء بحجم {args.split} سطر...")
-        num_files = filter_tool.split_large_file(args.input_file, args.output, args.split)
+    if args.build_index:
+        print("جاري بناء فهرس الأسطر...")
+        with LineIndex.build(args.input_file) as index:
+            print(f"تم فهرسة {len(index)} سطر في {LineIndex.path_for(args.input_file)}")
+        return
+    
+    if args.split or args.split_bytes:
+        if args.split_bytes:
+            print(f"جاري تقسيم الملف إلى أجزاء بحجم {args.split_bytes} بايت تقريباً...")
+        else:
+            print(f"جاري تقسيم الملف إلى أجزاء بحجم {args.split} سطر...")
+        num_files = filter_tool.split_large_file(args.input_file, args.output, args.split or 1000000,
+                                                 chunk_bytes=args.split_bytes, workers=args.workers,
+                                                 compression=args.compress)
         print(f"تم تقسيم الملف إلى {num_files} أجزاء")
         return
     
+    if args.sort:
+        print("جاري فرز ملف كلمات المرور...")
+        stats = filter_tool.sort_large_file(args.input_file, args.output, order=args.sort, unique=args.keep_unique,
+                                            memory_mb=args.memory_mb, workers=args.workers,
+                                            tmp_dir=args.tmp_dir, compression=args.compress)
+        print(f"تم فرز {stats['total_lines']} سطر عبر {stats['runs']} مقطع إلى {stats['output_lines']} سطر "
+              f"في {stats['time_elapsed']:.2f} ثانية")
+        return
+    
+    set_operation = next(((op, getattr(args, op)) for op in SET_OPERATIONS if getattr(args, op)), None)
+    if set_operation:
+        operation, other_file = set_operation
+        print(f"جاري تنفيذ عملية {operation} بين القائمتين...")
+        stats = filter_tool.set_operation(operation, args.input_file, other_file, args.output,
+                                          memory_mb=args.memory_mb, workers=args.workers,
+                                          sorted_inputs=args.sorted_inputs, tmp_dir=args.tmp_dir,
+                                          compression=args.compress)
+        print(f"A: {stats['lines_a']} سطر، B: {stats['lines_b']} سطر، الناتج: {stats['output_lines']} سطر "
+              f"في {stats['time_elapsed']:.2f} ثانية")
+        return
+    
+    if args.top_frequent:
+        print(f"جاري تقدير أكثر {args.top_frequent} كلمات المرور تكراراً...")
+        result = filter_tool.top_frequencies(args.input_file, top_n=args.top_frequent, memory_mb=args.sketch_mb)
+        print(f"\nإجمالي الأسطر: {result['total']}")
+        print(f"هامش الخطأ: +{result['error_bound']:.1f} بثقة {result['confidence']:.2%}")
+        for rank, entry in enumerate(result['top'], 1):
+            print(f"{rank}. {entry['password']}: {entry['lower_bound']}-{entry['estimate']}")
+        return
+    
     if args.analyze_only:
+        if args.sample and args.incremental:
+            parser.error("--sample و --incremental لا يُستخدمان معاً")
+        if args.masks:
+            print("جاري حساب أقنعة البنية...")
+            result = filter_tool.analyze_file(args.input_file, masks=args.masks)
+            print(f"\nإجمالي الأسطر: {result['total']}")
+            print(f"هامش الخطأ: +{result['error_bound']}")
+            for rank, entry in enumerate(result['top'], 1):
+                hashcat_mask = ''.join('?' + char for char in entry['mask'])
+                print(f"{rank}. {entry['mask']} ({hashcat_mask}): {entry['count']} "
+                      f"({entry['share']:.2%}، التغطية {entry['coverage']:.2%})")
+            return
         print("جاري تحليل ملف كلمات المرور...")
-        stats = filter_tool.analyze_file(args.input_file)
+        try:
+            stats = filter_tool.analyze_file(args.input_file, incremental=args.incremental, sample=args.sample,
+                                             confidence=args.confidence)
+        except ValueError as e:
+            parser.error(str(e))
+        intervals = stats.get('intervals', {})
+
+        def interval(key, value=None):
+            """فترة الثقة كنص مضاف للنسبة عند التحليل بالعينة"""
+            bounds = intervals.get(key) if value is None else intervals.get(key, {}).get(value)
+            return f" [{bounds[0]:.2%} - {bounds[1]:.2%}]" if bounds else ""
         
         print("\nنتائج التحليل:")
-        print(f"إجمالي كلمات المرور: {stats['total']}")
-        print(f"كلمات مرور شائعة: {stats['common_count']} ({stats['common_count']/stats['total']:.2%})")
-        print(f"كلمات مرور ضعيفة الأنماط: {stats['weak_pattern_count']} ({stats['weak_pattern_count']/stats['total']:.2%})")
+        if intervals:
+            low, high = intervals['total']
+            print(f"تقدير من عينة {stats['sampled']} سطر بثقة {stats['confidence']:.0%}")
+            print(f"إجمالي كلمات المرور: ~{stats['total']} [{low} - {high}]")
+        else:
+            print(f"إجمالي كلمات المرور: {stats['total']}")
+        print(f"كلمات مرور شائعة: {stats['common_count']} ({stats['common_count']/stats['total']:.2%})"
+              f"{interval('common_count')}")
+        print(f"كلمات مرور ضعيفة الأنماط: {stats['weak_pattern_count']} ({stats['weak_pattern_count']/stats['total']:.2%})"
+              f"{interval('weak_pattern_count')}")
+        for pattern, count in sorted(stats['weak_pattern_hits'].items(), key=lambda item: -item[1])[:10]:
+            print(f"  - {pattern}: {count}{interval('weak_pattern_hits', pattern)}")
         
         print("\nتوزيع الأطوال:")
         for length, count in sorted(stats['length_dist'].items()):
-            print(f"- طول {length}: {count} ({count/stats['total']:.2%})")
+            print(f"- طول {length}: {count} ({count/stats['total']:.2%}){interval('length_dist', length)}")
         
         print("\nتركيبة كلمات المرور:")
         for comp_type, count in stats['composition'].items():
-            print(f"- {comp_type}: {count} ({count/stats['total']:.2%})")
+            print(f"- {comp_type}: {count} ({count/stats['total']:.2%}){interval('composition', comp_type)}")
+
+        print("\nتوزيع القوة التقديرية (بالبت):")
+        for bucket, count in sorted(stats['strength'].items()):
+            print(f"- {bucket}-{bucket + STRENGTH_BUCKET}: {count} ({count/stats['total']:.2%})"
+                  f"{interval('strength', bucket)}")
+
+        if 'distinct' in stats:
+            distinct = stats['distinct']
+            print(f"\nكلمات مرور مختلفة (تقدير): ~{distinct.estimate()} (±{distinct.error_rate:.1%})")
+            print("\nمئينات الطول لكل تركيبة (p50 / p90 / p99):")
+            for comp_type, sketch in stats['length_quantiles'].items():
+                print(f"- {comp_type}: {sketch.quantile(0.5)} / {sketch.quantile(0.9)} / {sketch.quantile(0.99)}")
         
         return
     
@@ -284,23 +3673,73 @@ def main():
         filters['require_digit'] = True
     if args.require_special:
         filters['require_special'] = True
+    if args.min_strength is not None:
+        filters['min_strength'] = args.min_strength
     if args.exclude_common:
         filters['exclude_common'] = True
     if args.exclude_weak_patterns:
         filters['exclude_weak_patterns'] = True
     if args.custom_regex:
         filters['custom_regex'] = args.custom_regex
+    if args.regex_file:
+        filters['regex_file'] = args.regex_file
+        # الترجمة وفحص التراجع الكارثي قبل بدء المهمة لا في منتصفها
+        try:
+            regex_set = filter_tool.regex_set(args.regex_file, args.allow_risky_regex)
+        except ValueError as e:
+            parser.error(str(e))
+        for pattern, reason in regex_set.risky:
+            print(f"تحذير: {pattern!r}: {reason}", file=sys.stderr)
+        if args.allow_risky_regex:
+            filters['allow_risky_regex'] = True
     if args.keep_unique:
         filters['keep_unique'] = True
     
+    if args.policies:
+        with open(args.policies, 'r', encoding='utf-8') as f:
+            policies = json.load(f)
+        for name, policy in policies.items():
+            # ملف الإخراج الافتراضي لكل سياسة يُبنى من -o، ومعايير سطر الأوامر افتراضية لكل سياسة
+            policy.setdefault('output', f"{args.output}_{name}.txt")
+            policy['filters'] = {**filters, **policy.get('filters', {})}
+        print(f"جاري تقييم {len(policies)} سياسات في مرور واحد...")
+        results = filter_tool.filter_multi_policy(args.input_file, policies, compression=args.compress)
+        for name, stats in results.items():
+            print(f"\n[{name}] -> {policies[name]['output']}")
+            print(f"عدد كلمات المرور المصفاة: {stats['filtered_passwords']} ({stats['filtered_percentage']:.2f}%)")
+            for reason, count in sorted(stats['rejected_by'].items(), key=lambda item: -item[1]):
+                print(f"- مرفوضة بسبب {reason}: {count}")
+        return
+    
     print("جاري تصفية كلمات المرور...")
-    stats = filter_tool.filter_large_file(args.input_file, args.output, filters)
+    if args.input_file == '-':
+        stdin = io.open(sys.stdin.fileno(), 'rb', buffering=STREAM_BUFFER_SIZE, closefd=False)
+        stats = filter_tool.filter_stream(stdin, args.output, filters, compression=args.compress,
+                                          workers=args.workers, shards=args.shards, shard_by=args.shard_by,
+                                          shard_bytes=args.shard_bytes)
+    else:
+        try:
+            stats = filter_tool.filter_large_file(args.input_file, args.output, filters, compression=args.compress,
+                                                  workers=args.workers, checkpoint_interval=args.checkpoint_interval,
+                                                  resume=args.resume, shards=args.shards, shard_by=args.shard_by,
+                                                  shard_bytes=args.shard_bytes)
+        except ValueError as e:
+            parser.error(str(e))
     
     print("\nنتائج التصفية:")
     print(f"إجمالي كلمات المرور المدخلة: {stats['total_passwords']}")
     print(f"عدد كلمات المرور المصفاة: {stats['filtered_passwords']} ({stats['filtered_percentage']:.2f}%)")
     print(f"الوقت المستغرق: {stats['time_elapsed']:.2f} ثانية")
     print(f"معدل المعالجة: {stats['passwords_per_second']:,.0f} كلمة/ثانية")
+    if stats['decode_fallbacks'] or stats['encodings']['utf8']:
+        encodings = stats['encodings']
+        print(f"الترميز: ASCII {encodings['ascii']}، UTF-8 {encodings['utf8']}، غير UTF-8 {encodings['non_utf8']}")
+    if 'output_files' in stats:
+        print(f"ملفات الأجزاء: {len(stats['output_files'])}")
+    if 'cache_hits' in stats:
+        print(f"كتل من الذاكرة: {stats['cache_hits']} / {stats['cache_hits'] + stats['cache_misses']}")
+    for name, count in sorted(stats['rejected_by'].items(), key=lambda item: -item[1]):
+        print(f"- مرفوضة بسبب {name}: {count}")
 
 
 if __name__ == "__main__":
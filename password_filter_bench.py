@@ -0,0 +1,295 @@
+"""
+مجموعة قياس أداء password_filter.py
+
+تولّد قائمة كلمات اصطناعية بحجم وتوزيع أطوال ونِسب أحرف ونسبة أسطر غير UTF-8
+محددة، ثم تشغّل filter_large_file و analyze_file و analyze_masks و split_large_file
+على مصفوفة من الإعدادات، كل حالة في عملية مستقلة لقياس الإنتاجية وذروة الذاكرة
+(RSS)، وتقارن النتائج بخط أساس محفوظ فتفشل عند التراجع.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+CHARSETS = {
+    'lower': string.ascii_lowercase,
+    'upper': string.ascii_uppercase,
+    'digit': string.digits,
+    'special': '!@#$%^&*()_+-=[]{}|;:,.<>?'
+}
+# أحرف latin-1 تنتج بايتات غير صالحة كـ UTF-8 عند ترميزها بـ latin-1
+NON_UTF8_CHARS = 'àáâãäåçèéêëìíîïñòóôõöùúûüý'
+
+FILTER_MATRIX = {
+    'none': {},
+    'length': {'min_length': 8, 'max_length': 64},
+    'classes': {'require_upper': True, 'require_lower': True, 'require_digit': True, 'require_special': True},
+    'common': {'exclude_common': True},
+    'weak': {'exclude_weak_patterns': True},
+    'regex': {'custom_regex': r'^(admin|root)|\d{6,}$'},
+    'strength': {'min_strength': 40},
+    'unique': {'keep_unique': True},
+    'all': {'min_length': 8, 'max_length': 64, 'require_upper': True, 'require_lower': True,
+            'require_digit': True, 'require_special': True, 'exclude_common': True,
+            'exclude_weak_patterns': True, 'custom_regex': r'^(admin|root)', 'keep_unique': True}
+}
+# السطر الوحيد في قياس زمن البدء؛ يجتاز معايير القياس فيظهر في الإخراج
+STARTUP_LINE = b'Zq8#vLm2!pTw\n'
+STARTUP_TIMEOUT = 120
+
+
+def parse_mix(text):
+    """تحويل 'lower=0.6,digit=0.3' إلى قاموس أوزان"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in CHARSETS:
+            raise argparse.ArgumentTypeError(f"فئة أحرف غير معروفة: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def generate_corpus(path, lines, min_len=6, max_len=16, length_dist='uniform', mix=None,
+                    non_utf8_share=0.0, duplicate_share=0.1, seed=0):
+    """
+    توليد قائمة كلمات اصطناعية قابلة لإعادة الإنتاج
+
+    - length_dist: uniform أو normal (متمركز في منتصف المدى)
+    - mix: أوزان فئات الأحرف lower/upper/digit/special
+    - non_utf8_share: نسبة الأسطر المكتوبة بترميز latin-1
+    - duplicate_share: نسبة الأسطر المكررة من أسطر سابقة
+    """
+    rng = random.Random(seed)
+    mix = mix or {'lower': 0.6, 'upper': 0.1, 'digit': 0.25, 'special': 0.05}
+    classes = list(mix)
+    weights = [mix[c] for c in classes]
+    mean = (min_len + max_len) / 2
+    sd = max((max_len - min_len) / 6, 1)
+    recent = []
+
+    with open(path, 'wb') as f:
+        for _ in range(lines):
+            if recent and rng.random() < duplicate_share:
+                f.write(rng.choice(recent))
+                continue
+            if length_dist == 'normal':
+                length = min(max_len, max(min_len, round(rng.gauss(mean, sd))))
+            else:
+                length = rng.randint(min_len, max_len)
+            chars = [rng.choice(CHARSETS[c]) for c in rng.choices(classes, weights, k=length)]
+            if rng.random() < non_utf8_share:
+                chars[rng.randrange(length)] = rng.choice(NON_UTF8_CHARS)
+                line = (''.join(chars) + '\n').encode('latin-1')
+            else:
+                line = (''.join(chars) + '\n').encode('ascii')
+            f.write(line)
+            if len(recent) < 10000:
+                recent.append(line)
+            else:
+                recent[rng.randrange(len(recent))] = line
+    return path
+
+
+def _run_startup(corpus, workdir):
+    """
+    قياس زمن البدء: من تشغيل سطر الأوامر حتى ظهور أول سطر معالج في الإخراج
+
+    الإدخال سطر واحد والإخراج أنبوب مسمى (FIFO) يُسجَّل وقت وصول أول بايت فيه، فيشمل
+    الزمن بدء المفسر والاستيراد وتحميل القوائم ومعالجة السطر دون زمن الخروج. هذا ما
+    يدفعه كل جزء صغير عند توزيع العمل على عمليات كثيرة قصيرة العمر. lines_per_second
+    هنا عدد مرات البدء في الثانية (مقلوب الزمن) ليبقى الأعلى أفضل عند المقارنة.
+    """
+    import select
+
+    shard = os.path.join(workdir, 'shard.txt')
+    with open(shard, 'wb') as f:
+        f.write(STARTUP_LINE)
+    fifo = os.path.join(workdir, 'filtered.fifo')
+    os.mkfifo(fifo)
+    # فتح طرف القراءة أولاً دون انتظار حتى لا يُحجب فتح الكاتب
+    fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'password_filter.py')
+    first_output = None
+    try:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, script, shard, '-o', fifo, '--checkpoint_interval', '0',
+                                 '--min_length', '8', '--exclude_weak_patterns'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while first_output is None and time.perf_counter() - start < STARTUP_TIMEOUT:
+            ready, _, _ = select.select([fd], [], [], 0.05)
+            chunk = os.read(fd, 65536) if ready else b''
+            if chunk:
+                first_output = time.perf_counter() - start
+            elif proc.poll() is not None:
+                break
+            elif ready:
+                # لا كاتب بعد: القراءة غير المحجوبة تُرجع نهاية الملف فوراً
+                time.sleep(0.001)
+        proc.wait(timeout=STARTUP_TIMEOUT)
+    finally:
+        os.close(fd)
+    if proc.returncode != 0 or first_output is None:
+        raise RuntimeError("لم يُنتج سطر الأوامر أي إخراج في قياس زمن البدء")
+    return {
+        'seconds': first_output,
+        'lines_per_second': 1 / first_output,
+        'mb_per_second': len(STARTUP_LINE) / first_output / 1e6,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+
+def _run_case(case, corpus, workdir, result_queue):
+    """تشغيل حالة قياس واحدة داخل عملية مستقلة"""
+    os.environ['TQDM_DISABLE'] = '1'
+    if case['operation'] == 'startup':
+        result_queue.put(_run_startup(corpus, workdir))
+        return
+    sys.stdout = open(os.devnull, 'w')
+    from password_filter import AdvancedPasswordFilter
+
+    tool = AdvancedPasswordFilter()
+    lines = sum(1 for _ in open(corpus, 'rb'))
+    size = os.path.getsize(corpus)
+    start = time.perf_counter()
+    if case['operation'] == 'filter':
+        tool.filter_large_file(corpus, os.path.join(workdir, 'filtered.txt'), FILTER_MATRIX[case['filters']])
+    elif case['operation'] == 'analyze':
+        tool.analyze_file(corpus)
+    elif case['operation'] == 'masks':
+        tool.analyze_masks(corpus)
+    elif case['operation'] == 'split_lines':
+        tool.split_large_file(corpus, os.path.join(workdir, 'part'), chunk_size=max(lines // 8, 1))
+    elif case['operation'] == 'split_bytes':
+        tool.split_large_file(corpus, os.path.join(workdir, 'part'), chunk_bytes=max(size // 8, 1))
+    elapsed = time.perf_counter() - start
+
+    result_queue.put({
+        'seconds': elapsed,
+        'lines_per_second': lines / elapsed if elapsed > 0 else 0,
+        'mb_per_second': size / elapsed / 1e6 if elapsed > 0 else 0,
+        # ru_maxrss بالكيلوبايت على لينكس
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    })
+
+
+def build_cases(filter_names, operations):
+    cases = []
+    for operation in operations:
+        if operation == 'filter':
+            cases.extend({'name': f'filter[{name}]', 'operation': 'filter', 'filters': name} for name in filter_names)
+        else:
+            cases.append({'name': operation, 'operation': operation})
+    return cases
+
+
+def run_benchmarks(corpus, cases, repeat=3):
+    """تشغيل كل حالة repeat مرات وأخذ أفضل إنتاجية وأعلى ذروة ذاكرة"""
+    ctx = multiprocessing.get_context('spawn')
+    results = {}
+    for case in cases:
+        runs = []
+        for _ in range(repeat):
+            workdir = tempfile.mkdtemp(prefix='pwbench_')
+            try:
+                result_queue = ctx.Queue()
+                proc = ctx.Process(target=_run_case, args=(case, corpus, workdir, result_queue))
+                proc.start()
+                runs.append(result_queue.get())
+                proc.join()
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+        best = max(runs, key=lambda r: r['lines_per_second'])
+        best['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+        results[case['name']] = best
+        print(f"{case['name']:<22} {best['lines_per_second']:>14,.0f} سطر/ث "
+              f"{best['mb_per_second']:>9.1f} MB/ث {best['peak_rss_mb']:>8.1f} MB RSS")
+    return results
+
+
+def compare_to_baseline(results, baseline, throughput_tolerance, rss_tolerance):
+    """إرجاع قائمة التراجعات مقارنة بخط الأساس"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['lines_per_second'] < base['lines_per_second'] * (1 - throughput_tolerance):
+            regressions.append(f"{name}: الإنتاجية {result['lines_per_second']:,.0f} < "
+                               f"{base['lines_per_second']:,.0f} سطر/ث")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + rss_tolerance):
+            regressions.append(f"{name}: ذروة الذاكرة {result['peak_rss_mb']:.1f} > {base['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس أداء أداة فلترة كلمات المرور")
+    parser.add_argument("--lines", type=int, default=1000000, help="عدد أسطر القائمة الاصطناعية")
+    parser.add_argument("--min_length", type=int, default=6, help="أقل طول لكلمة المرور")
+    parser.add_argument("--max_length", type=int, default=16, help="أكبر طول لكلمة المرور")
+    parser.add_argument("--length_dist", choices=["uniform", "normal"], default="uniform", help="توزيع الأطوال")
+    parser.add_argument("--mix", type=parse_mix, help="أوزان فئات الأحرف، مثل lower=0.6,upper=0.1,digit=0.25,special=0.05")
+    parser.add_argument("--non_utf8", type=float, default=0.02, help="نسبة الأسطر غير UTF-8")
+    parser.add_argument("--seed", type=int, default=0, help="بذرة التوليد العشوائي")
+    parser.add_argument("--corpus_dir", default=os.path.join(tempfile.gettempdir(), 'pwbench_corpus'),
+                        help="مجلد تخزين القوائم المولدة لإعادة استخدامها")
+    parser.add_argument("--filters", default=",".join(FILTER_MATRIX),
+                        help="أسماء إعدادات الفلترة المراد قياسها مفصولة بفواصل")
+    parser.add_argument("--operations", default="filter,analyze,masks,split_lines,split_bytes,startup",
+                        help="العمليات المراد قياسها مفصولة بفواصل")
+    parser.add_argument("--repeat", type=int, default=3, help="عدد مرات تشغيل كل حالة")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="ملف خط الأساس")
+    parser.add_argument("--update_baseline", action="store_true", help="حفظ النتائج الحالية كخط أساس")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="نسبة التراجع المسموحة في الإنتاجية")
+    parser.add_argument("--rss_tolerance", type=float, default=0.25, help="نسبة الزيادة المسموحة في ذروة الذاكرة")
+    parser.add_argument("-o", "--output", help="كتابة النتائج بصيغة JSON إلى هذا الملف")
+    args = parser.parse_args()
+
+    spec = {k: getattr(args, k) for k in ('lines', 'min_length', 'max_length', 'length_dist', 'mix', 'non_utf8', 'seed')}
+    corpus_key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    corpus = os.path.join(args.corpus_dir, f'corpus_{corpus_key}.txt')
+    if not os.path.exists(corpus):
+        print(f"جاري توليد قائمة اصطناعية من {args.lines} سطر...")
+        generate_corpus(corpus + '.tmp', args.lines, args.min_length, args.max_length, args.length_dist,
+                        args.mix, args.non_utf8, seed=args.seed)
+        os.replace(corpus + '.tmp', corpus)
+
+    cases = build_cases(args.filters.split(','), args.operations.split(','))
+    results = run_benchmarks(corpus, cases, args.repeat)
+    report = {'corpus': spec, 'results': results}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"تم حفظ خط الأساس في {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('corpus') != spec:
+            print("تحذير: خط الأساس مقيس على قائمة بإعدادات مختلفة", file=sys.stderr)
+        regressions = compare_to_baseline(results, baseline['results'], args.tolerance, args.rss_tolerance)
+        if regressions:
+            print("\nتراجع في الأداء:", file=sys.stderr)
+            for regression in regressions:
+                print(f"- {regression}", file=sys.stderr)
+            sys.exit(1)
+        print("\nلا يوجد تراجع مقارنة بخط الأساس")
+
+
+if __name__ == "__main__":
+    main()
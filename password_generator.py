@@ -1,4 +1,7 @@
+import bz2
+import gzip
 import itertools
+import lzma
 import re
 from datetime import datetime
 import argparse
@@ -274,10 +277,16 @@ def collect_keywords() -> List[str]:
     return keywords
 
 
-def save_wordlist(passwords: List[str], filename: str) -> None:
-    """Save passwords to file with checks"""
+COMPRESSORS = {'gz': gzip, 'xz': lzma, 'bz2': bz2}
+
+
+def save_wordlist(passwords: List[str], filename: str, compression: Optional[str] = None) -> None:
+    """Save passwords to file with checks, optionally compressed (gz, xz, bz2)"""
+    if compression is None:
+        compression = next((c for c in COMPRESSORS if filename.endswith('.' + c)), None)
+    opener = COMPRESSORS[compression].open if compression else open
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
+        with opener(filename, 'wt', encoding='utf-8') as f:
             f.writelines(f"{p}\n" for p in passwords)
         abs_path = os.path.abspath(filename)
         print(f"\n✅ {len(passwords)} passwords generated")
@@ -296,6 +305,8 @@ def main():
     parser.add_argument("--non-interactive", help="Disable interactive mode", action="store_true")
     parser.add_argument("--min-length", help="Minimum password length", type=int, default=6)
     parser.add_argument("--max-length", help="Maximum password length", type=int, default=30)
+    parser.add_argument("--compress", help="Compress the output file (default: from the output extension)",
+                        choices=sorted(COMPRESSORS))
     args = parser.parse_args()
     
     generator = AdvancedPasswordGenerator()
@@ -317,7 +328,7 @@ def main():
     )
     
     # Save results
-    save_wordlist(passwords, args.output)
+    save_wordlist(passwords, args.output, compression=args.compress)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,1067 @@
+"""اختبارات تكافؤ المسارات السريعة في password_filter.py مع المسارات العادية"""
+import pytest
+
+import password_filter as pf
+
+
+@pytest.fixture(autouse=True)
+def startup_cache(tmp_path, monkeypatch):
+    """ذاكرة الصيغ المبنية مسبقاً في مجلد مؤقت لكل اختبار بدل مجلد المستخدم"""
+    cache_dir = tmp_path / 'startup-cache'
+    monkeypatch.setattr(pf, 'STARTUP_CACHE_DIR', str(cache_dir))
+    return cache_dir
+
+
+@pytest.mark.parametrize("pattern", [
+    r'(a|a?)+$',
+    r'^(a?){25}a{25}$',
+    r'(a?)*',
+    r'(a|)*',
+    r'(a+)+',
+    r'(\w+\s?)*$',
+    r'(x{1,3})+y',
+    r'(?:a|b?)*c',
+    # إيجابيات كاذبة مقصودة: الفاصل يجعل التطابق وحيداً لكن الفحص محافظ
+    r'(ab+)+',
+    r'(\d+-)+x',
+])
+def test_backtracking_patterns_are_risky(pattern):
+    assert pf._backtracking_risk(pf.sre_parse.parse(pattern)) is not None
+    with pytest.raises(ValueError):
+        pf.RegexSet([pattern])
+
+
+@pytest.mark.parametrize("pattern", [
+    r'^(admin|root)',
+    r'^[a-z]+\d{2,4}$',
+    r'(ab|cd){3}',
+    r'(\d{3}-){2}\d{4}',
+    r'(?:abc)+x',
+    r'(ab)+c+',
+])
+def test_safe_patterns_are_accepted(pattern):
+    assert pf._backtracking_risk(pf.sre_parse.parse(pattern)) is None
+    assert pf.RegexSet([pattern]).risky == []
+
+
+@pytest.mark.parametrize("parser", [None, 'broken'])
+def test_unparsable_patterns_are_risky(monkeypatch, parser):
+    class Broken:
+        @staticmethod
+        def parse(pattern):
+            raise AttributeError('internal API changed')
+
+    monkeypatch.setattr(pf, 'sre_parse', Broken if parser else None)
+    with pytest.raises(ValueError, match='تعذر تحليل'):
+        pf.RegexSet([r'^admin'])
+    regex_set = pf.RegexSet([r'^admin', r'(?P<x>a)(?P=x)', r'\d{6,}$'], allow_risky=True)
+    assert len(regex_set.risky) == 3
+    assert [regex_set.search(text) for text in ('admin1', 'xaa', 'pass123456', 'root')] == [True, True, True, False]
+    with pytest.raises(ValueError, match='غير صالح'):
+        pf.RegexSet([r'(unclosed'], allow_risky=True)
+
+
+def test_regex_file_reloaded_between_runs(tmp_path):
+    regex_file = tmp_path / 'exclude.txt'
+    regex_file.write_text('^abc\n')
+    filters = {'regex_file': str(regex_file)}
+    tool = pf.AdvancedPasswordFilter()
+    assert list(tool.iter_filter(['abc1', 'xyz1'], filters)) == ['xyz1']
+    # المحتوى تغير والحجم نفسه
+    regex_file.write_text('^xyz\n')
+    assert list(tool.iter_filter(['abc1', 'xyz1'], filters)) == ['abc1']
+
+
+def test_distinct_counts_raw_bytes(tmp_path):
+    # أسطر لا تختلف إلا في بايتات غير صالحة كـ UTF-8 تبقى مختلفة في التقدير
+    path = tmp_path / 'invalid.txt'
+    path.write_bytes(b''.join(b'pass\xff' + bytes([i]) + b'word\n' for i in range(0x80, 0xc0)))
+    stats = pf.AdvancedPasswordFilter().analyze_file(str(path))
+    assert stats['distinct'].estimate() > 60
+
+
+def test_sample_decodes_like_full_analysis(tmp_path):
+    # العينة والتحليل الكامل يفكان الأسطر غير UTF-8 بالطريقة نفسها
+    path = tmp_path / 'latin1.txt'
+    path.write_bytes(b'caf\xe9123\n' * 200)
+    tool = pf.AdvancedPasswordFilter()
+    full = tool.analyze_file(str(path))
+    sample = tool.analyze_file(str(path), sample=50, seed=1)
+    assert set(full['length_dist']) == set(sample['length_dist']) == {7}
+    assert set(full['composition']) == set(sample['composition'])
+
+
+def test_incremental_analysis_after_append(tmp_path):
+    import hashlib
+    import json
+
+    path = tmp_path / 'growing.txt'
+    path.write_bytes(b'123456\npassword\nS3cure!pass\n')
+    tool = pf.AdvancedPasswordFilter()
+    tool.analyze_file(str(path), incremental=True)
+    with open(path, 'ab') as f:
+        f.write(b'qwerty\ncaf\xe9\nlast')
+    stats = tool.analyze_file(str(path), incremental=True)
+    full = tool.analyze_file(str(path))
+    for key in ('total', 'length_dist', 'composition', 'common_count', 'strength'):
+        assert stats[key] == full[key]
+    sidecar = json.loads((tmp_path / ('growing.txt' + pf.ANALYSIS_SIDECAR_SUFFIX)).read_text())
+    data = path.read_bytes()
+    assert sidecar['offset'] == data.rfind(b'\n') + 1
+    assert sidecar['prefix_sha256'] == hashlib.sha256(data[:sidecar['offset']]).hexdigest()
+
+
+FILTERS = {'min_length': 6, 'max_length': 14, 'require_digit': True, 'exclude_common': True}
+
+
+def _wordlist(count=12000, seed=7):
+    """قائمة أغلبها ASCII (لتُستخدم النواة) مع CRLF ومسافات وأسطر UTF-8 وبايتات غير صالحة"""
+    import random
+
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        word = ''.join(rng.choice('abcxyzABC0123!_') for _ in range(rng.randint(1, 16))).encode('ascii')
+        kind = rng.random()
+        if kind < 0.08:
+            word = word + b'\r'
+        elif kind < 0.14:
+            word = b' ' + word + b'\t'
+        elif kind < 0.20:
+            word = word + 'ü'.encode('utf-8')
+        elif kind < 0.26:
+            word = word + b'\xe9\xff'
+        elif kind < 0.28:
+            word = b'password1'
+        lines.append(word)
+    # بلا سطر جديد في النهاية
+    return b'\n'.join(lines)
+
+
+def _expected_output(tool, data, filters):
+    """ناتج التصفية سطراً سطراً: البايتات الأصلية (بعد strip) لكل كلمة مقبولة"""
+    kept = []
+    for line in data.split(b'\n'):
+        password, _ = pf._decode_line(line)
+        if tool._rejecting_filter(password, filters) is None:
+            kept.append(line.strip() + b'\n')
+    return b''.join(kept)
+
+
+def test_filter_output_is_byte_exact(tmp_path, monkeypatch):
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    tool = pf.AdvancedPasswordFilter()
+    data = _wordlist()
+    source, output = tmp_path / 'in.txt', tmp_path / 'out.txt'
+    source.write_bytes(data)
+    stats = tool.filter_large_file(str(source), str(output), FILTERS)
+    assert output.read_bytes() == _expected_output(tool, data, FILTERS)
+    assert stats['encodings']['non_utf8'] == stats['decode_fallbacks'] > 0
+    assert sum(stats['encodings'].values()) == stats['total_passwords'] == data.count(b'\n') + 1
+
+
+
+@pytest.mark.parametrize("filters", [FILTERS, {'min_length': 4, 'require_upper': True, 'min_strength': 30}])
+def test_kernel_matches_line_path(monkeypatch, filters):
+    if pf._load_numpy() is None:
+        pytest.skip("NumPy غير متوفر")
+    tool = pf.AdvancedPasswordFilter()
+    data = _wordlist()
+    block = data + b'\n'
+    assert len(block) >= pf.KERNEL_MIN_BLOCK
+    assert pf._filter_block_vectorized(tool, block, filters) is not None
+    kernel = pf._filter_block(tool, block, filters)
+    monkeypatch.setattr(pf, 'KERNEL_MIN_BLOCK', float('inf'))
+    lines = pf._filter_block(tool, block, filters)
+    assert kernel[:2] == lines[:2]
+    assert dict(kernel[2]) == dict(lines[2])
+    assert kernel[3] == lines[3]
+    assert b''.join(password + b'\n' for password in kernel[0]) == _expected_output(tool, data, filters)
+
+
+@pytest.mark.parametrize("filters", [FILTERS, dict(FILTERS, keep_unique=True)])
+def test_resume_after_interrupted_run(tmp_path, monkeypatch, filters):
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    tool = pf.AdvancedPasswordFilter()
+    source = tmp_path / 'in.txt'
+    source.write_bytes(_wordlist())
+    reference = tmp_path / 'reference.txt'
+    tool.filter_large_file(str(source), str(reference), filters)
+
+    # انقطاع بعد نقطتي استئناف، مع أسطر كُتبت بعد آخر نقطة
+    output = tmp_path / 'out.txt'
+    _interrupt_after(monkeypatch, tool, 2)
+    with pytest.raises(KeyboardInterrupt):
+        tool.filter_large_file(str(source), str(output), filters, checkpoint_interval=1e-9)
+    assert (tmp_path / ('out.txt' + pf.CHECKPOINT_SUFFIX)).exists()
+    monkeypatch.undo()
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    with open(output, 'ab') as f:
+        f.write(b'partial\nwrite')
+
+    stats = tool.filter_large_file(str(source), str(output), filters, resume=True)
+    assert output.read_bytes() == reference.read_bytes()
+    assert stats['filtered_passwords'] == reference.read_bytes().count(b'\n')
+    assert not (tmp_path / ('out.txt' + pf.CHECKPOINT_SUFFIX)).exists()
+
+
+def _interrupt_after(monkeypatch, tool, saves):
+    """إيقاف التصفية باستثناء بعد عدد من نقاط الاستئناف المحفوظة"""
+    checkpointer = tool._checkpointer
+
+    def interrupted(*args):
+        save = checkpointer(*args)
+        calls = []
+
+        def wrapper(offset):
+            save(offset)
+            calls.append(offset)
+            if len(calls) == saves:
+                raise KeyboardInterrupt
+        return wrapper
+
+    monkeypatch.setattr(tool, '_checkpointer', interrupted)
+
+
+def test_resume_rejects_changed_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    tool = pf.AdvancedPasswordFilter()
+    source, output = tmp_path / 'in.txt', tmp_path / 'out.txt'
+    source.write_bytes(_wordlist())
+    _interrupt_after(monkeypatch, tool, 2)
+    with pytest.raises(KeyboardInterrupt):
+        tool.filter_large_file(str(source), str(output), FILTERS, checkpoint_interval=1e-9)
+    with open(source, 'ab') as f:
+        f.write(b'\nappended1')
+    with pytest.raises(ValueError):
+        tool.filter_large_file(str(source), str(output), FILTERS, resume=True)
+
+
+def test_resume_rejects_torn_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    tool = pf.AdvancedPasswordFilter()
+    source, output = tmp_path / 'in.txt', tmp_path / 'out.txt'
+    source.write_bytes(_wordlist())
+    reference = tmp_path / 'reference.txt'
+    tool.filter_large_file(str(source), str(reference), FILTERS)
+    _interrupt_after(monkeypatch, tool, 2)
+    with pytest.raises(KeyboardInterrupt):
+        tool.filter_large_file(str(source), str(output), FILTERS, checkpoint_interval=1e-9)
+    checkpoint_file = tmp_path / ('out.txt' + pf.CHECKPOINT_SUFFIX)
+    saved = checkpoint_file.read_bytes()
+
+    checkpoint_file.write_bytes(saved[:len(saved) // 2])
+    with pytest.raises(ValueError):
+        tool.filter_large_file(str(source), str(output), FILTERS, resume=True)
+
+    # ملف مؤقت ممزق من حفظ لم يكتمل لا يؤثر: تُستخدم آخر نقطة مكتملة
+    checkpoint_file.write_bytes(saved)
+    (tmp_path / ('out.txt' + pf.CHECKPOINT_SUFFIX + '.tmp')).write_bytes(saved[:len(saved) // 2])
+    tool.filter_large_file(str(source), str(output), FILTERS, resume=True)
+    assert output.read_bytes() == reference.read_bytes()
+
+
+def test_filter_cache_hit_matches_miss(tmp_path, monkeypatch):
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    source = tmp_path / 'in.txt'
+    source.write_bytes(_wordlist())
+    plain = tmp_path / 'plain.txt'
+    pf.AdvancedPasswordFilter().filter_large_file(str(source), str(plain), FILTERS)
+
+    tool = pf.AdvancedPasswordFilter(cache_dir=str(tmp_path / 'cache'))
+    outputs = []
+    for run in ('miss', 'hit'):
+        output = tmp_path / f'{run}.txt'
+        stats = tool.filter_large_file(str(source), str(output), FILTERS)
+        outputs.append((output.read_bytes(), stats))
+    (missed, miss_stats), (hit, hit_stats) = outputs
+    assert miss_stats['cache_hits'] == 0 and miss_stats['cache_misses'] > 1
+    assert hit_stats['cache_misses'] == 0 and hit_stats['cache_hits'] == miss_stats['cache_misses']
+    assert missed == hit == plain.read_bytes()
+    for key in ('total_passwords', 'filtered_passwords', 'encodings', 'rejected_by'):
+        assert miss_stats[key] == hit_stats[key]
+
+
+def test_filter_cache_invalidated_by_policy_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    source = tmp_path / 'in.txt'
+    source.write_bytes(_wordlist())
+    regex_file = tmp_path / 'exclude.txt'
+    regex_file.write_text('^abc\n')
+    tool = pf.AdvancedPasswordFilter(cache_dir=str(tmp_path / 'cache'))
+
+    def run(filters):
+        output = tmp_path / 'out.txt'
+        stats = tool.filter_large_file(str(source), str(output), filters)
+        expected = tmp_path / 'expected.txt'
+        pf.AdvancedPasswordFilter().filter_large_file(str(source), str(expected), filters)
+        assert output.read_bytes() == expected.read_bytes()
+        return stats
+
+    filters = dict(FILTERS, regex_file=str(regex_file))
+    first = run(filters)
+    assert run(filters)['cache_misses'] == 0
+    # معيار مختلف، ثم محتوى مختلف لملف التعابير بالمسار نفسه
+    assert run(dict(filters, min_length=8))['cache_hits'] == 0
+    regex_file.write_text('^xyz\n')
+    assert run(filters)['cache_hits'] == 0
+    assert first['cache_misses'] > 1
+
+
+def test_iter_filter_unique_matches_pipeline(tmp_path):
+    # 'café' بترميزين مختلفين: نص واحد بعد الفك لكن بايتات مختلفة في الإدخال
+    data = b'caf\xe9123\ncaf\xc3\xa9123\ncaf\xe9123\r\n  caf\xc3\xa9123\n'
+    filters = {'keep_unique': True}
+    tool = pf.AdvancedPasswordFilter()
+    stats = {}
+    kept = list(tool.iter_filter(data.splitlines(), filters, stats))
+    assert kept == ['café123', 'café123']
+    assert stats['rejected_by']['keep_unique'] == 2
+
+    source, output = tmp_path / 'in.txt', tmp_path / 'out.txt'
+    source.write_bytes(data)
+    tool.filter_large_file(str(source), str(output), filters)
+    assert output.read_bytes() == b'caf\xe9123\ncaf\xc3\xa9123\n'
+
+
+def test_prometheus_counters_use_total_suffix():
+    text = pf._prometheus_text({'operation': 'x', 'elapsed_seconds': 1.5, 'lines_processed': 10,
+                                'lines_per_second': 6.7, 'bytes_processed': 80, 'filtered_passwords': 4,
+                                'decode_fallbacks': 1, 'rejected_by': {'min_length': 6}})
+    types = dict(line.split()[2:4] for line in text.splitlines() if line.startswith('# TYPE'))
+    for name, metric_type in types.items():
+        assert name.endswith('_total') == (metric_type == 'counter')
+    assert 'password_filter_lines_processed_total{operation="x"} 10' in text
+    assert types['password_filter_elapsed_seconds'] == 'gauge'
+
+
+def _policies(tmp_path):
+    regex_file = tmp_path / 'exclude.txt'
+    regex_file.write_text('^abc\n[xyz]{3}\n')
+    return {
+        'strict': {'filters': dict(FILTERS, require_upper=True, min_strength=40)},
+        'unique': {'filters': {'min_length': 4, 'exclude_weak_patterns': True, 'keep_unique': True}},
+        'regex': {'filters': {'regex_file': str(regex_file), 'custom_regex': '!$', 'require_special': True}},
+        'all': {'filters': {}},
+    }
+
+
+def test_multi_policy_matches_separate_runs(tmp_path):
+    source = tmp_path / 'in.txt'
+    source.write_bytes(_wordlist() + b'\nABCdef12!\nABCdef12!\n')
+    policies = _policies(tmp_path)
+    for name, policy in policies.items():
+        policy['output'] = str(tmp_path / f'multi_{name}.txt')
+    tool = pf.AdvancedPasswordFilter()
+    results = tool.filter_multi_policy(str(source), policies)
+    for name, policy in policies.items():
+        separate = tmp_path / f'single_{name}.txt'
+        stats = tool.filter_large_file(str(source), str(separate), policy['filters'])
+        assert (tmp_path / f'multi_{name}.txt').read_bytes() == separate.read_bytes()
+        for key in ('total_passwords', 'filtered_passwords', 'rejected_by', 'encodings'):
+            assert results[name][key] == stats[key]
+
+
+def test_cli_filters_apply_to_each_policy(tmp_path, monkeypatch):
+    import json
+
+    source = tmp_path / 'in.txt'
+    source.write_bytes(b'short\nlongenough1\nLongEnough1\n')
+    policies = tmp_path / 'policies.json'
+    policies.write_text(json.dumps({'upper': {'filters': {'require_upper': True}},
+                                    'short': {'filters': {'min_length': 1}}}))
+    output = tmp_path / 'out'
+    monkeypatch.setattr('sys.argv', ['password_filter.py', str(source), '-o', str(output),
+                                     '--min_length', '8', '--policies', str(policies)])
+    pf.main()
+    assert (tmp_path / 'out_upper.txt').read_bytes() == b'LongEnough1\n'
+    # معيار السياسة نفسها يتقدم على سطر الأوامر
+    assert (tmp_path / 'out_short.txt').read_bytes() == b'short\nlongenough1\nLongEnough1\n'
+
+
+def test_startup_cache_rebuilds_stale_or_corrupt_entries(startup_cache):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {'value': len(builds)}
+
+    assert pf._cached_build('probe', 'key', build) == {'value': 1}
+    assert pf._cached_build('probe', 'key', build) == {'value': 1}
+    assert len(builds) == 1
+    (path,) = startup_cache.iterdir()
+    data = path.read_bytes()
+    for damaged in (data[:-3], data[:-1] + bytes([data[-1] ^ 1]), b'PWFBLD01' + data[8:], b''):
+        path.write_bytes(damaged)
+        assert pf._cached_build('probe', 'key', build) == {'value': len(builds)}
+    assert len(builds) == 5
+
+
+def _split_parts(tmp_path, data, monkeypatch=None, **kwargs):
+    """تقسيم data وإرجاع محتوى الأجزاء بالترتيب"""
+    source = tmp_path / 'split-in.txt'
+    source.write_bytes(data)
+    prefix = tmp_path / 'part'
+    for old in tmp_path.glob('part_*'):
+        old.unlink()
+    count = pf.AdvancedPasswordFilter().split_large_file(str(source), str(prefix), **kwargs)
+    parts = [(tmp_path / f'part_{i}.txt').read_bytes() for i in range(1, count + 1)]
+    assert not (tmp_path / f'part_{count + 1}.txt').exists()
+    return parts
+
+
+SPLIT_INPUTS = [
+    b''.join(b'line%d-%s\n' % (i, b'x' * (i % 13)) for i in range(500)),
+    b'a\nbb\nccc\nlast-without-newline',
+    b'\n\n\nx\n\n',
+    b'only',
+]
+
+
+@pytest.mark.parametrize("data", SPLIT_INPUTS)
+@pytest.mark.parametrize("chunk_bytes", [1, 7, 64, 10 ** 6])
+def test_split_bytes_cuts_on_line_boundaries(tmp_path, data, chunk_bytes):
+    parts = _split_parts(tmp_path, data, chunk_bytes=chunk_bytes)
+    assert b''.join(parts) == data
+    assert all(part.endswith(b'\n') for part in parts[:-1])
+    assert all(parts)
+    # كل جزء يبلغ chunk_bytes على الأقل ثم يكمل سطره، إلا الأخير
+    assert all(len(part) >= chunk_bytes and b'\n' not in part[chunk_bytes - 1:-1] for part in parts[:-1])
+
+
+@pytest.mark.parametrize("data", SPLIT_INPUTS)
+@pytest.mark.parametrize("chunk_size", [1, 3, 50, 10 ** 6])
+@pytest.mark.parametrize("parallel", [False, True])
+def test_split_lines_counts_lines(tmp_path, monkeypatch, data, chunk_size, parallel):
+    if parallel:
+        # مسح متوازٍ بكتل صغيرة حتى تقع الحدود داخل الأسطر وبين العمليات
+        monkeypatch.setattr(pf, 'SPLIT_PARALLEL_MIN_SIZE', 0)
+        monkeypatch.setattr(pf, 'SPLIT_SCAN_BLOCK', 5)
+    parts = _split_parts(tmp_path, data, chunk_size=chunk_size, workers=3 if parallel else 1)
+    assert b''.join(parts) == data
+    lines = data.splitlines(keepends=True)
+    expected = [b''.join(lines[i:i + chunk_size]) for i in range(0, len(lines), chunk_size)]
+    assert parts == expected
+
+
+def test_split_empty_file(tmp_path):
+    assert _split_parts(tmp_path, b'', chunk_bytes=10) == []
+    assert _split_parts(tmp_path, b'', chunk_size=10) == []
+
+
+@pytest.mark.parametrize("available", [('copy_file_range', 'sendfile'), ('sendfile',), ()])
+def test_copy_range_fallbacks(tmp_path, monkeypatch, available):
+    for name in ('copy_file_range', 'sendfile'):
+        if name not in available:
+            monkeypatch.delattr(pf.os, name, raising=False)
+    monkeypatch.setattr(pf, 'SPLIT_SCAN_BLOCK', 7)
+    data = bytes(range(256)) * 10
+    source, target = tmp_path / 'src.bin', tmp_path / 'dst.bin'
+    source.write_bytes(data)
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        pf._copy_range(src.fileno(), dst.fileno(), 100, 1500)
+    assert target.read_bytes() == data[100:1600]
+
+
+def _index_file(tmp_path, data):
+    source = tmp_path / 'indexed.txt'
+    source.write_bytes(data)
+    pf.LineIndex.build(str(source)).close()
+    return source
+
+
+def test_line_index_long_lines(tmp_path):
+    import mmap
+
+    lengths = [0, 1, 254, 255, 256, 300, 1000, 7]
+    lines = [b'p' * n for n in lengths]
+    data = b'\n'.join(lines[:4]) + b'\r\n' + b'\n'.join(lines[4:])
+    source = _index_file(tmp_path, data)
+    with pf.LineIndex.load(str(source)) as index, open(source, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            assert len(index) == len(lengths)
+            # الأطوال المخزنة تتشبع عند MAX_LENGTH، والحدود والقراءة تبقى دقيقة
+            assert [index.length(i) for i in range(len(index))] == [min(n, 255) for n in lengths]
+            assert [index.read_line(mm, i) for i in range(len(index))] == lines
+            assert b''.join(mm[slice(*index.line_range(i))] for i in range(len(index))) == data
+
+            def select(low, high):
+                return [lengths[i] for i in index.select_by_length(low, high, mm)]
+
+            assert list(index.select_by_length(1)) == [1, 2, 3, 4, 5, 6, 7]
+            assert list(index.select_by_length(2, 254)) == [2, 7]
+            assert select(255, 299) == [255, 256]
+            assert select(256, None) == [256, 300, 1000]
+            assert select(300, 1000) == [300, 1000]
+            assert select(0, 255) == [0, 1, 254, 255, 7]
+            with pytest.raises(ValueError):
+                index.select_by_length(10, 300)
+            with pytest.raises(ValueError):
+                index.select_by_length(400)
+        finally:
+            mm.close()
+
+
+def test_line_index_stale_after_change(tmp_path):
+    import os
+
+    data = b'alpha\nbeta\ngamma\n'
+    source = _index_file(tmp_path, data)
+    index = pf.LineIndex.load(str(source))
+    assert index is not None and index.line_cuts(1) == [6, 11]
+    index.close()
+    # محتوى مختلف بالحجم نفسه: يكفي تغير وقت التعديل
+    source.write_bytes(data.upper())
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert pf.LineIndex.load(str(source)) is None
+    source.write_bytes(data + b'delta\n')
+    assert pf.LineIndex.load(str(source)) is None
+    # فهرس تالف يُهمل بدل أن يُقرأ
+    pf.LineIndex.build(str(source)).close()
+    index_file = tmp_path / ('indexed.txt' + pf.LINE_INDEX_SUFFIX)
+    index_file.write_bytes(b'NOTINDEX' + index_file.read_bytes()[8:])
+    assert pf.LineIndex.load(str(source)) is None
+
+
+def test_line_index_split_matches_scan(tmp_path):
+    data = b''.join(b'w%d\n' % i for i in range(103))
+    _index_file(tmp_path, data)
+    source = tmp_path / 'indexed.txt'
+    prefix = tmp_path / 'part'
+    count = pf.AdvancedPasswordFilter().split_large_file(str(source), str(prefix), chunk_size=10)
+    lines = data.splitlines(keepends=True)
+    assert [(tmp_path / f'part_{i}.txt').read_bytes() for i in range(1, count + 1)] == \
+        [b''.join(lines[i:i + 10]) for i in range(0, len(lines), 10)]
+
+
+def _store(tmp_path, words, name='common'):
+    source = tmp_path / f'{name}.txt'
+    source.write_text(''.join(word + '\n' for word in words), encoding='utf-8')
+    return pf.CommonPasswordStore.build(str(source), str(tmp_path / f'{name}.pwset'))
+
+
+def test_common_store_round_trip(tmp_path):
+    import pickle
+
+    words = [f'Word{i}' for i in range(500)] + ['كلمةسر', 'pässwörd', 'word7']
+    store = _store(tmp_path, words)
+    # الكلمات تُخزن بأحرف صغيرة والمكررة تُحسب مرة واحدة
+    assert len(store) == 502 and store.slots >= 2 * len(store)
+    assert all(word.lower() in store for word in words)
+    assert not any(f'other{i}' in store for i in range(500))
+    copy = pickle.loads(pickle.dumps(store))
+    assert all(word.lower() in copy for word in words) and 'other1' not in copy
+    tool = pf.AdvancedPasswordFilter(common_store=store.store_file)
+    assert tool.is_common('WORD42') and not tool.is_common('other42')
+    copy.close()
+    store.close()
+
+
+def test_common_store_fingerprint_collisions(tmp_path, monkeypatch):
+    words = [f'w{i}' for i in range(10)]
+    # البناء يعدّ سطراً إضافياً بعد آخر فاصل عند تحديد حجم الجدول
+    slots = max(16, int((len(words) + 1) / pf.CommonPasswordStore.LOAD_FACTOR) + 1)
+    # كل البصمات تقع في الخانة نفسها فتُحل بالسبر الخطي مع الالتفاف حول نهاية الجدول
+    values = {word: (slots - 2) + slots * (i + 1) for i, word in enumerate(words)}
+    monkeypatch.setattr(pf.CommonPasswordStore, '_hash', staticmethod(lambda p: values.get(p, 1 + slots)))
+    store = _store(tmp_path, words)
+    assert store.slots == slots and len(store) == len(words)
+    assert all(word in store for word in words) and 'missing' not in store
+    store.close()
+    # بصمتان متطابقتان لكلمتين مختلفتين تُعاملان ككلمة واحدة (الثمن المعروف لبصمة 64 بت)
+    values['twin'] = values['w3']
+    store = _store(tmp_path, words + ['twin'], name='twins')
+    assert len(store) == len(words) and 'twin' in store
+    store.close()
+
+
+def test_common_store_full_table_terminates(tmp_path):
+    import struct
+
+    values = [pf.CommonPasswordStore._hash(f'w{i}') for i in range(16)]
+    store_file = tmp_path / 'full.pwset'
+    store_file.write_bytes(pf.CommonPasswordStore.HEADER.pack(pf.CommonPasswordStore.MAGIC, 16, 16)
+                           + struct.pack('<16Q', *values))
+    store = pf.CommonPasswordStore(str(store_file))
+    assert 'absent' not in store
+    store.close()
+
+
+def test_common_store_rejects_bad_files(tmp_path):
+    store = _store(tmp_path, ['alpha', 'beta'])
+    data = (tmp_path / 'common.pwset').read_bytes()
+    store.close()
+    header = pf.CommonPasswordStore.HEADER
+    _, slots, count = header.unpack_from(data)
+    bad = {
+        'magic': b'PWCSET99' + data[8:],
+        'short': data[:10],
+        'truncated': data[:-8],
+        'slots': header.pack(pf.CommonPasswordStore.MAGIC, slots + 1, count) + data[header.size:],
+        'count': header.pack(pf.CommonPasswordStore.MAGIC, slots, slots + 1) + data[header.size:],
+    }
+    for name, content in bad.items():
+        path = tmp_path / f'{name}.pwset'
+        path.write_bytes(content)
+        with pytest.raises(ValueError):
+            pf.CommonPasswordStore(str(path))
+
+
+def _decompressed(path, compression):
+    with pf._compression_module(compression).open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('compression', ['gz', 'xz', 'bz2'])
+def test_compressed_input_matches_plain(tmp_path, monkeypatch, compression):
+    import password_generator
+
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 64 * 1024)
+    words = _wordlist(count=8000).decode('utf-8', errors='ignore').split('\n')
+    plain = tmp_path / 'words.txt'
+    packed = tmp_path / f'words.txt.{compression}'
+    password_generator.save_wordlist(words, str(plain))
+    password_generator.save_wordlist(words, str(packed))
+    assert pf.detect_compression(str(packed)) == compression
+    assert _decompressed(packed, compression) == plain.read_bytes()
+
+    tool = pf.AdvancedPasswordFilter()
+    tool.filter_large_file(str(plain), str(tmp_path / 'plain.out'), FILTERS, checkpoint_interval=0)
+    expected = (tmp_path / 'plain.out').read_bytes()
+    assert expected
+    for workers in (1, 2):
+        out = tmp_path / f'from-{compression}-{workers}.out'
+        tool.filter_large_file(str(packed), str(out), FILTERS, workers=workers, checkpoint_interval=0)
+        assert out.read_bytes() == expected
+    # إخراج مضغوط يُفك إلى البايتات نفسها
+    out = tmp_path / f'packed.out.{compression}'
+    tool.filter_large_file(str(packed), str(out), FILTERS, checkpoint_interval=0)
+    assert pf.detect_compression(str(out)) == compression
+    assert _decompressed(out, compression) == expected
+
+
+def _sorted_expected(data, order, unique=False):
+    import collections
+
+    lines = [line.rstrip(b'\r') for line in data.split(b'\n')]
+    if order == 'frequency':
+        counts = collections.Counter(lines)
+        return sorted(counts, key=lambda line: (-counts[line], line))
+    if unique:
+        lines = set(lines)
+    return sorted(lines, key=(lambda line: (len(line), line)) if order == 'length' else None)
+
+
+@pytest.mark.parametrize('order, unique', [('lex', False), ('lex', True), ('length', False),
+                                           ('length', True), ('frequency', False)])
+@pytest.mark.parametrize('compression', [None, 'gz'])
+def test_sort_matches_sorted(tmp_path, monkeypatch, order, unique, compression):
+    import os
+
+    # مقاطع صغيرة جداً ودمج متعدد المراحل حتى تُختبر مسارات الدمج كلها
+    monkeypatch.setattr(pf, 'SPLIT_SCAN_BLOCK', 2048)
+    monkeypatch.setattr(pf, 'SORT_MAX_FANIN', 4)
+    data = _wordlist(count=3000)
+    source = tmp_path / 'words.txt'
+    if compression:
+        source = tmp_path / 'words.txt.gz'
+        with pf._compression_module(compression).open(source, 'wb') as f:
+            f.write(data)
+    else:
+        source.write_bytes(data)
+    out = tmp_path / 'sorted.txt'
+    stats = pf.AdvancedPasswordFilter().sort_large_file(str(source), str(out), order=order, unique=unique,
+                                                        memory_mb=0, workers=2, tmp_dir=str(tmp_path))
+    assert stats['runs'] > pf.SORT_MAX_FANIN
+    expected = _sorted_expected(data, order, unique)
+    assert out.read_bytes().split(b'\n')[:-1] == expected
+    assert stats['total_lines'] == data.count(b'\n') + 1 and stats['output_lines'] == len(expected)
+    assert [name for name in os.listdir(tmp_path) if name.startswith('pwsort_')] == []
+
+
+def _skewed_corpus(seed=11):
+    """مدونة منحرفة: عشرون كلمة بتكرارات متباعدة، ثم ذيل متوسط، ثم كلمات مفردة"""
+    import random
+
+    rng = random.Random(seed)
+    words = []
+    for i in range(20):
+        words += [f'top{i}'.encode()] * (1000 - 40 * i)
+    for i in range(300):
+        words += [f'mid{i}'.encode()] * rng.randint(2, 8)
+    words += [f'rare{i}'.encode() for i in range(8000)]
+    rng.shuffle(words)
+    return words
+
+
+@pytest.mark.parametrize('memory_mb', [0, 4])
+def test_top_frequencies_match_counter(tmp_path, memory_mb):
+    import collections
+
+    words = _skewed_corpus()
+    source = tmp_path / 'words.txt'
+    source.write_bytes(b'\n'.join(words) + b'\n')
+    counts = collections.Counter(words)
+    result = pf.AdvancedPasswordFilter().top_frequencies(str(source), top_n=20, memory_mb=memory_mb)
+    assert result['total'] == len(words)
+    assert [entry['password'].encode() for entry in result['top']] == [word for word, _ in counts.most_common(20)]
+    for entry in result['top']:
+        true = counts[entry['password'].encode()]
+        assert entry['lower_bound'] <= true <= entry['estimate'] <= true + result['error_bound']
+
+
+def test_count_min_sketch_never_undercounts():
+    import collections
+    import random
+
+    rng = random.Random(3)
+    # جدول ضيق عمداً حتى تكثر التصادمات
+    sketch, other = pf.CountMinSketch(64, depth=3), pf.CountMinSketch(64, depth=3)
+    counts = collections.Counter()
+    for target in (sketch, other):
+        part = collections.Counter()
+        for _ in range(5000):
+            key = b'k%d' % int(rng.paretovariate(1.2))
+            count = rng.randint(1, 3)
+            part[key] += count
+            assert target.add(key, count) >= part[key]
+        counts += part
+    sketch.merge(other)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+    with pytest.raises(ValueError):
+        sketch.merge(pf.CountMinSketch(128, depth=3))
+
+
+def _set_inputs(tmp_path, sort=False):
+    """قائمتان متداخلتان مع تكرار في كلتيهما وCRLF ودون سطر جديد في نهاية B"""
+    import random
+
+    rng = random.Random(5)
+    a = [b'w%d' % rng.randrange(3000) for _ in range(4000)]
+    b = [b'w%d' % rng.randrange(1500, 4500) for _ in range(4000)]
+    if sort:
+        a.sort()
+        b.sort()
+    file_a, file_b = tmp_path / 'a.txt', tmp_path / 'b.txt'
+    file_a.write_bytes(b''.join(line + (b'\r\n' if i % 7 == 0 else b'\n') for i, line in enumerate(a)))
+    file_b.write_bytes(b'\n'.join(b))
+    return str(file_a), str(file_b), set(a), set(b)
+
+
+@pytest.mark.parametrize('operation', ['diff', 'intersect', 'union'])
+@pytest.mark.parametrize('memory_mb, workers', [(512, 1), (0, 3)])
+def test_set_operation_matches_python_sets(tmp_path, operation, memory_mb, workers):
+    file_a, file_b, a, b = _set_inputs(tmp_path)
+    expected = {'diff': a - b, 'intersect': a & b, 'union': a | b}[operation]
+    out = tmp_path / 'out.txt'
+    stats = pf.AdvancedPasswordFilter().set_operation(operation, file_a, file_b, str(out), memory_mb=memory_mb,
+                                                      workers=workers, tmp_dir=str(tmp_path))
+    lines = out.read_bytes().split(b'\n')[:-1]
+    # بلا تكرار رغم تكرار الكلمات في القائمتين وتوزعها على أقسام عدة
+    assert len(lines) == len(set(lines)) == stats['output_lines']
+    assert set(lines) == expected
+    assert stats['partitions'] == (1 if workers == 1 else pf.SET_MAX_PARTITIONS)
+    assert (stats['lines_a'], stats['lines_b']) == (4000, 4000)
+
+
+@pytest.mark.parametrize('operation', ['diff', 'intersect', 'union'])
+def test_sorted_set_operation_matches_python_sets(tmp_path, operation):
+    file_a, file_b, a, b = _set_inputs(tmp_path, sort=True)
+    expected = {'diff': a - b, 'intersect': a & b, 'union': a | b}[operation]
+    out = tmp_path / 'out.txt'
+    pf.AdvancedPasswordFilter().set_operation(operation, file_a, file_b, str(out), sorted_inputs=True)
+    assert out.read_bytes().split(b'\n')[:-1] == sorted(expected)
+
+
+@pytest.mark.parametrize('filters', [FILTERS, dict(FILTERS, keep_unique=True)])
+def test_workers_output_matches_single_worker(tmp_path, monkeypatch, filters):
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 16 * 1024)
+    tool = pf.AdvancedPasswordFilter()
+    source = tmp_path / 'in.txt'
+    source.write_bytes(_wordlist(count=30000))
+    outputs = {}
+    for workers in (1, 2, 3):
+        out = tmp_path / f'out-{workers}.txt'
+        stats = tool.filter_large_file(str(source), str(out), filters, workers=workers, checkpoint_interval=0)
+        outputs[workers] = (out.read_bytes(), stats['filtered_passwords'], dict(stats['rejected_by']))
+    assert outputs[1][0] and outputs[2] == outputs[1] and outputs[3] == outputs[1]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_worker_failure_releases_resources(tmp_path, monkeypatch, workers):
+    import concurrent.futures
+    import mmap
+    import threading
+
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 16 * 1024)
+    maps, shutdowns = [], []
+
+    class TrackedMap(mmap.mmap):
+        def __init__(self, *args, **kwargs):
+            maps.append(self)
+
+    def tracked(executor_class):
+        class Tracked(executor_class):
+            def shutdown(self, *args, **kwargs):
+                shutdowns.append(kwargs.get('cancel_futures'))
+                super().shutdown(*args, **kwargs)
+        return Tracked
+
+    monkeypatch.setattr(mmap, 'mmap', TrackedMap)
+    for name in ('ThreadPoolExecutor', 'ProcessPoolExecutor'):
+        monkeypatch.setattr(concurrent.futures, name, tracked(getattr(concurrent.futures, name)))
+    filter_block = pf._filter_block
+
+    def failing(tool, block, filters, *args, **kwargs):
+        # العمليات العاملة المتفرعة ترث هذا الاستبدال أيضاً
+        if b'boom' in block:
+            raise RuntimeError('boom')
+        return filter_block(tool, block, filters, *args, **kwargs)
+
+    monkeypatch.setattr(pf, '_filter_block', failing)
+    source = tmp_path / 'in.txt'
+    data = _wordlist(count=30000)
+    source.write_bytes(data[:len(data) // 3] + b'\nboom\n' + data[len(data) // 3:])
+    threads = threading.active_count()
+    with pytest.raises(RuntimeError, match='boom'):
+        pf.AdvancedPasswordFilter().filter_large_file(str(source), str(tmp_path / 'out.txt'), FILTERS,
+                                                      workers=workers, checkpoint_interval=0)
+    assert len(maps) == 1 and maps[0].closed
+    assert shutdowns == [True]
+    assert threading.active_count() == threads
+
+
+WEAK_DICTIONARY = ['password', 'pass', 'sword', 'word', 'asdf', 'sdfg', 'qwer', 'ertyu', 'aaa', 'Admin', 'min', 'zz']
+
+
+def _weak_candidates(seed=13, count=4000):
+    """كلمات مبنية من قطع الأنماط المتداخلة مع ضجيج وأحرف كبيرة"""
+    import random
+
+    rng = random.Random(seed)
+    pieces = WEAK_DICTIONARY + ['qwertyuiop', 'asdfghjkl', '1qaz2wsx', '123qwe', '1234567', '9876543', 'xy', 'Q']
+    words = []
+    for _ in range(count):
+        word = ''
+        for _ in range(rng.randint(2, 5)):
+            piece = rng.choice(pieces)
+            start = rng.randrange(len(piece))
+            word += piece[start:rng.randint(start + 1, len(piece))] + rng.choice(['', '', '7', 'ü', '_'])
+        words.append(''.join(c.upper() if rng.random() < 0.2 else c for c in word))
+    return words
+
+
+def test_pattern_matcher_matches_brute_force():
+    import collections
+
+    patterns = [p.lower() for p in WEAK_DICTIONARY] + ['qwertyuiop', 'ty', 'y', 'uio']
+    matcher = pf.PatternMatcher(patterns)
+    for text in (w.lower() for w in _weak_candidates()):
+        ends = [(end, p) for end in range(1, len(text) + 1) for p in patterns if text[:end].endswith(p)]
+        # كل التطابقات المتداخلة، وأولها انتهاءً في search
+        assert collections.Counter(matcher.find_all(text)) == collections.Counter(p for _, p in ends)
+        if ends:
+            assert text[:ends[0][0]].endswith(matcher.search(text))
+            assert [p for end, p in ends if end == ends[0][0]].count(matcher.search(text)) == 1
+        else:
+            assert matcher.search(text) is None
+
+
+def test_weak_pattern_match_equals_per_pattern_checks(tmp_path):
+    import re
+
+    patterns_file = tmp_path / 'weak.txt'
+    patterns_file.write_text('# قاموس اختبار\n\n' + '\n'.join(WEAK_DICTIONARY) + '\n', encoding='utf-8')
+    tool = pf.AdvancedPasswordFilter(weak_patterns_file=str(patterns_file))
+    weak = tool.weak_patterns
+    assert weak['dictionary_patterns'] == WEAK_DICTIONARY
+
+    def hits(password):
+        # الفحص القديم: نمط بعد نمط على كامل القائمة
+        lower = password.lower()
+        found = {name for name in ('numeric_sequence', 'reverse_numeric', 'repeated_chars', 'short_passwords')
+                 if re.search(weak[name], password)}
+        return found | {p for p in weak['keyboard_patterns'] + weak['dictionary_patterns'] if p.lower() in lower}
+
+    matched = 0
+    for password in _weak_candidates() + ['Tr0ub4dor&3', 'correct-horse', 'QWERTYUIOP!', 'x1234567y', '']:
+        expected = hits(password)
+        match = tool.weak_pattern_match(password)
+        assert (match is None) == (not expected), password
+        assert match is None or match in expected, password
+        assert tool._matches_weak_pattern(password) == bool(expected)
+        matched += bool(expected)
+    assert 0 < matched < 4005
+
+
+def _shard_contents(output, shards):
+    """محتوى كل جزء بعد وصل ملفاته بالترتيب ({prefix}_{الجزء}[_{الملف}].txt)"""
+    import re
+
+    contents = [b''] * shards
+    for path in output.files:
+        shard = int(re.search(r'_(\d+)(?:_\d+)?\.txt$', path).group(1)) - 1
+        with open(path, 'rb') as f:
+            contents[shard] += f.read()
+    return contents
+
+
+@pytest.mark.parametrize('max_bytes', [None, 64])
+def test_round_robin_rotates_per_line(tmp_path, max_bytes):
+    import os
+
+    lines = [b'word%d' % i for i in range(1000)]
+    with pf.ShardedOutput(str(tmp_path / 'part'), 3, 'round_robin', max_bytes) as output:
+        start = 0
+        # دفعات بأحجام مختلفة، منها دفعات أصغر من عدد الأجزاء
+        for size in [1, 2, 5, 3, 100, 7, 1, 881]:
+            output.write_passwords(lines[start:start + size])
+            start += size
+    assert start == len(lines)
+    contents = _shard_contents(output, 3)
+    assert contents == [b''.join(line + b'\n' for line in lines[shard::3]) for shard in range(3)]
+    if max_bytes:
+        assert all(os.path.getsize(path) <= max_bytes for path in output.files)
+
+
+def test_hash_sharding_is_stable(tmp_path, monkeypatch):
+    import zlib
+
+    source = tmp_path / 'in.txt'
+    source.write_bytes(_wordlist(count=20000))
+    tool = pf.AdvancedPasswordFilter()
+    tool.filter_large_file(str(source), str(tmp_path / 'all.txt'), FILTERS, checkpoint_interval=0)
+    expected = (tmp_path / 'all.txt').read_bytes().split(b'\n')[:-1]
+    runs = []
+    # كتل وعمال مختلفون يغيرون الدفعات لا توزيع الأسطر
+    for block_size, workers in ((16 * 1024, 1), (64 * 1024, 2)):
+        monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', block_size)
+        prefix = tmp_path / f'hash-{block_size}'
+        stats = tool.filter_large_file(str(source), str(prefix), FILTERS, workers=workers, shards=4)
+        assert stats['output_files'] == [f'{prefix}_{shard}.txt' for shard in range(1, 5)]
+        runs.append([(tmp_path / f'hash-{block_size}_{shard}.txt').read_bytes() for shard in range(1, 5)])
+    assert runs[0] == runs[1]
+    for shard, content in enumerate(runs[0]):
+        shard_lines = content.split(b'\n')[:-1]
+        assert all(zlib.crc32(line) % 4 == shard for line in shard_lines)
+        # ترتيب الإدخال محفوظ داخل كل جزء
+        assert shard_lines == [line for line in expected if zlib.crc32(line) % 4 == shard]
+
+
+def _char_mask(line):
+    """القناع حرفاً حرفاً كما يعرّفه analyze_masks: فئة كل بايت بعد حذف \\r"""
+    classes = []
+    for byte in line.replace(b'\r', b''):
+        char = chr(byte)
+        if byte >= 128:
+            classes.append('b')
+        elif 'A' <= char <= 'Z':
+            classes.append('u')
+        elif 'a' <= char <= 'z':
+            classes.append('l')
+        elif '0' <= char <= '9':
+            classes.append('d')
+        else:
+            classes.append('s')
+    return ''.join(classes)
+
+
+@pytest.mark.parametrize('compression', [None, 'gz'])
+def test_masks_match_per_character(tmp_path, monkeypatch, compression):
+    import collections
+
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 16 * 1024)
+    data = _wordlist(count=20000) + b'\n\n\tTab Space\x00\x7f\n\xff\xfeZ9\r\n'
+    source = tmp_path / 'in.txt'
+    if compression:
+        source = tmp_path / 'in.txt.gz'
+        with pf._compression_module(compression).open(source, 'wb') as f:
+            f.write(data)
+    else:
+        source.write_bytes(data)
+    masks = collections.Counter(_char_mask(line) for line in data.split(b'\n') if line.replace(b'\r', b''))
+    result = pf.AdvancedPasswordFilter().analyze_masks(str(source), top_k=50)
+    assert result['total'] == sum(masks.values()) and result['error_bound'] == 0
+    assert [(entry['mask'], entry['count']) for entry in result['top']] == \
+        sorted(masks.items(), key=lambda item: (item[1], item[0]), reverse=True)[:50]
+
+
+def test_masks_space_saving_bounds(tmp_path, monkeypatch):
+    import collections
+
+    # سعة صغيرة تجبر الجدول على الإزاحة
+    monkeypatch.setattr(pf, 'MASK_CAPACITY', 64)
+    monkeypatch.setattr(pf, 'PIPELINE_BLOCK_SIZE', 16 * 1024)
+    data = _wordlist(count=20000)
+    source = tmp_path / 'in.txt'
+    source.write_bytes(data)
+    masks = collections.Counter(_char_mask(line) for line in data.split(b'\n') if line.replace(b'\r', b''))
+    assert len(masks) > 64
+    result = pf.AdvancedPasswordFilter().analyze_masks(str(source), top_k=5)
+    assert result['error_bound'] > 0
+    for entry in result['top']:
+        assert masks[entry['mask']] <= entry['count'] <= masks[entry['mask']] + result['error_bound']
+
+
+def _strength_corpus(seed=17, count=6000):
+    """كلمات بكل الفئات: تسلسلات ومسارات لوحة مفاتيح وتكرار وكلمات قاموس بأطراف"""
+    import random
+
+    rng = random.Random(seed)
+    pieces = ['password', 'PassWord', 'qwerty', 'dragon', 'monkey', 'abcdef', 'ZYXW', '0123', '9876',
+              '1qaz2wsx', 'asdf', '!@#$', 'aaaa', '1111', 'Tr0ub4dor', 'x', 'Q', '7', '_', '~`', 'corp']
+    alphabet = 'abcxyzABCXYZ0129!@_-. '
+    words = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            word = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 3)))
+        else:
+            word = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        if rng.random() < 0.3:
+            word = rng.choice(['', '1', '!', '2024', '#1', '..']) + word + rng.choice(['', '1', '!', '99', '$$'])
+        words.append(word)
+    return words + ['', 'a', 'password', 'PASSWORD123!', '!!password!!', 'corp2024', 'aaaaaaaa', 'qwertyuiop']
+
+
+def test_batched_strength_matches_password_strength(tmp_path):
+    if pf._load_numpy() is None:
+        pytest.skip("NumPy غير متوفر")
+    patterns_file = tmp_path / 'weak.txt'
+    patterns_file.write_text('corp\ndragon\n', encoding='utf-8')
+    tool = pf.AdvancedPasswordFilter(weak_patterns_file=str(patterns_file))
+    words = _strength_corpus()
+    block = '\n'.join(words).encode('ascii')
+    starts, ends, lengths, masks = pf._class_kernel(block)[:4]
+    strengths, predictable = pf._strength_kernel(block, starts, lengths, masks)
+    passwords = [block[start:end].decode('ascii') for start, end in zip(starts.tolist(), ends.tolist())]
+    hits, dictionary = tool._dictionary_strengths(passwords, starts, pf.np.array(pf.STRENGTH_BITS)[masks],
+                                                  predictable)
+    assert len(hits) > 100
+    batched = strengths.astype(float)
+    batched[hits] = pf.np.minimum(batched[hits], dictionary)
+    expected = [tool.password_strength(password) for password in passwords]
+    assert passwords == words
+    assert batched.tolist() == pytest.approx(expected, abs=1e-9)
+
+
+@pytest.mark.parametrize('min_strength', [10, 25, 40, 60])
+def test_kernel_strength_filter_matches_line_path(tmp_path, monkeypatch, min_strength):
+    if pf._load_numpy() is None:
+        pytest.skip("NumPy غير متوفر")
+    patterns_file = tmp_path / 'weak.txt'
+    patterns_file.write_text('corp\ndragon\n', encoding='utf-8')
+    tool = pf.AdvancedPasswordFilter(weak_patterns_file=str(patterns_file))
+    # أسطر غير ASCII ومسافات في الأطراف تمر على المسار العادي داخل الكتلة نفسها
+    block = '\n'.join(_strength_corpus() + [' padded1! ', 'pässwörd99', 'Ωmega#2024']).encode('utf-8')
+    while len(block) < pf.KERNEL_MIN_BLOCK:
+        block += b'\n' + block
+    filters = {'min_strength': min_strength}
+    assert pf._filter_block_vectorized(tool, block, filters) is not None
+    kernel = pf._filter_block(tool, block, filters)
+    monkeypatch.setattr(pf, 'KERNEL_MIN_BLOCK', float('inf'))
+    lines = pf._filter_block(tool, block, filters)
+    assert kernel[:2] == lines[:2] and dict(kernel[2]) == dict(lines[2])
+    assert 0 < len(kernel[0]) < kernel[1]